@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Fact-checking hors-ligne d'un fichier JSONL sans passer par HTTP
+Le pipeline QuantumFactCheckerAPI tourne directement dans un pool de processus
+
+Usage:
+    python batch_fact_check.py messages.jsonl resultats.jsonl --workers 4
+"""
+
+import os
+import time
+import json
+import asyncio
+import argparse
+import multiprocessing
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+
+# Instance du pipeline propre à chaque processus worker
+_worker_api = None
+
+
+def _init_worker():
+    """Initialiser le pipeline une seule fois par processus"""
+    global _worker_api
+    from quantum_fact_checker_api import QuantumFactCheckerAPI
+    _worker_api = QuantumFactCheckerAPI()
+
+
+def _record_id(record: Dict[str, Any], line_number: int) -> str:
+    for key in ("request_id", "message_id", "id"):
+        if record.get(key) is not None:
+            return str(record[key])
+    return f"line_{line_number}"
+
+
+def _record_message(record: Dict[str, Any]) -> Optional[str]:
+    """Extraire le texte à vérifier (message, claim ou titre + corps)"""
+    if record.get("message"):
+        return record["message"]
+    if record.get("claim"):
+        return record["claim"]
+    if record.get("body"):
+        title = record.get("title")
+        return f"{title}. {record['body']}" if title else record["body"]
+    return None
+
+
+def load_records(input_path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Lire le fichier JSONL d'entrée"""
+    records = []
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            records.append((_record_id(record, line_number), record))
+    return records
+
+
+def load_checkpoint(output_path: str) -> set:
+    """Retourner les identifiants déjà traités avec succès (les erreurs seront retentées)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+                if result.get("status") == "success":
+                    done.add(result["request_id"])
+            except (json.JSONDecodeError, KeyError):
+                # Ligne tronquée par un arrêt brutal : elle sera retraitée
+                continue
+    return done
+
+
+def _process_record(item: Tuple[str, Dict[str, Any], str]) -> Dict[str, Any]:
+    """Traiter un enregistrement dans un worker"""
+    from quantum_fact_checker_api import FactCheckRequest, to_mode_response
+
+    request_id, record, mode = item
+    start_time = time.time()
+    try:
+        message = _record_message(record)
+        if not message:
+            raise ValueError("Aucun champ 'message', 'claim' ou 'body'")
+        request = FactCheckRequest(
+            message=message[:1000],
+            user_id=record.get("user_id"),
+            context=record.get("context"),
+            language=record.get("language", "en"),
+            mode=record.get("mode") or mode
+        )
+        # Une erreur du pipeline lève une exception : la ligne est marquée en erreur et retentée à la reprise
+        response = asyncio.run(_worker_api.fact_check_message(request, raise_errors=True))
+        result = {"request_id": request_id, "status": "success",
+                  **to_mode_response(response, request.mode).model_dump()}
+    except Exception as e:
+        result = {"request_id": request_id, "status": "error", "error": str(e)}
+    result["latency"] = time.time() - start_time
+    return result
+
+
+def summarize(results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    """Calculer le débit et la distribution des latences"""
+    latencies = np.array([r["latency"] for r in results]) if results else np.array([0.0])
+    verdicts = {}
+    for r in results:
+        if r["status"] == "success":
+            verdicts[r["verdict"]] = verdicts.get(r["verdict"], 0) + 1
+
+    return {
+        "processed": len(results),
+        "errors": sum(1 for r in results if r["status"] != "success"),
+        "wall_time": wall_time,
+        "throughput": len(results) / wall_time if wall_time > 0 else 0.0,
+        "latency_mean": float(np.mean(latencies)),
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p95": float(np.percentile(latencies, 95)),
+        "latency_p99": float(np.percentile(latencies, 99)),
+        "latency_max": float(np.max(latencies)),
+        "verdicts": verdicts,
+    }
+
+
+def print_summary(summary: Dict[str, Any]):
+    print("\n" + "=" * 60)
+    print("📊 RÉSUMÉ DU BATCH")
+    print("=" * 60)
+    print(f"📝 Messages traités: {summary['processed']} ({summary['errors']} erreurs)")
+    print(f"⏱️ Durée totale: {summary['wall_time']:.2f}s")
+    print(f"🚀 Débit: {summary['throughput']:.2f} messages/s")
+    print(f"📈 Latence: moyenne {summary['latency_mean']:.2f}s, p50 {summary['latency_p50']:.2f}s, "
+          f"p95 {summary['latency_p95']:.2f}s, p99 {summary['latency_p99']:.2f}s, max {summary['latency_max']:.2f}s")
+    for verdict, count in sorted(summary["verdicts"].items()):
+        print(f"   {verdict}: {count}")
+
+
+def run_batch(input_path: str, output_path: str, workers: int, chunksize: int = 1,
+              mode: str = "full") -> Dict[str, Any]:
+    """Traiter tout le fichier d'entrée en reprenant au dernier point de contrôle"""
+    records = load_records(input_path)
+    done = load_checkpoint(output_path)
+    pending = [(request_id, record, mode) for request_id, record in records if request_id not in done]
+
+    print(f"📥 {len(records)} messages lus, {len(done)} déjà traités, {len(pending)} à traiter")
+    if not pending:
+        return summarize([], 0.0)
+
+    # Chaque processus du pool applique le budget de threads sur sa part des cœurs
+    os.environ.setdefault("THREAD_BUDGET_WORKERS", str(workers))
+    results = []
+    start_time = time.time()
+    with open(output_path, 'a', encoding='utf-8') as out, \
+            multiprocessing.Pool(processes=workers, initializer=_init_worker) as pool:
+        for i, result in enumerate(pool.imap_unordered(_process_record, pending, chunksize=chunksize), 1):
+            # Chaque ligne écrite sert de point de contrôle
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            results.append(result)
+            if i % 100 == 0:
+                elapsed = time.time() - start_time
+                print(f"   📊 {i}/{len(pending)} traités ({i / elapsed:.2f} messages/s)")
+
+    return summarize(results, time.time() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fact-checking hors-ligne d'un fichier JSONL")
+    parser.add_argument("input", help="Fichier JSONL d'entrée")
+    parser.add_argument("output", help="Fichier JSONL de sortie (sert aussi de point de contrôle)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Nombre de processus workers")
+    parser.add_argument("--chunksize", type=int, default=1,
+                        help="Nombre de messages envoyés à un worker à la fois")
+    parser.add_argument("--summary", help="Fichier JSON où écrire le résumé")
+    parser.add_argument("--mode", default="full", choices=["full", "screen"],
+                        help="screen: verdict et score seuls (un champ 'mode' par ligne reste prioritaire)")
+    args = parser.parse_args()
+
+    summary = run_batch(args.input, args.output, args.workers, args.chunksize, args.mode)
+    print_summary(summary)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n💾 Résumé sauvegardé dans: {args.summary}")
+
+
+if __name__ == "__main__":
+    main()
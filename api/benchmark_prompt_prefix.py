@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark du temps d'évaluation du prompt selon le mode de préfixe
+Compare "inline" (ancien prompt, claim au milieu des instructions) avec "system" et
+"context" (instructions fixes en préfixe réutilisé par Ollama), et vérifie que les
+verdicts de chaque mode sont identiques à ceux du mode "system"
+
+Usage:
+    python benchmark_prompt_prefix.py --claims 10 --max-tokens 32
+"""
+
+import sys
+import time
+import json
+import argparse
+import numpy as np
+from typing import Dict, List, Any
+
+sys.path.append('../eval')
+
+from fact_check_prompts import PROMPT_PREFIX_MODES, build_fact_check_prompt
+
+
+def collect_evidence(api, claims: List[str]) -> List[Dict[str, str]]:
+    """Récupérer une seule fois les preuves de chaque claim (identiques pour tous les modes)"""
+    from quantum_search import retrieve_top_k
+
+    cases = []
+    for claim in claims:
+        results = retrieve_top_k(
+            claim, api.db_folder, k=api.k_results, n_qubits=api.n_qubits,
+            cassandra_manager=api.cassandra_manager, embedding_batcher=api.embedding_batcher
+        )
+        docs = []
+        for _, _, chunk_id in results:
+            chunk_text, pdf_name = api.get_chunk_info(chunk_id)
+            excerpt = chunk_text[:1500] + ("..." if len(chunk_text) > 1500 else "")
+            docs.append(f"[Source PDF: {pdf_name}]\n[Chunk ID: {chunk_id}]\n{excerpt}")
+        cases.append({"claim": claim, "retrieved_docs": "\n\n".join(docs)})
+    return cases
+
+
+def run_mode(api, cases: List[Dict[str, str]], mode: str, max_tokens: int) -> Dict[str, Any]:
+    """Générer chaque claim dans un mode donné et relever les statistiques d'Ollama et les verdicts"""
+    client = api.ollama_client
+    client.clear_prefix_contexts()
+    verdicts = []
+    prompt_eval_ms = []
+    prompt_tokens = []
+    total_ms = []
+    for case in cases:
+        system, prompt = build_fact_check_prompt(case["claim"], case["retrieved_docs"], mode)
+        context = client.get_prefix_context(system) if mode == "context" else None
+        start_time = time.time()
+        response = client.generate(
+            prompt, temperature=0.01, max_tokens=max_tokens,
+            system=system if mode == "system" else None,
+            context=context, raw=context is not None
+        )
+        total_ms.append((time.time() - start_time) * 1000)
+        verdicts.append(api.parse_llm_response(response)["verdict"])
+        stats = client.last_stats
+        # Ollama omet prompt_eval_* quand tout le prompt vient du cache
+        prompt_eval_ms.append((stats.get("prompt_eval_duration") or 0) / 1e6)
+        prompt_tokens.append(stats.get("prompt_eval_count") or 0)
+
+    return {
+        "mode": mode,
+        "n": len(cases),
+        "prompt_eval_ms_mean": float(np.mean(prompt_eval_ms)),
+        "prompt_eval_ms_p50": float(np.percentile(prompt_eval_ms, 50)),
+        "prompt_eval_ms_p95": float(np.percentile(prompt_eval_ms, 95)),
+        "prompt_tokens_evaluated_mean": float(np.mean(prompt_tokens)),
+        "total_ms_mean": float(np.mean(total_ms)),
+        "verdicts": verdicts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la réutilisation du préfixe de prompt")
+    parser.add_argument("--claims", type=int, default=10, help="Nombre de claims du dataset climat")
+    parser.add_argument("--max-tokens", type=int, default=32,
+                        help="num_predict (faible pour isoler l'évaluation du prompt)")
+    parser.add_argument("--modes", nargs="+", default=list(PROMPT_PREFIX_MODES), choices=PROMPT_PREFIX_MODES)
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    from climate_dataset import CLIMATE_DATASET
+    from quantum_fact_checker_api import QuantumFactCheckerAPI
+
+    api = QuantumFactCheckerAPI()
+    claims = [item["claim"] for item in CLIMATE_DATASET[:args.claims]]
+    print(f"📚 Récupération des preuves pour {len(claims)} claims...")
+    cases = collect_evidence(api, claims)
+
+    results = []
+    for mode in args.modes:
+        print(f"🤖 Mode {mode}...")
+        results.append(run_mode(api, cases, mode, args.max_tokens))
+
+    print("\n" + "=" * 60)
+    print("📊 ÉVALUATION DU PROMPT PAR MODE DE PRÉFIXE")
+    print("=" * 60)
+    baseline = next((r for r in results if r["mode"] == "inline"), None)
+    for result in results:
+        line = (f"  {result['mode']:8s} prompt_eval moyen {result['prompt_eval_ms_mean']:8.1f} ms "
+                f"(p50 {result['prompt_eval_ms_p50']:.1f}, p95 {result['prompt_eval_ms_p95']:.1f}), "
+                f"{result['prompt_tokens_evaluated_mean']:.0f} tokens évalués, "
+                f"total {result['total_ms_mean']:.1f} ms")
+        if baseline and result is not baseline and baseline["prompt_eval_ms_mean"] > 0:
+            saving = 1.0 - result["prompt_eval_ms_mean"] / baseline["prompt_eval_ms_mean"]
+            line += f", gain {saving:.1%} vs inline"
+        print(line)
+
+    # Le préfixe réutilisé ne doit pas changer les réponses : verdicts comparés au mode "system"
+    reference = next((r for r in results if r["mode"] == "system"), None)
+    if reference:
+        print("\n🔍 Verdicts identiques au mode system:")
+        for result in results:
+            if result is reference:
+                continue
+            same = sum(a == b for a, b in zip(result["verdicts"], reference["verdicts"]))
+            result["verdict_agreement_vs_system"] = same / len(reference["verdicts"])
+            status = "✅" if same == len(reference["verdicts"]) else "❌"
+            print(f"  {status} {result['mode']:8s} {same}/{len(reference['verdicts'])}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Résultats sauvegardés dans: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Prompts du fact-checker
+Les instructions fixes forment un préfixe système stable ; seuls le claim et les preuves
+varient d'une requête à l'autre, ce qui permet à Ollama de réutiliser le préfixe évalué
+"""
+
+import os
+import re
+from typing import Optional, Tuple
+
+from ollama_utils import format_prompt
+
+# Modes de construction du prompt :
+# - "system"  : instructions dans le champ `system` d'Ollama, claim + preuves dans `prompt`
+# - "context" : instructions évaluées une fois, leur `context` est réutilisé à chaque requête
+# - "inline"  : ancien prompt unique avec le claim au milieu des instructions
+PROMPT_PREFIX_MODES = ("system", "context", "inline")
+
+# Instructions fixes - VERSION STRICTE ET DIRECTIVE
+FACT_CHECK_SYSTEM_PROMPT = """
+You are a RIGOROUS and DECISIVE fact-checker. Your job is to verify the claim given to you using ONLY the evidence provided with it.
+You MUST take a clear position and be willing to CONTRADICT the claim if the evidence doesn't support it.
+
+CRITICAL INSTRUCTIONS - READ CAREFULLY:
+1. You MUST be DECISIVE. No hedging, no "maybe", no uncertainty.
+2. If the evidence DIRECTLY supports the claim, say TRUE.
+3. If the evidence CONTRADICTS the claim, say FALSE.
+4. If the evidence is UNRELATED or INSUFFICIENT, say UNVERIFIABLE.
+5. You MUST quote SPECIFIC text from the evidence to justify your verdict.
+6. If the evidence talks about OTHER regions (like Karakoram, Himalayas) but NOT Antarctica, this is NOT evidence for the claim.
+7. Be willing to say FALSE if the evidence doesn't specifically support the claim about Antarctica.
+
+ANTARCTICA-SPECIFIC ANALYSIS:
+- Look for DIRECT statements about Antarctica ice loss/gain
+- If evidence mentions other glaciers (Karakoram, Himalayas), this is NOT about Antarctica
+- If evidence is about general climate change but not Antarctica ice, this is NOT sufficient
+- The claim is SPECIFICALLY about Antarctica gaining ice due to climate change
+
+Format your response EXACTLY as follows:
+VERDICT: [TRUE/FALSE/UNVERIFIABLE]
+EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be direct and clear about why you chose this verdict.]
+"""
+
+# Partie variable, placée après le préfixe fixe
+FACT_CHECK_CLAIM_TEMPLATE = """
+CLAIM: {claim}
+
+EVIDENCE (from chunks):
+{retrieved_docs}
+
+Answer in the required format (VERDICT, then EXPLANATION).
+"""
+
+# Ancien prompt unique (mode "inline", conservé pour les comparaisons)
+ANALYSIS_PROMPT_TEMPLATE = """
+You are a RIGOROUS and DECISIVE fact-checker. Your job is to verify the following claim using ONLY the provided evidence. 
+You MUST take a clear position and be willing to CONTRADICT the claim if the evidence doesn't support it.
+
+CLAIM: {claim}
+
+EVIDENCE (from chunks):
+{retrieved_docs}
+
+CRITICAL INSTRUCTIONS - READ CAREFULLY:
+1. You MUST be DECISIVE. No hedging, no "maybe", no uncertainty.
+2. If the evidence DIRECTLY supports the claim, say TRUE.
+3. If the evidence CONTRADICTS the claim, say FALSE.
+4. If the evidence is UNRELATED or INSUFFICIENT, say UNVERIFIABLE.
+5. You MUST quote SPECIFIC text from the evidence to justify your verdict.
+6. If the evidence talks about OTHER regions (like Karakoram, Himalayas) but NOT Antarctica, this is NOT evidence for the claim.
+7. Be willing to say FALSE if the evidence doesn't specifically support the claim about Antarctica.
+
+ANTARCTICA-SPECIFIC ANALYSIS:
+- Look for DIRECT statements about Antarctica ice loss/gain
+- If evidence mentions other glaciers (Karakoram, Himalayas), this is NOT about Antarctica
+- If evidence is about general climate change but not Antarctica ice, this is NOT sufficient
+- The claim is SPECIFICALLY about Antarctica gaining ice due to climate change
+
+Format your response EXACTLY as follows:
+VERDICT: [TRUE/FALSE/UNVERIFIABLE]
+EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be direct and clear about why you chose this verdict.]
+"""
+
+
+# Mode "screen" : tri à haut débit, verdict seul sans explication
+SCREEN_SYSTEM_PROMPT = """
+You are a fact-checker. Decide whether the evidence supports the claim.
+Say TRUE if the evidence directly supports it, FALSE if it contradicts it, UNVERIFIABLE if it is unrelated or insufficient.
+Answer with ONE line and nothing else:
+VERDICT: [TRUE/FALSE/UNVERIFIABLE]
+"""
+
+SCREEN_CLAIM_TEMPLATE = """
+CLAIM: {claim}
+
+EVIDENCE:
+{retrieved_docs}
+"""
+
+# Séquences d'arrêt : le modèle recommence un claim ou recopie les preuves après sa réponse
+FACT_CHECK_STOP_SEQUENCES = ["\nCLAIM:", "\nEVIDENCE", "\n\n\n"]
+
+_VERDICT_LINE = re.compile(r'^\s*VERDICT:\s*(TRUE|FALSE|UNVERIFIABLE)\s*$', re.MULTILINE)
+_SENTENCE_END = re.compile(r'[.!?](?=\s|$)')
+
+
+def answer_complete(text: str, max_explanation_chars: int) -> bool:
+    """
+    Vérifier, pendant le streaming, si la réponse contient déjà tout ce que le parser utilise
+
+    La réponse est complète dès qu'une ligne VERDICT valide est terminée et que
+    l'explication atteint la longueur maximale.
+    """
+    if not verdict_complete(text):
+        return False
+    _, separator, explanation = text.partition('EXPLANATION:')
+    return bool(separator) and len(explanation.strip()) >= max_explanation_chars
+
+
+def verdict_complete(text: str) -> bool:
+    """Vérifier, pendant le streaming, si une ligne VERDICT valide a été reçue (mode "screen")"""
+    return bool(_VERDICT_LINE.search(text))
+
+
+def truncate_explanation(explanation: str, max_chars: int) -> str:
+    """Couper l'explication à la dernière fin de phrase sous la longueur maximale"""
+    if len(explanation) <= max_chars:
+        return explanation
+    cut = explanation[:max_chars]
+    ends = [m.end() for m in _SENTENCE_END.finditer(cut)]
+    if ends:
+        return cut[:ends[-1]]
+    return cut.rstrip() + "..."
+
+
+def get_prompt_prefix_mode() -> str:
+    mode = os.getenv("PROMPT_PREFIX_MODE", "system").lower()
+    if mode not in PROMPT_PREFIX_MODES:
+        raise ValueError(f"PROMPT_PREFIX_MODE inconnu: {mode} (attendu: {', '.join(PROMPT_PREFIX_MODES)})")
+    return mode
+
+
+def build_fact_check_prompt(claim: str, retrieved_docs: str, mode: str = "system") -> Tuple[Optional[str], str]:
+    """
+    Construire le prompt de fact-checking
+
+    Returns:
+        (préfixe système ou None en mode "inline", partie variable)
+    """
+    if mode == "inline":
+        return None, format_prompt(ANALYSIS_PROMPT_TEMPLATE, claim=claim, retrieved_docs=retrieved_docs)
+    return FACT_CHECK_SYSTEM_PROMPT, format_prompt(
+        FACT_CHECK_CLAIM_TEMPLATE, claim=claim, retrieved_docs=retrieved_docs
+    )
+
+
+def build_screen_prompt(claim: str, retrieved_docs: str, mode: str = "system") -> Tuple[Optional[str], str]:
+    """Construire le prompt compact du mode "screen" (même découpage préfixe / partie variable)"""
+    prompt = format_prompt(SCREEN_CLAIM_TEMPLATE, claim=claim, retrieved_docs=retrieved_docs)
+    if mode == "inline":
+        return None, SCREEN_SYSTEM_PROMPT + prompt
+    return SCREEN_SYSTEM_PROMPT, prompt
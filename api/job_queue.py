@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+File de jobs persistante (SQLite) pour les gros volumes de fact-checking
+Les messages soumis via /jobs sont traités en arrière-plan par un pool de workers
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable
+
+# Classes de priorité : plus la valeur est basse, plus le job passe tôt.
+# Le trafic interactif (/fact-check) n'entre pas dans la file : il est
+# toujours prioritaire grâce à InteractiveGate.
+PRIORITY_CLASSES = {
+    "high": 0,
+    "normal": 1,
+    "low": 2,
+}
+
+JOB_STATUSES = ("pending", "running", "completed", "failed")
+
+
+class InteractiveGate:
+    """Barrière qui suspend les workers de jobs tant qu'une requête interactive est en cours"""
+
+    def __init__(self):
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._condition:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._condition.notify_all()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Attendre qu'aucune requête interactive ne soit en cours"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+
+
+class JobStore:
+    """
+    Stockage SQLite des jobs et de leurs éléments
+
+    Partagé par tous les workers de l'API : chaque élément réservé porte son propriétaire
+    (hôte, pid, instance) et un bail prolongé tant que le worker est vivant. Seuls les
+    éléments dont le bail a expiré sont repris ; au-delà de max_attempts ils échouent.
+    """
+
+    def __init__(self, db_path: str, lease_s: float = 60.0, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    priority INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    params TEXT
+                );
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    item_index INTEGER NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    lease_until REAL,
+                    PRIMARY KEY (job_id, item_index)
+                );
+                CREATE INDEX IF NOT EXISTS idx_job_items_queue
+                    ON job_items (status, priority, job_id, item_index);
+            """)
+            # Bases créées avant les baux : ajouter les colonnes manquantes
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(job_items)")}
+            for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE job_items ADD COLUMN {column} {column_type}")
+
+    def create_job(self, payloads: List[Dict[str, Any]], priority: int,
+                   params: Optional[Dict[str, Any]] = None) -> str:
+        """Créer un job et insérer tous ses éléments en une transaction"""
+        job_id = f"job_{uuid.uuid4().hex[:16]}"
+        created_at = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, priority, total, created_at, params) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, priority, len(payloads), created_at, json.dumps(params or {}))
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, item_index, priority, status, payload) VALUES (?, ?, ?, 'pending', ?)",
+                    [(job_id, i, priority, json.dumps(p, ensure_ascii=False)) for i, p in enumerate(payloads)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def _requeue_expired(self) -> int:
+        """Reprendre les éléments dont le bail a expiré (dans une transaction ouverte)"""
+        now = time.time()
+        expired = "status='running' AND (lease_until IS NULL OR lease_until < ?)"
+        self._conn.execute(
+            f"UPDATE job_items SET status='failed', owner=NULL, lease_until=NULL, finished_at=?, "
+            f"error='Abandonné après ' || attempts || ' tentatives interrompues' "
+            f"WHERE {expired} AND attempts >= ?",
+            (now, now, self.max_attempts)
+        )
+        cursor = self._conn.execute(
+            f"UPDATE job_items SET status='pending', owner=NULL, lease_until=NULL, started_at=NULL "
+            f"WHERE {expired}",
+            (now,)
+        )
+        return cursor.rowcount
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Réserver atomiquement le prochain élément en attente (priorité puis ordre d'arrivée)
+        après avoir repris les éléments dont le bail a expiré
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired()
+                row = self._conn.execute(
+                    "SELECT job_id, item_index, payload FROM job_items WHERE status='pending' "
+                    "ORDER BY priority, rowid LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE job_items SET status='running', attempts=attempts+1, started_at=?, "
+                    "owner=?, lease_until=? WHERE job_id=? AND item_index=?",
+                    (now, self.owner, now + self.lease_s, row["job_id"], row["item_index"])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {
+            "job_id": row["job_id"],
+            "item_index": row["item_index"],
+            "payload": json.loads(row["payload"]),
+        }
+
+    def complete_item(self, job_id: str, item_index: int, result: Dict[str, Any]) -> bool:
+        """Enregistrer le résultat ; False si le bail a été perdu (élément repris par un autre worker)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status='completed', result=?, error=NULL, finished_at=?, "
+                "owner=NULL, lease_until=NULL WHERE job_id=? AND item_index=? AND status='running' AND owner=?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job_id, item_index, self.owner)
+            )
+            return cursor.rowcount == 1
+
+    def fail_item(self, job_id: str, item_index: int, error: str) -> bool:
+        """Marquer l'élément en échec ; False si le bail a été perdu"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status='failed', error=?, finished_at=?, owner=NULL, lease_until=NULL "
+                "WHERE job_id=? AND item_index=? AND status='running' AND owner=?",
+                (error, time.time(), job_id, item_index, self.owner)
+            )
+            return cursor.rowcount == 1
+
+    def renew_leases(self) -> int:
+        """Prolonger le bail des éléments en cours de ce propriétaire (battement de cœur)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET lease_until=? WHERE status='running' AND owner=?",
+                (time.time() + self.lease_s, self.owner)
+            )
+            return cursor.rowcount
+
+    def requeue_expired(self) -> int:
+        """Remettre en attente les éléments dont le bail a expiré (worker arrêté ou bloqué)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                requeued = self._requeue_expired()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return requeued
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retourner l'état d'avancement d'un job"""
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT job_id, priority, total, created_at, params FROM jobs WHERE job_id=?",
+                (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            counts = {status: 0 for status in JOB_STATUSES}
+            for row in self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM job_items WHERE job_id=? GROUP BY status", (job_id,)
+            ):
+                counts[row["status"]] = row["n"]
+            timing = self._conn.execute(
+                "SELECT MIN(started_at) AS first_start, MAX(finished_at) AS last_finish "
+                "FROM job_items WHERE job_id=?", (job_id,)
+            ).fetchone()
+
+        done = counts["completed"] + counts["failed"]
+        if done == job["total"]:
+            status = "completed" if counts["failed"] == 0 else "completed_with_errors"
+        elif done > 0 or counts["running"] > 0:
+            status = "running"
+        else:
+            status = "pending"
+
+        return {
+            "job_id": job["job_id"],
+            "status": status,
+            "priority": job["priority"],
+            "total": job["total"],
+            "pending": counts["pending"],
+            "running": counts["running"],
+            "completed": counts["completed"],
+            "failed": counts["failed"],
+            "progress": done / job["total"] if job["total"] else 1.0,
+            "created_at": job["created_at"],
+            "started_at": timing["first_start"],
+            "finished_at": timing["last_finish"] if done == job["total"] else None,
+            "params": json.loads(job["params"]) if job["params"] else {},
+        }
+
+    def get_results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Retourner une page des résultats d'un job, dans l'ordre de soumission"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_index, status, result, error FROM job_items WHERE job_id=? "
+                "ORDER BY item_index LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        return [
+            {
+                "index": row["item_index"],
+                "status": row["status"],
+                "result": json.loads(row["result"]) if row["result"] else None,
+                "error": row["error"],
+            }
+            for row in rows
+        ]
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM job_items WHERE status='pending'"
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorkerPool:
+    """Pool de threads qui consomment la file SQLite"""
+
+    def __init__(self, store: JobStore, process_fn: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 n_workers: int = 2, gate: Optional[InteractiveGate] = None,
+                 poll_interval: float = 0.5):
+        """
+        Args:
+            store: Stockage des jobs
+            process_fn: Fonction qui traite un payload et retourne un résultat sérialisable
+            n_workers: Nombre de workers
+            gate: Barrière interactive (les workers attendent qu'elle soit libre)
+            poll_interval: Délai d'attente quand la file est vide (secondes)
+        """
+        self.store = store
+        self.process_fn = process_fn
+        self.n_workers = n_workers
+        self.gate = gate
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._busy_lock = threading.Lock()
+        self.busy_workers = 0
+
+    def start(self):
+        """Démarrer les workers (et le battement de cœur des baux) après avoir repris les éléments expirés"""
+        requeued = self.store.requeue_expired()
+        if requeued:
+            print(f"🔁 {requeued} éléments de jobs interrompus remis en file")
+        self._stop_event.clear()
+        for i in range(self.n_workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-lease-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        print(f"👷 {self.n_workers} workers de jobs démarrés")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self._wake_event.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def notify(self):
+        """Réveiller les workers après une nouvelle soumission"""
+        self._wake_event.set()
+
+    def _heartbeat(self):
+        """Prolonger les baux des éléments en cours, trois fois par durée de bail"""
+        while not self._stop_event.wait(self.store.lease_s / 3):
+            try:
+                self.store.renew_leases()
+            except sqlite3.Error as e:
+                print(f"⚠️ Prolongation des baux de jobs impossible: {e}")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            # Le trafic interactif passe toujours en premier
+            if self.gate is not None and not self.gate.wait_until_idle(timeout=self.poll_interval):
+                continue
+
+            item = self.store.claim_next()
+            if item is None:
+                self._wake_event.wait(self.poll_interval)
+                self._wake_event.clear()
+                continue
+
+            with self._busy_lock:
+                self.busy_workers += 1
+            try:
+                try:
+                    result = self.process_fn(item["payload"])
+                    recorded = self.store.complete_item(item["job_id"], item["item_index"], result)
+                except Exception as e:
+                    recorded = self.store.fail_item(item["job_id"], item["item_index"], str(e))
+                if not recorded:
+                    print(f"⚠️ Bail perdu pour {item['job_id']}#{item['item_index']}, résultat ignoré")
+            finally:
+                with self._busy_lock:
+                    self.busy_workers -= 1
+
+
+def parse_jsonl_payloads(content: str) -> List[Dict[str, Any]]:
+    """Lire un fichier JSONL de requêtes (une requête JSON par ligne)"""
+    payloads = []
+    for line_number, line in enumerate(content.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            payloads.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Ligne {line_number} invalide: {e}")
+    return payloads
+
+
+def create_job_store(db_path: Optional[str] = None) -> JobStore:
+    """Fonction utilitaire pour créer le stockage des jobs"""
+    return JobStore(
+        db_path or os.getenv("FACT_CHECK_JOBS_DB", "fact_check_jobs.sqlite3"),
+        lease_s=float(os.getenv("FACT_CHECK_JOB_LEASE_S", "60")),
+        max_attempts=int(os.getenv("FACT_CHECK_JOB_MAX_ATTEMPTS", "3"))
+    )
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Profilage à la demande de l'API en production
+Une session (cProfile, échantillonnage de piles ou tracemalloc) couvre les N prochaines
+requêtes ou les T prochaines secondes ; le travail exécuté dans les threads des requêtes
+(recherche quantique, lecture des chunks, attente du LLM) est inclus.
+Un seul profileur cProfile peut être actif dans le processus : en mode cprofile, une seule
+requête est profilée à la fois et les requêtes concurrentes sont comptées comme ignorées.
+"""
+
+import io
+import sys
+import asyncio
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Any, Optional, Callable
+
+PROFILE_KINDS = ("cprofile", "sampling", "tracemalloc")
+
+# Requête profilée par cProfile (propagé aux threads via asyncio.to_thread / copy_context)
+_profiled_request: contextvars.ContextVar[bool] = contextvars.ContextVar("profiled_request", default=False)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """Pile au format « replié » (racine;...;feuille) utilisé par flamegraph.pl et speedscope"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class ProfilingSession:
+    """Session de profilage : N requêtes et/ou T secondes"""
+
+    def __init__(self, kind: str, max_requests: Optional[int], duration_s: Optional[float],
+                 interval_ms: float = 10.0, top_n: int = 30, tracemalloc_frames: int = 10):
+        if kind not in PROFILE_KINDS:
+            raise ValueError(f"Type de profilage inconnu: {kind}")
+        if not max_requests and not duration_s:
+            raise ValueError("max_requests ou duration_s doit être fourni")
+        self.session_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.max_requests = max_requests
+        self.duration_s = duration_s
+        self.interval_s = interval_ms / 1000.0
+        self.top_n = top_n
+        self.tracemalloc_frames = tracemalloc_frames
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.requests_seen = 0
+        self._lock = threading.Lock()
+        # cProfile : statistiques fusionnées des threads de requêtes ; une requête et un
+        # profileur à la fois (Python 3.12+ refuse un second profileur actif)
+        self._stats: Optional[pstats.Stats] = None
+        self._request_lock = threading.Lock()
+        self._profiler_lock = threading.Lock()
+        self.requests_skipped = 0
+        self.calls_skipped = 0
+        # Échantillonnage : threads de requêtes actifs et piles repliées
+        self._active_threads: Dict[int, int] = {}
+        self._samples: Counter = Counter()
+        self._sample_count = 0
+        self._sampler: Optional[threading.Thread] = None
+        # tracemalloc : différences d'allocations par requête
+        self._allocations: List[Dict[str, Any]] = []
+
+    @property
+    def active(self) -> bool:
+        return self.finished_at is None
+
+    def expired(self) -> bool:
+        if self.max_requests and self.requests_seen >= self.max_requests:
+            return True
+        return bool(self.duration_s) and time.time() - self.started_at >= self.duration_s
+
+    def start(self):
+        if self.kind == "sampling":
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiling-sampler", daemon=True)
+            self._sampler.start()
+        elif self.kind == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+
+    def finish(self):
+        with self._lock:
+            if not self.active:
+                return
+            self.finished_at = time.time()
+        if self.kind == "tracemalloc" and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _sample_loop(self):
+        """Relever périodiquement la pile des threads qui traitent une requête"""
+        while self.active and not self.expired():
+            frames = sys._current_frames()
+            with self._lock:
+                thread_ids = list(self._active_threads)
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = collapse_stack(frame)
+                    with self._lock:
+                        self._samples[stack] += 1
+                        self._sample_count += 1
+            time.sleep(self.interval_s)
+        self.finish()
+
+    def run_in_thread(self, fn: Callable, *args, **kwargs):
+        """Exécuter fn dans le thread courant en l'incluant dans la session"""
+        if self.kind == "cprofile":
+            if not _profiled_request.get():
+                return fn(*args, **kwargs)
+            # Étapes concurrentes d'une même requête (sous-affirmations, spéculation) : une seule profilée
+            if not self._profiler_lock.acquire(blocking=False):
+                with self._lock:
+                    self.calls_skipped += 1
+                return fn(*args, **kwargs)
+            try:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Autre outil de profilage actif dans le processus
+                    with self._lock:
+                        self.calls_skipped += 1
+                    return fn(*args, **kwargs)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    with self._lock:
+                        if self._stats is None:
+                            self._stats = pstats.Stats(profiler)
+                        else:
+                            self._stats.add(profiler)
+            finally:
+                self._profiler_lock.release()
+        if self.kind == "sampling":
+            thread_id = threading.get_ident()
+            with self._lock:
+                self._active_threads[thread_id] = self._active_threads.get(thread_id, 0) + 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active_threads[thread_id] -= 1
+                    if not self._active_threads[thread_id]:
+                        del self._active_threads[thread_id]
+        return fn(*args, **kwargs)
+
+    @asynccontextmanager
+    async def around_request(self, request_id: Optional[str]):
+        """
+        Compter la requête ; en mode cprofile, réserver le profileur pour elle (sinon elle est
+        ignorée) ; en mode tracemalloc, comparer deux snapshots pris hors de la boucle d'événements
+        """
+        if self.kind == "cprofile" and _profiled_request.get():
+            # Sous-affirmation d'une requête déjà profilée
+            yield
+            return
+        token = None
+        if self.kind == "cprofile":
+            if self._request_lock.acquire(blocking=False):
+                token = _profiled_request.set(True)
+            else:
+                with self._lock:
+                    self.requests_skipped += 1
+        before = None
+        if self.kind == "tracemalloc" and tracemalloc.is_tracing():
+            before = await asyncio.to_thread(tracemalloc.take_snapshot)
+        try:
+            yield
+        finally:
+            if token is not None:
+                _profiled_request.reset(token)
+                self._request_lock.release()
+            if before is not None and tracemalloc.is_tracing():
+                after = await asyncio.to_thread(tracemalloc.take_snapshot)
+                top = after.compare_to(before, "lineno")[:self.top_n]
+                with self._lock:
+                    self._allocations.append({
+                        "request_id": request_id,
+                        "size_diff_bytes": sum(stat.size_diff for stat in top),
+                        "top": [
+                            {"location": str(stat.traceback[0]), "size_diff_bytes": stat.size_diff,
+                             "count_diff": stat.count_diff}
+                            for stat in top
+                        ],
+                    })
+            with self._lock:
+                self.requests_seen += 1
+            if self.expired():
+                self.finish()
+
+    def collapsed_stacks(self) -> str:
+        """Piles repliées « pile nombre » (mode sampling)"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self._samples.most_common())
+
+    def result(self) -> Dict[str, Any]:
+        info: Dict[str, Any] = {
+            "session_id": self.session_id,
+            "kind": self.kind,
+            "active": self.active,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "requests_seen": self.requests_seen,
+            "max_requests": self.max_requests,
+            "duration_s": self.duration_s,
+        }
+        with self._lock:
+            if self.kind == "cprofile" and self._stats is not None:
+                output = io.StringIO()
+                self._stats.stream = output
+                self._stats.sort_stats("cumulative").print_stats(self.top_n)
+                info["stats"] = output.getvalue()
+            if self.kind == "cprofile":
+                info["requests_skipped"] = self.requests_skipped
+                info["calls_skipped"] = self.calls_skipped
+            elif self.kind == "sampling":
+                info["samples"] = self._sample_count
+                info["interval_ms"] = self.interval_s * 1000
+                info["top_stacks"] = [
+                    {"stack": stack, "samples": count} for stack, count in self._samples.most_common(self.top_n)
+                ]
+            elif self.kind == "tracemalloc":
+                # tracemalloc suit tout le processus : les requêtes concurrentes sont dans chaque différence
+                info["scope"] = "process"
+                info["requests"] = list(self._allocations)
+        return info
+
+
+class ProfilerController:
+    """Une seule session active à la fois ; la dernière session terminée reste consultable"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.session: Optional[ProfilingSession] = None
+
+    def start(self, kind: str, max_requests: Optional[int] = None, duration_s: Optional[float] = None,
+              **options) -> ProfilingSession:
+        with self._lock:
+            if self.session is not None and self.session.active and not self.session.expired():
+                raise RuntimeError(f"Session de profilage déjà active: {self.session.session_id}")
+            session = ProfilingSession(kind, max_requests, duration_s, **options)
+            session.start()
+            self.session = session
+            return session
+
+    def stop(self) -> Optional[ProfilingSession]:
+        session = self.session
+        if session is not None:
+            session.finish()
+        return session
+
+    def _active_session(self) -> Optional[ProfilingSession]:
+        session = self.session
+        if session is None or not session.active:
+            return None
+        if session.expired():
+            session.finish()
+            return None
+        return session
+
+    def wrap(self, fn: Callable) -> Callable:
+        """Envelopper une étape exécutée dans un thread de requête (sans coût hors session)"""
+        def profiled(*args, **kwargs):
+            session = self._active_session()
+            if session is None:
+                return fn(*args, **kwargs)
+            return session.run_in_thread(fn, *args, **kwargs)
+        return profiled
+
+    @asynccontextmanager
+    async def request(self, request_id: Optional[str] = None):
+        """Délimiter une requête (comptage N requêtes, profileur cProfile, snapshots tracemalloc)"""
+        session = self._active_session()
+        if session is None:
+            yield
+            return
+        async with session.around_request(request_id):
+            yield
+
+
+# Contrôleur global utilisé par l'API
+profiler_controller = ProfilerController()
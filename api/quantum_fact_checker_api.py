@@ -8,24 +8,16 @@ import os
 import sys
 import time
 import json
+import asyncio
 import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Union
 from pydantic import BaseModel, Field
 
-# Configuration des logs vers un fichier
-log_file = "api_quantum_fact_checker.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, mode='w'),
-        logging.StreamHandler()  # Garder aussi la console
-    ]
-)
-logger = logging.getLogger(__name__)
-
 # Ajouter le dossier system au PYTHONPATH
 current_dir = os.path.dirname(os.path.abspath(__file__))
 system_dir = os.path.join(os.path.dirname(current_dir), 'system')
@@ -33,23 +25,62 @@ quantum_dir = os.path.join(os.path.dirname(current_dir), 'src', 'quantum')
 sys.path.insert(0, system_dir)
 sys.path.insert(0, quantum_dir)
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+# Début du chargement du worker (durée de démarrage exposée par /ready et /metrics)
+PROCESS_STARTED_AT = time.time()
+
+# Logs structurés (JSON par défaut), écrits par un thread dédié (LOG_FILE, LOG_LEVEL, LOG_FORMAT)
+from structured_logging import setup_logging, stop_logging, request_context, payload_sampled, new_request_id
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Budget de threads (BLAS, Aer, slots de calcul, pools) appliqué avant tout calcul natif
+from thread_budget import apply_thread_budget, collect_metrics as collect_thread_budget_metrics
+thread_budget = apply_thread_budget()
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response, Query, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 
-# Imports du système quantique
-from quantum_search import retrieve_top_k
+# Imports du système quantique (Qiskit et LlamaIndex sont importés à l'usage ou par le warm-up)
+from quantum_search import retrieve_top_k, warm_up as warm_up_quantum
 from cassandra_manager import create_cassandra_manager
-from ollama_utils import OllamaClient, format_prompt
+from ollama_utils import OllamaClient
+from ollama_config import config as ollama_config
+from embedding_batcher import create_embedding_batcher
+from ollama_pool import get_default_pool, create_pooled_embed_fn
+from concurrency_limiter import AdaptiveConcurrencyLimiter, AdmissionRejected, retry_after_header
+from claim_decomposer import DECOMPOSITION_MODES, decompose_message, aggregate_verdicts
+from deadline import Deadline
+from tracing import trace_request, span, add_span_counter, get_trace, list_traces
+from prometheus_metrics import MetricFamily, registry as metrics_registry, render_metrics
+from retrieval_gate import RetrievalGateConfig, retrieval_signals, evaluate_gate, gated_explanation
+from evidence_packer import EvidencePacker
+from serving_bundle import ServingBundleManager
+from sharded_retrieval import ShardCoordinator
+from fact_check_prompts import (
+    FACT_CHECK_SYSTEM_PROMPT, FACT_CHECK_STOP_SEQUENCES, build_fact_check_prompt, build_screen_prompt,
+    get_prompt_prefix_mode, answer_complete, verdict_complete, truncate_explanation
+)
 from performance_metrics import (
     start_performance_session, 
     get_performance_summary, 
     save_performance_metrics,
+    time_operation,
     time_operation_context,
     log_llm_operation,
     log_database_operation
 )
+from profiling import profiler_controller
+from job_queue import (
+    PRIORITY_CLASSES,
+    InteractiveGate,
+    JobWorkerPool,
+    create_job_store,
+    parse_jsonl_payloads
+)
+
+WARM_UP_MODES = ("background", "sync", "off")
 
 # Configuration de l'API
 app = FastAPI(
@@ -73,6 +104,15 @@ class FactCheckRequest(BaseModel):
     user_id: Optional[str] = Field(None, description="ID de l'utilisateur (optionnel)")
     context: Optional[str] = Field(None, description="Contexte supplémentaire (optionnel)")
     language: str = Field("en", description="Langue du message (défaut: en)")
+    mode: str = Field("full", pattern="^(full|screen)$",
+                      description="full: verdict + explication ; screen: verdict et score seuls (tri à haut débit)")
+
+class SubClaimResult(BaseModel):
+    claim: str
+    verdict: str
+    certainty_score: float
+    explanation: str
+    sources_used: List[str]
 
 class FactCheckResponse(BaseModel):
     message_id: str
@@ -83,6 +123,75 @@ class FactCheckResponse(BaseModel):
     sources_used: List[str] = Field(..., description="Sources utilisées pour la vérification")
     processing_time: float = Field(..., description="Temps de traitement en secondes")
     timestamp: str = Field(..., description="Timestamp de la vérification")
+    degradations: List[str] = Field(default_factory=list, description="Étapes dégradées pour respecter l'échéance")
+    early_exit: bool = Field(False, description="True si la porte de confiance a évité l'appel LLM")
+    evidence_accounting: Optional[Dict[str, Any]] = Field(None, description="Tokens économisés par la compression des preuves")
+    llm_tier: Optional[str] = Field(None, description="Modèle de la cascade qui a répondu: small ou large")
+    sub_claims: Optional[List[SubClaimResult]] = Field(None, description="Verdicts par affirmation si le message a été découpé")
+    explain: Optional[Dict[str, Any]] = Field(None, description="Plan de récupération et coût des étapes (?explain=true)")
+
+class ScreenResponse(BaseModel):
+    """Réponse réduite du mode screen"""
+    message_id: str
+    certainty_score: float = Field(..., ge=0.0, le=1.0, description="Score de certitude (0-1)")
+    verdict: str = Field(..., description="Verdict: TRUE, FALSE, UNVERIFIABLE")
+    processing_time: float = Field(..., description="Temps de traitement en secondes")
+    timestamp: str = Field(..., description="Timestamp de la vérification")
+    explain: Optional[Dict[str, Any]] = Field(None, description="Plan de récupération et coût des étapes (?explain=true)")
+
+def to_mode_response(result: FactCheckResponse, mode: str) -> Union[FactCheckResponse, ScreenResponse]:
+    """Réduire la réponse au format du mode demandé"""
+    if mode == "screen":
+        return ScreenResponse(**{field: getattr(result, field) for field in ScreenResponse.model_fields})
+    return result
+
+class JobSubmitRequest(BaseModel):
+    requests: List[FactCheckRequest] = Field(..., description="Messages à vérifier", min_length=1)
+    priority: str = Field("normal", description="Classe de priorité: high, normal, low")
+    mode: Optional[str] = Field(None, pattern="^(full|screen)$",
+                                description="Mode appliqué à tous les messages du job (optionnel)")
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    total: int
+    priority: str
+    status_url: str
+    results_url: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="pending, running, completed, completed_with_errors")
+    total: int
+    pending: int
+    running: int
+    completed: int
+    failed: int
+    progress: float = Field(..., ge=0.0, le=1.0, description="Fraction des éléments terminés")
+    created_at: str
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class JobResultItem(BaseModel):
+    index: int
+    status: str
+    # Format du mode de la requête (réponse complète ou réponse screen)
+    result: Optional[Union[FactCheckResponse, ScreenResponse]] = None
+    error: Optional[str] = None
+
+class JobResultsResponse(BaseModel):
+    job_id: str
+    offset: int
+    limit: int
+    total: int
+    items: List[JobResultItem]
+
+class ProfileStartRequest(BaseModel):
+    kind: str = Field(..., pattern="^(cprofile|sampling|tracemalloc)$",
+                      description="cprofile, sampling (piles repliées) ou tracemalloc")
+    requests: Optional[int] = Field(None, ge=1, description="Nombre de requêtes à profiler")
+    duration_s: Optional[float] = Field(None, gt=0, le=3600, description="Durée maximale de la session")
+    interval_ms: float = Field(10.0, ge=1.0, description="Intervalle d'échantillonnage (mode sampling)")
+    top_n: int = Field(30, ge=1, le=500, description="Nombre de lignes retenues dans le résultat")
 
 class HealthResponse(BaseModel):
     status: str
@@ -91,6 +200,15 @@ class HealthResponse(BaseModel):
     ollama_status: str
     timestamp: str
 
+class ReadyResponse(BaseModel):
+    ready: bool
+    warm_up: str
+    steps: Dict[str, float]
+    error: Optional[str] = None
+    attempts: Dict[str, int] = Field(default_factory=dict, description="Essais des étapes en échec")
+    startup_s: Optional[float] = None
+    warm_up_s: Optional[float] = None
+
 class QuantumFactCheckerAPI:
     """Classe principale pour gérer l'API de fact-checking quantique"""
     
@@ -99,39 +217,92 @@ class QuantumFactCheckerAPI:
         self.db_folder = "../src/quantum/quantum_db_8qubits/"
         self.n_qubits = 8
         self.k_results = 10
+        self.max_tokens = 2000
+        
+        # Budget de temps par requête (0 = pas d'échéance) et paramètres de dégradation
+        self.default_deadline_ms = float(os.getenv("FACT_CHECK_DEADLINE_MS", "0"))
+        self.llm_reserve_s = float(os.getenv("FACT_CHECK_LLM_RESERVE_S", "10"))
+        self.degraded_k_results = int(os.getenv("FACT_CHECK_DEGRADED_K", "3"))
+        self.llm_tokens_per_second = float(os.getenv("FACT_CHECK_LLM_TOKENS_PER_S", "15"))
+        
+        # Porte de confiance avant le LLM (désactivée par défaut)
+        self.retrieval_gate = RetrievalGateConfig.from_env()
+        
+        # Instructions fixes en préfixe réutilisable (system, context ou inline)
+        self.prompt_prefix_mode = get_prompt_prefix_mode()
+        
+        # Génération en streaming arrêtée dès que verdict + explication sont complets
+        self.llm_streaming = os.getenv("LLM_STREAMING_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.max_explanation_chars = int(os.getenv("LLM_MAX_EXPLANATION_CHARS", "800"))
+        # Découpage des messages longs en affirmations vérifiées en parallèle
+        self.claim_decomposition = os.getenv("CLAIM_DECOMPOSITION", "off").lower()
+        if self.claim_decomposition not in DECOMPOSITION_MODES:
+            raise ValueError(f"CLAIM_DECOMPOSITION inconnu: {self.claim_decomposition} "
+                             f"(attendu: {', '.join(DECOMPOSITION_MODES)})")
+        self.max_sub_claims = int(os.getenv("CLAIM_DECOMPOSITION_MAX_CLAIMS", "4"))
+        # Temps minimal (hors réserve LLM) pour tenter le découpage par LLM, sinon règles de phrases
+        self.decomposition_llm_min_s = float(os.getenv("CLAIM_DECOMPOSITION_LLM_MIN_S", "2.0"))
+        
+        # Mode screen : moins de chunks, extraits courts, verdict seul
+        self.screen_k_results = int(os.getenv("SCREEN_K_RESULTS", "3"))
+        self.screen_excerpt_chars = int(os.getenv("SCREEN_EXCERPT_CHARS", "600"))
+        self.screen_max_tokens = int(os.getenv("SCREEN_MAX_TOKENS", "8"))
+        
+        # Cascade de modèles : bande de certitude de récupération jugée limite (escalade)
+        self.cascade_borderline_min = float(os.getenv("LLM_CASCADE_BORDERLINE_MIN", "0"))
+        self.cascade_borderline_max = float(os.getenv("LLM_CASCADE_BORDERLINE_MAX", "0"))
+        
+        # Lancement spéculatif du LLM sur le top-k cosinus pendant le reranking quantique
+        self.speculative_llm = os.getenv("LLM_SPECULATIVE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.speculation_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("LLM_SPECULATIVE_WORKERS", "4")),
+            thread_name_prefix="llm-speculation"
+        ) if self.speculative_llm else None
+        self.speculation_stats = {'launched': 0, 'hits': 0, 'misses': 0, 'cancelled': 0}
+        self.speculation_lock = threading.Lock()
+        
+        # Plafond de num_predict : ligne VERDICT + explication maximale (≈ 4 caractères par token)
+        self.max_tokens = min(self.max_tokens, self.max_explanation_chars // 4 * 3 // 2 + 32)
+        
+        # Concurrence adaptative (AIMD) devant Ollama et contrôle d'admission (0 = pas de délestage)
+        self.llm_limiter = AdaptiveConcurrencyLimiter(
+            "llm",
+            initial_limit=int(os.getenv("LLM_CONCURRENCY_INITIAL", "4")),
+            max_limit=int(os.getenv("LLM_CONCURRENCY_MAX", "16")),
+            latency_tolerance=float(os.getenv("LLM_CONCURRENCY_LATENCY_TOLERANCE", "2.0"))
+        )
+        self.embedding_limiter = AdaptiveConcurrencyLimiter(
+            "embedding",
+            initial_limit=int(os.getenv("EMBEDDING_CONCURRENCY_INITIAL", "4")),
+            max_limit=int(os.getenv("EMBEDDING_CONCURRENCY_MAX", "32"))
+        )
+        self.admission_max_queue_wait_s = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_S", "0"))
+        self.admission_rejected = 0
+        
+        # Démarrage : accès Cassandra sans objets LlamaIndex, warm-up en arrière-plan (background, sync ou off)
+        self.lean_data_access = os.getenv("API_LEAN_DATA_ACCESS", "true").lower() in ("1", "true", "yes")
+        # Bundle de service partagé entre workers (np.memmap), vide = lecture depuis Cassandra et les QASM
+        self.serving_bundle_dir = os.getenv("SERVING_BUNDLE_DIR", "")
+        self.warm_up_mode = os.getenv("API_WARM_UP", "background").lower()
+        if self.warm_up_mode not in WARM_UP_MODES:
+            raise ValueError(f"API_WARM_UP inconnu: {self.warm_up_mode} (attendu: {', '.join(WARM_UP_MODES)})")
+        self.ready = threading.Event()
+        self.warm_up_state = "pending"
+        self.warm_up_steps: Dict[str, float] = {}
+        self.warm_up_error: Optional[str] = None
+        self.warm_up_s: Optional[float] = None
+        # Étape en échec (Ollama ou Cassandra pas encore démarrés) : nouvel essai avec backoff
+        # exponentiel, puis arrêt du worker pour que le superviseur le redémarre
+        self.warm_up_max_attempts = max(1, int(os.getenv("API_WARM_UP_MAX_ATTEMPTS", "8")))
+        self.warm_up_backoff_s = float(os.getenv("API_WARM_UP_BACKOFF_S", "1"))
+        self.warm_up_backoff_max_s = float(os.getenv("API_WARM_UP_BACKOFF_MAX_S", "30"))
+        self.warm_up_exit_on_failure = os.getenv("API_WARM_UP_EXIT_ON_FAILURE", "true").lower() in ("1", "true", "yes")
+        self.warm_up_attempts: Dict[str, int] = {}
         
         # Initialiser les composants
         self._initialize_components()
-        
-        # Template pour l'analyse LLM - VERSION STRICTE ET DIRECTIVE
-        self.analysis_prompt_template = """
-You are a RIGOROUS and DECISIVE fact-checker. Your job is to verify the following claim using ONLY the provided evidence. 
-You MUST take a clear position and be willing to CONTRADICT the claim if the evidence doesn't support it.
-
-CLAIM: {claim}
-
-EVIDENCE (from chunks):
-{retrieved_docs}
-
-CRITICAL INSTRUCTIONS - READ CAREFULLY:
-1. You MUST be DECISIVE. No hedging, no "maybe", no uncertainty.
-2. If the evidence DIRECTLY supports the claim, say TRUE.
-3. If the evidence CONTRADICTS the claim, say FALSE.
-4. If the evidence is UNRELATED or INSUFFICIENT, say UNVERIFIABLE.
-5. You MUST quote SPECIFIC text from the evidence to justify your verdict.
-6. If the evidence talks about OTHER regions (like Karakoram, Himalayas) but NOT Antarctica, this is NOT evidence for the claim.
-7. Be willing to say FALSE if the evidence doesn't specifically support the claim about Antarctica.
-
-ANTARCTICA-SPECIFIC ANALYSIS:
-- Look for DIRECT statements about Antarctica ice loss/gain
-- If evidence mentions other glaciers (Karakoram, Himalayas), this is NOT about Antarctica
-- If evidence is about general climate change but not Antarctica ice, this is NOT sufficient
-- The claim is SPECIFICALLY about Antarctica gaining ice due to climate change
-
-Format your response EXACTLY as follows:
-VERDICT: [TRUE/FALSE/UNVERIFIABLE]
-EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be direct and clear about why you chose this verdict.]
-"""
+        self.startup_s = time.time() - PROCESS_STARTED_AT
+
     
     def _initialize_components(self):
         """Initialiser tous les composants du système"""
@@ -142,20 +313,65 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             print("  📊 Connexion à Cassandra...")
             self.cassandra_manager = create_cassandra_manager(
                 table_name="fact_checker_docs", 
-                keyspace="fact_checker_keyspace"
+                keyspace="fact_checker_keyspace",
+                lean=self.lean_data_access
             )
             # Utiliser la session Cassandra du cassandra_manager
             self.cassandra_session = self.cassandra_manager.session
             print("  ✅ Session Cassandra initialisée")
             
+            # Bundle de service : génération désignée par CURRENT, rechargée sans redémarrage
+            self.serving_bundles = None
+            if self.serving_bundle_dir:
+                self.serving_bundles = ServingBundleManager(
+                    self.serving_bundle_dir,
+                    check_interval_s=float(os.getenv("SERVING_BUNDLE_CHECK_INTERVAL_S", "5"))
+                )
+                bundle = self.serving_bundles.current()
+                print(f"  📦 Bundle de service: {bundle.generation if bundle else 'aucune génération active'}")
+            
+            # Récupération répartie sur des shards (RETRIEVAL_SHARDS="nom=url,...")
+            self.shard_coordinator = ShardCoordinator.from_env()
+            if self.shard_coordinator is not None:
+                print(f"  🧩 Shards: {', '.join(self.shard_coordinator.shard_names)}")
+            
+            # Pool d'instances Ollama (OLLAMA_ENDPOINTS) pour la génération et les embeddings
+            self.ollama_pool = get_default_pool()
+            # Le modèle d'embedding (LlamaIndex) n'est créé qu'au premier appel
+            embed_fn = lambda texts: self.cassandra_manager.embed_model.get_text_embedding_batch(texts)
+            if self.ollama_pool is not None:
+                print(f"  🔀 Pool Ollama: {', '.join(self.ollama_pool.base_urls)}")
+                embed_fn = create_pooled_embed_fn(self.ollama_pool, self.cassandra_manager.embedding_model)
+            
+            embed_fn = self.embedding_limiter.wrap(embed_fn)
+            self.embed_fn = embed_fn
+            
+            # Micro-batching des embeddings de requêtes concurrentes
+            self.embedding_batcher = create_embedding_batcher(
+                None,
+                max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "16")),
+                max_wait_ms=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")),
+                embed_fn=embed_fn
+            )
+            
+            # Compression des preuves (désactivée par défaut)
+            self.evidence_packer = None
+            if os.getenv("EVIDENCE_PACKING_ENABLED", "false").lower() in ("1", "true", "yes"):
+                self.evidence_packer = EvidencePacker(
+                    embed_fn=embed_fn,
+                    token_budget=int(os.getenv("EVIDENCE_TOKEN_BUDGET", "1200")),
+                    max_embedded_sentences=int(os.getenv("EVIDENCE_MAX_EMBEDDED_SENTENCES", "48"))
+                )
+            
             # Client Ollama
             print("  🤖 Initialisation du client Ollama...")
             self.ollama_client = OllamaClient()
             
-            # Test de connexion
-            print("  ✅ Test de connexion...")
-            test_response = self.ollama_client.generate("Test", max_tokens=5)
-            print(f"  ✅ Ollama OK: {len(test_response)} caractères générés")
+            # Petit modèle de la cascade (désactivée si OLLAMA_SMALL_MODEL est vide)
+            self.small_ollama_client = None
+            if ollama_config.small_model:
+                print(f"  🐇 Cascade activée: {ollama_config.small_model} puis {self.ollama_client.model}")
+                self.small_ollama_client = OllamaClient(model=ollama_config.small_model)
             
             print("✅ API initialisée avec succès!")
             
@@ -163,8 +379,123 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             print(f"❌ Erreur d'initialisation: {e}")
             raise
     
-    def get_chunk_info(self, chunk_id: str) -> tuple[str, str]:
-        """Récupérer les informations d'un chunk depuis Cassandra"""
+    def warm_up(self):
+        """
+        Préchauffer les chemins lents avant d'annoncer l'instance prête (/ready)
+        
+        Qiskit/Aer et PCA, modèle d'embedding (LlamaIndex) chargé dans Ollama, LLM avec
+        évaluation du préfixe système (gardé en cache) et requête Cassandra préparée.
+        """
+        self.warm_up_state = "running"
+        started = time.time()
+        steps = [
+            ("serving_bundle", lambda: self.current_serving_bundle() and self.current_serving_bundle().prefault()),
+            ("shards", lambda: self.shard_coordinator and self.shard_coordinator.ping()),
+            ("quantum", lambda: warm_up_quantum(self.n_qubits)),
+            ("embedding", lambda: self.embed_fn(["warm-up"])),
+            ("llm", lambda: self.ollama_client.generate(
+                "Test", max_tokens=5,
+                system=FACT_CHECK_SYSTEM_PROMPT if self.prompt_prefix_mode == "system" else None
+            )),
+            ("cassandra", lambda: self.cassandra_session.execute(
+                f"SELECT row_id FROM {self.cassandra_manager.keyspace}.{self.cassandra_manager.table_name} LIMIT 1"
+            )),
+        ]
+        try:
+            for name, step in steps:
+                self._run_warm_up_step(name, step)
+        finally:
+            self.warm_up_s = time.time() - started
+        self.warm_up_state = "ready"
+        self.warm_up_error = None
+        self.ready.set()
+        print(f"🔥 Warm-up terminé en {self.warm_up_s:.1f}s (démarrage {self.startup_s:.1f}s)")
+    
+    def _run_warm_up_step(self, name: str, step):
+        """
+        Exécuter une étape de warm-up, avec nouvel essai et backoff exponentiel en cas d'échec
+        
+        Raises:
+            RuntimeError: étape toujours en échec après API_WARM_UP_MAX_ATTEMPTS essais
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            step_started = time.time()
+            try:
+                step()
+                break
+            except Exception as e:
+                self.warm_up_attempts[name] = attempt
+                self.warm_up_error = f"{name}: {e}"
+                if attempt >= self.warm_up_max_attempts:
+                    self.warm_up_state = "failed"
+                    logger.error(f"❌ Warm-up échoué après {attempt} essai(s) ({self.warm_up_error})")
+                    raise RuntimeError(f"Warm-up échoué: {self.warm_up_error}") from e
+                delay = min(self.warm_up_backoff_max_s, self.warm_up_backoff_s * 2 ** (attempt - 1))
+                self.warm_up_state = "retrying"
+                logger.warning(f"⚠️ Warm-up {name} en échec (essai {attempt}/{self.warm_up_max_attempts}), "
+                               f"nouvel essai dans {delay:.0f}s: {e}")
+                time.sleep(delay)
+        self.warm_up_steps[name] = time.time() - step_started
+        logger.info("warm_up_step", extra={"event": "warm_up_step", "step": name,
+                                            "duration_s": self.warm_up_steps[name], "attempts": attempt})
+    
+    def _background_warm_up(self):
+        """Warm-up en thread ; un échec définitif arrête le worker (sinon il resterait non prêt)"""
+        try:
+            self.warm_up()
+        except RuntimeError:
+            if self.warm_up_exit_on_failure:
+                print(f"❌ Arrêt du worker : {self.warm_up_error}")
+                stop_logging()
+                os._exit(3)
+    
+    def start_warm_up(self):
+        """
+        Lancer le warm-up selon API_WARM_UP (background : thread dédié, /ready à 503 d'ici là ;
+        sync : un échec définitif fait échouer le démarrage)
+        """
+        if self.warm_up_mode == "off":
+            self.warm_up_state = "skipped"
+            self.ready.set()
+        elif self.warm_up_mode == "sync":
+            self.warm_up()
+        else:
+            threading.Thread(target=self._background_warm_up, name="api-warm-up", daemon=True).start()
+    
+    def readiness(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready.is_set(),
+            "warm_up": self.warm_up_state,
+            "steps": dict(self.warm_up_steps),
+            "error": self.warm_up_error,
+            "attempts": dict(self.warm_up_attempts),
+            "startup_s": self.startup_s,
+            "warm_up_s": self.warm_up_s,
+        }
+    
+    def current_serving_bundle(self):
+        """Génération active du bundle de service (None si désactivé ou absent)"""
+        return self.serving_bundles.current() if self.serving_bundles is not None else None
+    
+    def get_chunk_info(self, chunk_id: str, bundle=None) -> tuple[str, str]:
+        """
+        Récupérer les informations d'un chunk (bundle de service, sinon Cassandra)
+        
+        bundle est la génération utilisée pour la recherche de la requête : les chunks
+        sont lus dans la même génération que le classement (génération active si None).
+        """
+        bundle = bundle if bundle is not None else self.current_serving_bundle()
+        if bundle is not None:
+            chunk = bundle.chunk(chunk_id)
+            if chunk is not None:
+                add_span_counter("bundle_bytes_read", len(chunk[0]) + len(chunk[1]))
+                return chunk
+        if self.shard_coordinator is not None:
+            chunk = self.shard_coordinator.get_chunk(chunk_id)
+            if chunk is not None:
+                return chunk
         try:
             # Utiliser la session Cassandra existante si disponible
             if hasattr(self, 'cassandra_session'):
@@ -182,15 +513,18 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             row_id = chunk_id  # Utiliser "doc_157" comme row_id
             
             query = "SELECT body_blob, metadata_s FROM fact_checker_keyspace.fact_checker_docs WHERE partition_id=%s AND row_id=%s;"
-            row = session.execute(query, (partition_id, row_id)).one()
+            with metrics_registry.in_flight("cassandra"):
+                row = session.execute(query, (partition_id, row_id)).one()
             
             # Si pas trouvé, essayer de récupérer directement par row_id
             if not row or not row.body_blob:
                 query_fallback = "SELECT body_blob, metadata_s FROM fact_checker_keyspace.fact_checker_docs WHERE row_id=%s LIMIT 1 ALLOW FILTERING;"
-                row = session.execute(query_fallback, (row_id,)).one()
+                with metrics_registry.in_flight("cassandra"):
+                    row = session.execute(query_fallback, (row_id,)).one()
             
             if row and row.body_blob:
                 chunk_text = row.body_blob
+                add_span_counter("cassandra_bytes_read", len(chunk_text) + len(str(row.metadata_s or "")))
                 pdf_name = row.metadata_s.get('source', '[PDF inconnu]') if row.metadata_s else '[PDF inconnu]'
                 return chunk_text, pdf_name
             else:
@@ -199,37 +533,232 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
         except Exception:
             return "[Erreur de récupération]", "[Erreur]"
     
-    def generate_llm_response(self, claim: str, chunk_ids: List[str]) -> tuple[str, str]:
-        """Générer la réponse LLM pour l'analyse"""
-        try:
-            # Préparer les documents (même format que l'app Streamlit)
+    def get_sources(self, chunk_ids: List[str], max_sources: int = 5, bundle=None) -> List[str]:
+        """Noms des PDF sources des premiers chunks, sans doublons"""
+        sources_used = []
+        with span("sources_fetch"):
+            for chunk_id in chunk_ids[:max_sources]:
+                _, pdf_name = self.get_chunk_info(chunk_id, bundle)
+                if pdf_name not in sources_used:
+                    sources_used.append(pdf_name)
+        return sources_used
+    
+    def build_llm_prompt(self, claim: str, chunk_ids: List[str], deadline: Deadline,
+                         evidence_info: Optional[Dict[str, Any]] = None,
+                         mode: str = "full", bundle=None,
+                         query_embedding=None) -> Tuple[Optional[str], str]:
+        """
+        Construire le prompt d'analyse (préfixe fixe, partie variable) à partir des chunks
+        
+        Si evidence_info est fourni et que la compression des preuves est active,
+        il reçoit la comptabilité des tokens économisés. query_embedding (embedding du
+        claim calculé par la récupération) évite de le ré-embedder pour la compression. En mode "screen", le prompt
+        compact n'utilise que les premiers chunks, en extraits courts.
+        """
+        if mode == "screen":
             docs = []
+            with time_operation_context("chunk_fetch"):
+                for chunk_id in chunk_ids[:self.screen_k_results]:
+                    chunk_text, pdf_name = self.get_chunk_info(chunk_id, bundle)
+                    docs.append(f"[{pdf_name}]\n{chunk_text[:self.screen_excerpt_chars]}")
+            return build_screen_prompt(claim, "\n\n".join(docs), self.prompt_prefix_mode)
+        
+        # Mode dégradé : moins de chunks si le budget restant est serré
+        if deadline.remaining() < 2 * self.llm_reserve_s and len(chunk_ids) > self.degraded_k_results:
+            chunk_ids = chunk_ids[:self.degraded_k_results]
+            deadline.degrade("evidence_reduced")
+        
+        # Récupérer le texte des chunks
+        evidence = []
+        with time_operation_context("chunk_fetch"):
             for chunk_id in chunk_ids:
-                chunk_text, pdf_name = self.get_chunk_info(chunk_id)
+                if evidence and deadline.expired():
+                    deadline.degrade("chunk_fetch_truncated")
+                    break
+                chunk_text, pdf_name = self.get_chunk_info(chunk_id, bundle)
+                evidence.append({'chunk_id': chunk_id, 'pdf_name': pdf_name, 'text': chunk_text})
+        
+        if self.evidence_packer is not None:
+            # Preuves compressées : recouvrements retirés, phrases pertinentes sous budget
+            retrieved_docs, accounting = self.evidence_packer.pack(claim, evidence, query_embedding)
+            if evidence_info is not None:
+                evidence_info.update(accounting)
+        else:
+            # Préparer les documents (même format que l'app Streamlit)
+            docs = []
+            for item in evidence:
+                chunk_text = item['text']
                 # Prendre plus de contexte pour une meilleure analyse (comme l'app Streamlit)
                 excerpt = chunk_text[:1500] + ("..." if len(chunk_text) > 1500 else "")
-                docs.append(f"[Source PDF: {pdf_name}]\n[Chunk ID: {chunk_id}]\n{excerpt}")
-            
+                docs.append(f"[Source PDF: {item['pdf_name']}]\n[Chunk ID: {item['chunk_id']}]\n{excerpt}")
             retrieved_docs = "\n\n".join(docs)
-            
-            # Formater le prompt
-            prompt = format_prompt(
-                self.analysis_prompt_template, 
-                claim=claim, 
-                retrieved_docs=retrieved_docs
+        
+        # Formater le prompt : préfixe fixe d'instructions + partie variable (claim, preuves)
+        return build_fact_check_prompt(claim, retrieved_docs, self.prompt_prefix_mode)
+    
+    def run_llm(self, system: Optional[str], prompt: str, deadline: Deadline,
+                client: Optional[OllamaClient] = None,
+                cancel_event: Optional[threading.Event] = None,
+                mode: str = "full") -> str:
+        """
+        Générer la réponse pour un prompt déjà construit (client par défaut : grand modèle)
+        
+        cancel_event permet d'annuler une génération spéculative devenue inutile
+        (effectif en streaming ; sinon la réponse est simplement ignorée).
+        """
+        client = client or self.ollama_client
+        if cancel_event is not None and cancel_event.is_set():
+            return ""
+        context = None
+        if self.prompt_prefix_mode == "context":
+            # Le préfixe est évalué une seule fois, son contexte est repris à chaque requête
+            add_span_counter("prefix_cache_hits" if client.is_prefix_cached(system) else "prefix_cache_misses")
+            context = client.get_prefix_context(system, timeout=deadline.timeout())
+        
+        # Mode dégradé : limiter num_predict à ce que le budget restant permet de générer
+        max_tokens = self.screen_max_tokens if mode == "screen" else self.max_tokens
+        affordable_tokens = deadline.remaining() * self.llm_tokens_per_second
+        if affordable_tokens < max_tokens:
+            # Plancher de 64 tokens, sans jamais dépasser le plafond du mode (screen : quelques tokens)
+            max_tokens = max(min(64, max_tokens), int(affordable_tokens))
+            deadline.degrade("num_predict_reduced")
+        
+        # Place dans le limiteur de concurrence : les requêtes délestables lèvent AdmissionRejected
+        # au-delà du seuil ; les autres (jobs, batch) attendent jusqu'à l'échéance puis se passent du LLM
+        with span("llm_queue_wait"):
+            if deadline.sheddable:
+                self.llm_limiter.acquire(deadline.queue_timeout())
+            else:
+                try:
+                    self.llm_limiter.acquire(deadline.timeout(minimum=0.0), shed=False)
+                except AdmissionRejected:
+                    deadline.degrade("llm_queue_timeout")
+                    return ""
+        llm_start = time.time()
+        response = ""
+        try:
+            with time_operation_context("llm_generate", {"model": client.model, "max_tokens": max_tokens}):
+                response = self._generate(client, prompt, system, context, max_tokens, deadline, cancel_event, mode)
+        finally:
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            # Référence de latence propre au modèle et au mode (screen : quelques tokens, full : explication)
+            tier = "small" if client is self.small_ollama_client else "large"
+            self.llm_limiter.release(time.time() - llm_start if response else None, sample=not cancelled,
+                                     latency_class=f"{tier}:{mode}")
+        if deadline.expired():
+            deadline.degrade("llm_timeout" if not response else "llm_truncated")
+        
+        return response
+    
+    def _generate(self, client: OllamaClient, prompt: str, system: Optional[str], context: Optional[list],
+                  max_tokens: int, deadline: Deadline, cancel_event: Optional[threading.Event],
+                  mode: str = "full") -> str:
+        """Appel Ollama proprement dit (streaming avec arrêt anticipé ou génération complète)"""
+        # Générer la réponse avec température très basse pour être décisif
+        generation_kwargs = dict(
+            temperature=0.01,  # Température très basse pour des réponses décisives et cohérentes
+            max_tokens=max_tokens,
+            timeout=deadline.timeout(),
+            system=system if self.prompt_prefix_mode == "system" else None,
+            context=context,
+            raw=context is not None,
+            stop=FACT_CHECK_STOP_SEQUENCES
+        )
+        if self.llm_streaming:
+            # Annuler la génération dès que le parser a tout ce qu'il utilise (ou à l'échéance)
+            response = client.generate_stream(
+                prompt,
+                should_stop=lambda text: (
+                    (verdict_complete(text) if mode == "screen" else answer_complete(text, self.max_explanation_chars))
+                    or deadline.expired() or (cancel_event is not None and cancel_event.is_set())
+                ),
+                **generation_kwargs
             )
+        else:
+            response = client.generate(prompt, **generation_kwargs)
+        return response
+    
+    def generate_llm_response(self, claim: str, chunk_ids: List[str],
+                              deadline: Optional[Deadline] = None,
+                              evidence_info: Optional[Dict[str, Any]] = None,
+                              client: Optional[OllamaClient] = None) -> tuple[str, str]:
+        """
+        Générer la réponse LLM pour l'analyse
+        
+        Si evidence_info est fourni et que la compression des preuves est active,
+        il reçoit la comptabilité des tokens économisés.
+        """
+        deadline = deadline or Deadline()
+        try:
+            system, prompt = self.build_llm_prompt(claim, chunk_ids, deadline, evidence_info)
+            response = self.run_llm(system, prompt, deadline, client)
+            full_prompt = prompt if system is None else f"{system}\n{prompt}"
+            return full_prompt, response
             
-            # Générer la réponse avec température très basse pour être décisif
-            response = self.ollama_client.generate(
-                prompt, 
-                temperature=0.01  # Température très basse pour des réponses décisives et cohérentes
-            )
+        except Exception as e:
+            return "", f"Erreur lors de l'analyse: {str(e)}"
+    
+    def cascade_escalation_reason(self, llm_result: Dict[str, Any],
+                                  similarity_scores: List[float]) -> Optional[str]:
+        """Raison d'escalader la réponse du petit modèle vers le grand (None = réponse acceptée)"""
+        if not llm_result.get('parsed'):
+            return "parse_failed"
+        if llm_result['verdict'] == 'UNVERIFIABLE':
+            return "unverifiable"
+        certainty = self.retrieval_certainty(similarity_scores)
+        if self.cascade_borderline_min <= certainty < self.cascade_borderline_max:
+            return "borderline_retrieval"
+        return None
+    
+    def generate_verdict(self, claim: str, chunk_ids: List[str], similarity_scores: List[float],
+                         deadline: Optional[Deadline] = None,
+                         evidence_info: Optional[Dict[str, Any]] = None,
+                         llm_info: Optional[Dict[str, Any]] = None,
+                         cancel_event: Optional[threading.Event] = None,
+                         mode: str = "full", bundle=None,
+                         query_embedding=None,
+                         use_small_model: bool = True) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Étape LLM avec cascade : le petit modèle répond d'abord, le grand modèle
+        n'est appelé que si la réponse est incertaine
+        
+        llm_info reçoit le niveau qui a répondu ('small' ou 'large') et la raison d'escalade.
+        bundle est la génération du bundle de service utilisée pour la recherche, et
+        query_embedding l'embedding du claim qu'elle a calculé.
+        use_small_model=False saute le petit modèle (escalade déjà décidée).
+        
+        Returns:
+            (prompt, réponse brute, réponse parsée)
+        """
+        deadline = deadline or Deadline()
+        llm_info = llm_info if llm_info is not None else {}
+        try:
+            with span("build_prompt", {"n_chunks": len(chunk_ids)}):
+                system, prompt = self.build_llm_prompt(claim, chunk_ids, deadline, evidence_info, mode, bundle,
+                                                       query_embedding)
+            full_prompt = prompt if system is None else f"{system}\n{prompt}"
             
-            return prompt, response
+            if self.small_ollama_client is not None and use_small_model:
+                response = self.run_llm(system, prompt, deadline, self.small_ollama_client, cancel_event, mode)
+                llm_result = self.parse_llm_response(response)
+                reason = self.cascade_escalation_reason(llm_result, similarity_scores)
+                # Sans temps restant pour le grand modèle, la réponse du petit est conservée
+                if reason is None or deadline.remaining() < self.llm_reserve_s:
+                    llm_info.update({'llm_tier': 'small', 'escalation_reason': reason})
+                    return full_prompt, response, llm_result
+                llm_info['escalation_reason'] = reason
             
+            response = self.run_llm(system, prompt, deadline, cancel_event=cancel_event, mode=mode)
+            llm_info['llm_tier'] = 'large'
+            return full_prompt, response, self.parse_llm_response(response)
+            
+        except AdmissionRejected:
+            raise
         except Exception as e:
-            return "", f"Erreur lors de l'analyse: {str(e)}"
+            response = f"Erreur lors de l'analyse: {str(e)}"
+            return "", response, self.parse_llm_response(response)
     
+    @time_operation("llm_parse")
     def parse_llm_response(self, response: str) -> Dict[str, Any]:
         """Parser la réponse LLM pour extraire les informations (même format que l'app Streamlit)"""
         try:
@@ -238,7 +767,8 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
                 'verdict': 'UNVERIFIABLE',
                 'confidence': 'MEDIUM',  # Valeur par défaut
                 'explanation': 'Impossible de parser la réponse LLM',
-                'sources': []
+                'sources': [],
+                'parsed': False
             }
             
             current_section = None
@@ -250,6 +780,7 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
                     verdict = line.replace('VERDICT:', '').strip()
                     if verdict in ['TRUE', 'FALSE', 'UNVERIFIABLE']:
                         result['verdict'] = verdict
+                        result['parsed'] = True
                     current_section = 'verdict'
                 elif line.startswith('EXPLANATION:'):
                     current_section = 'explanation'
@@ -263,7 +794,7 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             
             # Joindre toutes les lignes d'explication
             if explanation_lines:
-                result['explanation'] = '\n'.join(explanation_lines)
+                result['explanation'] = truncate_explanation('\n'.join(explanation_lines), self.max_explanation_chars)
             else:
                 # Si pas d'explication trouvée, prendre tout après VERDICT:
                 response_parts = response.split('VERDICT:')
@@ -285,24 +816,28 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             return result
             
         except Exception as e:
-            print(f"⚠️ Erreur parsing LLM: {e}")
+            logger.warning(f"Erreur parsing LLM: {e}")
             return {
                 'verdict': 'UNVERIFIABLE',
                 'confidence': 'LOW',
                 'explanation': f'Erreur de parsing: {str(e)}',
-                'sources': []
+                'sources': [],
+                'parsed': False
             }
     
+    @staticmethod
+    def retrieval_certainty(similarity_scores: List[float]) -> float:
+        """Part du score de certitude due à la récupération (similarités moyenne et maximale)"""
+        if not similarity_scores:
+            return 0.0
+        return float(np.mean(similarity_scores) * 0.6 + max(similarity_scores) * 0.4)
+    
     def calculate_certainty_score(self, similarity_scores: List[float], llm_result: Dict[str, Any]) -> float:
         """Calculer le score de certitude basé sur les similarités et le verdict LLM"""
         try:
             if not similarity_scores:
                 return 0.0
             
-            # Score basé sur la similarité moyenne
-            avg_similarity = np.mean(similarity_scores)
-            max_similarity = max(similarity_scores)
-            
             # Score basé sur le verdict LLM
             verdict_scores = {
                 'TRUE': 0.8,
@@ -317,7 +852,7 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             }
             
             # Calculer le score final
-            similarity_score = (avg_similarity * 0.6 + max_similarity * 0.4)
+            similarity_score = self.retrieval_certainty(similarity_scores)
             verdict_score = verdict_scores.get(llm_result['verdict'], 0.5)
             confidence_multiplier = confidence_multipliers.get(llm_result['confidence'], 0.7)
             
@@ -328,13 +863,295 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             return min(1.0, max(0.0, final_score))
             
         except Exception as e:
-            print(f"⚠️ Erreur calcul score: {e}")
+            logger.warning(f"Erreur calcul score: {e}")
             return 0.5
     
-    async def fact_check_message(self, request: FactCheckRequest) -> FactCheckResponse:
-        """Vérifier la véracité d'un message"""
+    def launch_speculation(self, claim: str, candidates: List[tuple], deadline: Deadline,
+                           mode: str = "full", bundle=None, query_embedding=None) -> Dict[str, Any]:
+        """Démarrer l'étape LLM sur le top-k cosinus sans attendre le reranking quantique"""
+        # Échéance dérivée : les dégradations d'une spéculation abandonnée ne remontent pas dans la réponse
+        speculation = {
+            'chunk_ids': [chunk_id for _, _, chunk_id in candidates],
+            'deadline': deadline.child(),
+            'cancel_event': threading.Event(),
+            'evidence_info': {},
+            'llm_info': {},
+        }
+        # Copie du contexte : les logs du thread de spéculation gardent l'identifiant de requête
+        speculation['future'] = self.speculation_executor.submit(
+            contextvars.copy_context().run, profiler_controller.wrap(self.generate_verdict), claim, speculation['chunk_ids'],
+            [score for score, _, _ in candidates], speculation['deadline'],
+            speculation['evidence_info'], speculation['llm_info'], speculation['cancel_event'], mode, bundle,
+            query_embedding
+        )
+        self._record_speculation('launched')
+        return speculation
+    
+    def _record_speculation(self, outcome: str):
+        with self.speculation_lock:
+            self.speculation_stats[outcome] += 1
+    
+    def get_speculation_stats(self) -> Dict[str, Any]:
+        """Taux de succès de la spéculation : top-k final identique au top-k cosinus"""
+        with self.speculation_lock:
+            stats = dict(self.speculation_stats)
+        decided = stats['hits'] + stats['misses']
+        stats['enabled'] = self.speculative_llm
+        stats['hit_rate'] = stats['hits'] / decided if decided else None
+        return stats
+    
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Jauges et ratios de cache exposés par /metrics (files, appels Ollama en cours, caches)"""
+        queue_depth = MetricFamily("fact_check_queue_depth", "gauge", "Requêtes en attente par file")
+        in_flight = MetricFamily("fact_check_ollama_in_flight", "gauge", "Appels Ollama en cours par limiteur")
+        limit = MetricFamily("fact_check_concurrency_limit", "gauge", "Limite de concurrence adaptative")
+        for limiter in (self.llm_limiter, self.embedding_limiter):
+            stats = limiter.get_stats()
+            queue_depth.add(stats['queue_depth'], {"queue": f"{limiter.name}_limiter"})
+            in_flight.add(stats['in_flight'], {"limiter": limiter.name})
+            limit.add(stats['limit'], {"limiter": limiter.name})
+        queue_depth.add(self.embedding_batcher.get_stats()['queue_depth'], {"queue": "embedding_batcher"})
+        if self.speculation_executor is not None:
+            queue_depth.add(self.speculation_executor._work_queue.qsize(), {"queue": "llm_speculation"})
+        
+        families = [queue_depth, in_flight, limit]
+        if self.ollama_pool is not None:
+            outstanding = MetricFamily("fact_check_ollama_endpoint_outstanding", "gauge",
+                                       "Requêtes en cours par instance Ollama")
+            for endpoint in self.ollama_pool.get_stats()['endpoints']:
+                outstanding.add(endpoint['outstanding'], {"endpoint": endpoint['base_url']})
+            families.append(outstanding)
+        
+        hit_ratio = MetricFamily("fact_check_cache_hit_ratio", "gauge", "Taux de succès des caches")
+        speculation = self.get_speculation_stats()
+        if speculation['hit_rate'] is not None:
+            hit_ratio.add(speculation['hit_rate'], {"cache": "llm_speculation"})
+        for tier, client in (("large", self.ollama_client), ("small", self.small_ollama_client)):
+            if client is None:
+                continue
+            lookups = client.prefix_cache_stats['hits'] + client.prefix_cache_stats['misses']
+            if lookups:
+                hit_ratio.add(client.prefix_cache_stats['hits'] / lookups, {"cache": f"prefix_context_{tier}"})
+        families.append(hit_ratio)
+        families.append(MetricFamily("fact_check_admission_rejected_total", "counter",
+                                     "Requêtes refusées par le contrôle d'admission").add(self.admission_rejected))
+        bundle = self.current_serving_bundle()
+        if bundle is not None:
+            families.append(MetricFamily("fact_check_serving_bundle_info", "gauge",
+                                         "Génération active du bundle de service")
+                            .add(1, {"generation": bundle.generation}))
+            families.append(MetricFamily("fact_check_serving_bundle_swaps_total", "counter",
+                                         "Générations chargées par ce worker")
+                            .add(self.serving_bundles.swaps))
+        families.append(MetricFamily("fact_check_ready", "gauge", "Instance prête (warm-up terminé)")
+                        .add(1 if self.ready.is_set() else 0))
+        families.append(MetricFamily("fact_check_startup_seconds", "gauge",
+                                     "Durée du démarrage par étape (init et warm-up)")
+                        .add(self.startup_s, {"step": "init"}))
+        for name, duration in self.warm_up_steps.items():
+            families[-1].add(duration, {"step": f"warm_up_{name}"})
+        return families
+    
+    def check_admission(self):
+        """
+        Délester avant tout travail si l'attente estimée dans la file LLM dépasse le seuil
+        
+        Raises:
+            AdmissionRejected: requête à refuser (503 + Retry-After)
+        """
+        if self.admission_max_queue_wait_s <= 0:
+            return
+        expected_wait = self.llm_limiter.expected_queue_wait()
+        if expected_wait > self.admission_max_queue_wait_s:
+            self.admission_rejected += 1
+            raise AdmissionRejected("llm", expected_wait)
+    
+    def decompose_claims(self, message: str, deadline: Deadline) -> List[str]:
+        """
+        Découper un message en affirmations (règles de phrases ou appel LLM court)
+        
+        L'appel LLM passe par le limiteur et respecte l'échéance de la requête ; si le budget
+        est serré ou qu'aucune place ne se libère à temps, les règles de phrases sont utilisées.
+        """
+        mode = self.claim_decomposition
+        if mode == "llm" and deadline.retrieval_remaining() < self.decomposition_llm_min_s:
+            deadline.degrade("decomposition_rules")
+            mode = "rules"
+        client = self.small_ollama_client or self.ollama_client
+        tier = "small" if client is self.small_ollama_client else "large"
+        
+        def generate(prompt: str) -> str:
+            with span("llm_queue_wait"):
+                try:
+                    self.llm_limiter.acquire(
+                        deadline.queue_timeout() if deadline.sheddable else deadline.timeout(minimum=0.0),
+                        shed=False
+                    )
+                except AdmissionRejected:
+                    # Réponse vide : decompose_message se replie sur les règles de phrases
+                    deadline.degrade("decomposition_rules")
+                    return ""
+            llm_start = time.time()
+            response = ""
+            try:
+                with time_operation_context("llm_generate", {"model": client.model, "max_tokens": 200}):
+                    response = client.generate(prompt, temperature=0.0, max_tokens=200,
+                                               timeout=deadline.timeout())
+            finally:
+                self.llm_limiter.release(time.time() - llm_start if response else None,
+                                         latency_class=f"{tier}:decompose")
+            return response
+        
+        return decompose_message(message, mode, self.max_sub_claims, generate_fn=generate)
+    
+    async def fact_check_claims(self, request: FactCheckRequest, claims: List[str], deadline: Deadline,
+                                shed_load: bool = False, raise_errors: bool = False) -> FactCheckResponse:
+        """
+        Vérifier chaque affirmation en parallèle et agréger les verdicts
+        
+        Les récupérations concurrentes partagent les lots du micro-batcher d'embeddings ;
+        la latence suit l'affirmation la plus lente et non la taille totale des preuves.
+        """
+        start_time = time.time()
+        deadline_ms = max(1.0, deadline.remaining() * 1000) if deadline.enabled else None
+        results = await asyncio.gather(*(
+            self.fact_check_message(
+                request.model_copy(update={'message': claim}),
+                deadline_ms=deadline_ms, shed_load=shed_load, decompose=False, raise_errors=raise_errors
+            )
+            for claim in claims
+        ))
+        
+        sources_used = []
+        # Dégradations du découpage lui-même, puis celles de chaque affirmation
+        degradations = list(deadline.degradations)
+        for result in results:
+            sources_used += [source for source in result.sources_used if source not in sources_used]
+            degradations += [name for name in result.degradations if name not in degradations]
+        confidence_order = ['LOW', 'MEDIUM', 'HIGH']
+        tiers = {result.llm_tier for result in results if result.llm_tier}
+        
+        return FactCheckResponse(
+            message_id=f"msg_{int(time.time() * 1000)}",
+            certainty_score=float(np.mean([result.certainty_score for result in results])),
+            verdict=aggregate_verdicts([result.verdict for result in results]),
+            explanation="\n".join(
+                f"[{i}] {claim} → {result.verdict}: {result.explanation}"
+                for i, (claim, result) in enumerate(zip(claims, results), 1)
+            ),
+            confidence_level=min((result.confidence_level for result in results),
+                                 key=lambda level: confidence_order.index(level) if level in confidence_order else 0),
+            sources_used=sources_used,
+            processing_time=time.time() - start_time,
+            timestamp=datetime.now().isoformat(),
+            degradations=degradations,
+            early_exit=all(result.early_exit for result in results),
+            llm_tier=('large' if 'large' in tiers else 'small') if tiers else None,
+            sub_claims=[
+                SubClaimResult(
+                    claim=claim,
+                    verdict=result.verdict,
+                    certainty_score=result.certainty_score,
+                    explanation=result.explanation,
+                    sources_used=result.sources_used
+                )
+                for claim, result in zip(claims, results)
+            ]
+        )
+    
+    async def fact_check_message(self, request: FactCheckRequest,
+                                 deadline_ms: Optional[float] = None,
+                                 shed_load: bool = False,
+                                 decompose: bool = True,
+                                 request_id: Optional[str] = None,
+                                 explain: bool = False,
+                                 raise_errors: bool = False) -> FactCheckResponse:
+        """
+        Vérifier la véracité d'un message (deadline_ms remplace l'échéance configurée)
+        
+        Avec shed_load, l'attente dans la file LLM est bornée par le seuil d'admission
+        et AdmissionRejected est levée au-delà (requêtes interactives uniquement).
+        Si le découpage est activé et que le message contient plusieurs affirmations,
+        elles sont vérifiées en parallèle (decompose=False pour une affirmation seule).
+        Les logs et la trace de la requête portent request_id (généré s'il n'est pas fourni).
+        Avec explain, la réponse détaille le plan de récupération et le coût de chaque étape.
+        Une erreur du pipeline donne un verdict UNVERIFIABLE, sauf avec raise_errors
+        (batch hors-ligne) où l'exception est propagée pour que le message soit retraité.
+        """
+        explain_info: Dict[str, Any] = {}
+        with request_context(request_id) as current_id, \
+                trace_request(current_id, "fact_check", {"mode": request.mode}) as trace:
+            async with profiler_controller.request(current_id):
+                result = await self._fact_check_message(request, deadline_ms, shed_load, decompose, explain_info,
+                                                        raise_errors)
+        if explain:
+            result.explain = self.build_explain(explain_info, trace)
+        if decompose:
+            # Un message compte une fois, même découpé en sous-affirmations
+            metrics_registry.inc("fact_check_requests_total", {"verdict": result.verdict, "mode": request.mode})
+        return result
+    
+    def build_explain(self, explain_info: Dict[str, Any], trace) -> Dict[str, Any]:
+        """
+        Plan de récupération et coût des étapes, à partir de retrieval_info / llm_info
+        et des spans de la trace (durées, octets lus dans Cassandra, succès de cache)
+        """
+        retrieval_info = explain_info.get('retrieval_info', {})
+        llm_info = explain_info.get('llm_info', {})
+        explain = {
+            'engine': retrieval_info.get('engine'),
+            'ranking': retrieval_info.get('ranking'),
+            'candidates': {
+                'rows_scanned': retrieval_info.get('prefilter_rows_scanned'),
+                'vectors_scored': retrieval_info.get('prefilter_vectors_scored'),
+                'prefilter_top': retrieval_info.get('prefilter_candidates'),
+                'circuits_resolved': retrieval_info.get('circuits_resolved'),
+                'circuits_missing': retrieval_info.get('circuits_missing'),
+                'circuits_simulated': retrieval_info.get('circuits_scored'),
+                'top_k': explain_info.get('top_k'),
+            },
+            'gate': explain_info.get('gate'),
+            'llm': {
+                'tier': llm_info.get('llm_tier'),
+                'escalation_reason': llm_info.get('escalation_reason'),
+            },
+            'cache': {'speculation': explain_info.get('speculation')},
+            'sub_claims': explain_info.get('sub_claims'),
+        }
+        if trace is not None:
+            bytes_read = trace.attribute_totals("cassandra_bytes_read")
+            explain['cassandra_bytes_read'] = {**bytes_read, 'total': sum(bytes_read.values())}
+            explain['cache']['prefix_context_hits'] = sum(trace.attribute_totals("prefix_cache_hits").values())
+            explain['cache']['prefix_context_misses'] = sum(trace.attribute_totals("prefix_cache_misses").values())
+            explain['stage_times_ms'] = {name: duration * 1000 for name, duration in trace.durations_by_name().items()}
+            explain['trace_id'] = trace.trace_id
+        else:
+            explain['stage_times_ms'] = explain_info.get('stage_times_ms')
+        return explain
+    
+    async def _fact_check_message(self, request: FactCheckRequest, deadline_ms: Optional[float],
+                                  shed_load: bool, decompose: bool,
+                                  explain_info: Optional[Dict[str, Any]] = None,
+                                  raise_errors: bool = False) -> FactCheckResponse:
+        if explain_info is None:
+            explain_info = {}
         start_time = time.time()
         message_id = f"msg_{int(time.time() * 1000)}"
+        deadline = Deadline.from_ms(
+            deadline_ms if deadline_ms is not None else self.default_deadline_ms,
+            llm_reserve_s=self.llm_reserve_s,
+            max_queue_wait_s=self.admission_max_queue_wait_s if shed_load and self.admission_max_queue_wait_s > 0 else None
+        )
+        
+        if decompose and self.claim_decomposition != "off":
+            claims = await asyncio.to_thread(self.decompose_claims, request.message, deadline)
+            if len(claims) > 1:
+                explain_info['sub_claims'] = len(claims)
+                return await self.fact_check_claims(request, claims, deadline, shed_load, raise_errors)
+        
+        speculation = {}
+        # Mode screen : verdict et score seulement, sans sources ni logs détaillés
+        screen = request.mode == "screen"
         
         try:
             # Démarrer la session de performance
@@ -342,13 +1159,33 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             
             # Recherche quantique
             quantum_search_start = time.time()
+            retrieval_info = {}
+            explain_info['retrieval_info'] = retrieval_info
+            explain_info['top_k'] = self.screen_k_results if screen else self.k_results
+            # Génération du bundle figée pour toute la requête (classement et lecture des chunks)
+            bundle = self.current_serving_bundle()
+            on_prefilter = None
+            if self.speculative_llm:
+                def on_prefilter(candidates):
+                    speculation.update(self.launch_speculation(request.message, candidates, deadline,
+                                                               request.mode, bundle,
+                                                               retrieval_info.get('query_embedding')))
+            # Exécuté dans un thread pour que les requêtes concurrentes
+            # puissent partager un lot d'embeddings
             with time_operation_context("quantum_search"):
-                results = retrieve_top_k(
+                results = await asyncio.to_thread(
+                    profiler_controller.wrap(retrieve_top_k),
                     request.message,
                     self.db_folder,
-                    k=self.k_results,
+                    k=self.screen_k_results if screen else self.k_results,
                     n_qubits=self.n_qubits,
-                    cassandra_manager=self.cassandra_manager
+                    cassandra_manager=self.cassandra_manager,
+                    embedding_batcher=self.embedding_batcher,
+                    deadline=deadline,
+                    retrieval_info=retrieval_info,
+                    on_prefilter=on_prefilter,
+                    serving_bundle=bundle,
+                    shard_coordinator=self.shard_coordinator
                 )
             quantum_search_time = time.time() - quantum_search_start
             
@@ -356,65 +1193,133 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
             chunk_ids = [chunk_id for score, qasm_path, chunk_id in results]
             similarity_scores = [score for score, qasm_path, chunk_id in results]
             
+            # Porte de confiance : preuves sans rapport → UNVERIFIABLE sans appel LLM
+            signals = retrieval_signals(similarity_scores, retrieval_info)
+            gate_passed, gate_reasons = evaluate_gate(signals, self.retrieval_gate)
+            explain_info['gate'] = {'passed': gate_passed, 'reasons': gate_reasons}
+            if not gate_passed:
+                logger.info("retrieval_gate_closed", extra={'gate_reasons': gate_reasons})
+                if speculation:
+                    speculation['cancel_event'].set()
+                    self._record_speculation('cancelled')
+                    explain_info['speculation'] = 'cancelled'
+                llm_result = {
+                    'verdict': 'UNVERIFIABLE',
+                    'confidence': 'LOW',
+                    'explanation': gated_explanation(gate_reasons),
+                    'sources': []
+                }
+                return FactCheckResponse(
+                    message_id=message_id,
+                    certainty_score=self.calculate_certainty_score(similarity_scores, llm_result),
+                    verdict=llm_result['verdict'],
+                    explanation=llm_result['explanation'],
+                    confidence_level=llm_result['confidence'],
+                    sources_used=[] if screen else self.get_sources(chunk_ids, bundle=bundle),
+                    processing_time=time.time() - start_time,
+                    timestamp=datetime.now().isoformat(),
+                    degradations=deadline.degradations,
+                    early_exit=True
+                )
+            
             # Générer la réponse LLM
             llm_start = time.time()
-            with time_operation_context("llm_analysis"):
-                prompt, llm_response = self.generate_llm_response(request.message, chunk_ids)
+            evidence_info = {}
+            llm_info = {}
+            if speculation and set(speculation['chunk_ids']) == set(chunk_ids):
+                # Même ensemble de preuves : la génération spéculative en cours est conservée
+                self._record_speculation('hits')
+                explain_info['speculation'] = 'hit'
+                with time_operation_context("llm_analysis"):
+                    prompt, llm_response, llm_result = await asyncio.wrap_future(speculation['future'])
+                evidence_info = speculation['evidence_info']
+                llm_info = speculation['llm_info']
+                # La bande d'escalade est calibrée sur les scores quantiques, pas sur les cosinus du pré-filtre
+                reason = (self.cascade_escalation_reason(llm_result, similarity_scores)
+                          if llm_info.get('llm_tier') == 'small' else None)
+                if reason is not None and deadline.remaining() >= self.llm_reserve_s:
+                    evidence_info = {}
+                    llm_info = {'escalation_reason': reason}
+                    with time_operation_context("llm_analysis"):
+                        prompt, llm_response, llm_result = await asyncio.to_thread(
+                            profiler_controller.wrap(self.generate_verdict), request.message, chunk_ids,
+                            similarity_scores, deadline, evidence_info, llm_info, None, request.mode, bundle,
+                            retrieval_info.get('query_embedding'), False
+                        )
+                else:
+                    if llm_info.get('llm_tier') == 'small':
+                        llm_info['escalation_reason'] = reason
+                    deadline.merge(speculation['deadline'])
+            else:
+                if speculation:
+                    # Le reranking a changé les preuves : annuler et relancer sur le top-k quantique
+                    speculation['cancel_event'].set()
+                    self._record_speculation('misses')
+                    explain_info['speculation'] = 'miss'
+                with time_operation_context("llm_analysis"):
+                    # Réponse parsée au fil de la cascade (petit modèle, puis grand si incertain)
+                    prompt, llm_response, llm_result = await asyncio.to_thread(
+                        profiler_controller.wrap(self.generate_verdict), request.message, chunk_ids, similarity_scores,
+                        deadline, evidence_info, llm_info, None, request.mode, bundle,
+                        retrieval_info.get('query_embedding')
+                    )
             llm_time = time.time() - llm_start
-            
-            # Parser la réponse LLM
-            parsing_start = time.time()
-            llm_result = self.parse_llm_response(llm_response)
-            parsing_time = time.time() - parsing_start
+            explain_info['llm_info'] = llm_info
             
             # Calculer le score de certitude
             score_start = time.time()
             certainty_score = self.calculate_certainty_score(similarity_scores, llm_result)
             score_time = time.time() - score_start
+            explain_info['stage_times_ms'] = {
+                'quantum_search': quantum_search_time * 1000,
+                'llm': llm_time * 1000,
+                'score': score_time * 1000,
+            }
             
             # Récupérer les sources utilisées
             sources_start = time.time()
-            sources_used = []
-            for chunk_id in chunk_ids[:5]:  # Limiter aux 5 premières sources
-                _, pdf_name = self.get_chunk_info(chunk_id)
-                if pdf_name not in sources_used:
-                    sources_used.append(pdf_name)
+            sources_used = [] if screen else self.get_sources(chunk_ids, bundle=bundle)
             sources_time = time.time() - sources_start
             
-            # Log des métriques de performance
-            print(f"\n⏱️ MÉTRIQUES DE PERFORMANCE:")
-            print(f"{'='*80}")
-            print(f"🔍 Recherche quantique: {quantum_search_time:.3f}s")
-            print(f"🤖 Génération LLM: {llm_time:.3f}s")
-            print(f"📝 Parsing LLM: {parsing_time:.3f}s")
-            print(f"📊 Calcul score: {score_time:.3f}s")
-            print(f"📚 Récupération sources: {sources_time:.3f}s")
-            print(f"⏱️ Temps total: {time.time() - start_time:.3f}s")
-            print(f"{'='*80}")
-            
-            # Log détaillé des chunks récupérés (top 10)
-            print(f"\n🔍 TOP 10 CHUNKS RÉCUPÉRÉS PAR LE CIRCUIT QUANTIQUE:")
-            print(f"{'='*80}")
-            for i, (score, _qasm_path, chunk_id) in enumerate(results[:10]):
-                chunk_text, pdf_name = self.get_chunk_info(chunk_id)
-                excerpt = chunk_text[:200] + ("..." if len(chunk_text) > 200 else "")
-                print(f"{i+1:2d}. Chunk: {chunk_id}")
-                print(f"    📊 Similarité: {score:.4f}")
-                print(f"    📄 PDF: {pdf_name}")
-                print(f"    📝 Extrait: {excerpt}")
-                print(f"    {'-'*60}")
-            
-            # Log de la réponse brute du LLM
-            print(f"\n🤖 RÉPONSE BRUTE DU LLM (OLLAMA):")
-            print(f"{'='*80}")
-            print(f"📝 Prompt envoyé:")
-            print(f"{'='*40}")
-            print(prompt)
-            print(f"{'='*40}")
-            print(f"📤 Réponse brute reçue:")
-            print(f"{'='*40}")
-            print(llm_response)
-            print(f"{'='*40}")
+            if screen:
+                return FactCheckResponse(
+                    message_id=message_id,
+                    certainty_score=certainty_score,
+                    verdict=llm_result['verdict'],
+                    explanation="",
+                    confidence_level=llm_result['confidence'],
+                    sources_used=sources_used,
+                    processing_time=time.time() - start_time,
+                    timestamp=datetime.now().isoformat(),
+                    degradations=deadline.degradations,
+                    llm_tier=llm_info.get('llm_tier'),
+                )
+            
+            # Un seul enregistrement structuré par requête, construit à partir des données
+            # déjà en mémoire (aucune lecture supplémentaire des chunks)
+            logger.info("fact_check_completed", extra={
+                'message_id': message_id,
+                'verdict': llm_result['verdict'],
+                'certainty_score': certainty_score,
+                'llm_tier': llm_info.get('llm_tier'),
+                'escalation_reason': llm_info.get('escalation_reason'),
+                'stage_times': {
+                    'quantum_search': quantum_search_time,
+                    'llm': llm_time,
+                    'score': score_time,
+                    'sources': sources_time,
+                    'total': time.time() - start_time,
+                },
+                'top_chunks': [
+                    {'chunk_id': chunk_id, 'score': round(float(score), 4)}
+                    for score, _qasm_path, chunk_id in results[:10]
+                ],
+                'degradations': deadline.degradations,
+            })
+            
+            # Prompt et réponse brute : seulement pour un échantillon de requêtes
+            if payload_sampled():
+                logger.info("llm_payload", extra={'prompt': prompt, 'llm_response': llm_response})
             
             processing_time = time.time() - start_time
             
@@ -427,10 +1332,22 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
                 sources_used=sources_used,
                 processing_time=processing_time,
                 timestamp=datetime.now().isoformat(),
+                degradations=deadline.degradations,
+                evidence_accounting=evidence_info or None,
+                llm_tier=llm_info.get('llm_tier'),
             )
             
+        except AdmissionRejected:
+            if speculation:
+                speculation['cancel_event'].set()
+            self.admission_rejected += 1
+            raise
         except Exception as e:
-            print(f"❌ Erreur fact-checking: {e}")
+            logger.exception("fact_check_failed")
+            if speculation:
+                speculation['cancel_event'].set()
+            if raise_errors:
+                raise
             processing_time = time.time() - start_time
             
             return FactCheckResponse(
@@ -441,23 +1358,79 @@ EXPLANATION: [Your decisive reasoning with specific quotes from the evidence. Be
                 confidence_level="LOW",
                 sources_used=[],
                 processing_time=processing_time,
-                timestamp=datetime.now().isoformat()
+                timestamp=datetime.now().isoformat(),
+                degradations=deadline.degradations
             )
 
 # Instance globale de l'API
 api_instance = None
 
+metrics_registry.describe("fact_check_requests_total", "counter", "Messages vérifiés par verdict et mode")
+
+# File de jobs et barrière de priorité pour le trafic interactif
+interactive_gate = InteractiveGate()
+job_store = None
+job_workers = None
+
+def _collect_job_metrics() -> List[MetricFamily]:
+    """File de jobs et trafic interactif (pour /metrics)"""
+    return [
+        MetricFamily("fact_check_job_queue_depth", "gauge", "Éléments de jobs en attente")
+        .add(job_store.queue_depth() if job_store else 0),
+        MetricFamily("fact_check_job_busy_workers", "gauge", "Workers de jobs occupés")
+        .add(job_workers.busy_workers if job_workers else 0),
+        MetricFamily("fact_check_interactive_in_flight", "gauge", "Requêtes interactives en cours")
+        .add(interactive_gate.in_flight),
+    ]
+
+def _process_job_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Traiter un élément de job dans un thread worker"""
+    request = FactCheckRequest(**payload)
+    result = asyncio.run(api_instance.fact_check_message(request))
+    return to_mode_response(result, request.mode).model_dump()
+
 @app.on_event("startup")
 async def startup_event():
     """Événement de démarrage de l'API"""
-    global api_instance
+    global api_instance, job_store, job_workers
     try:
         api_instance = QuantumFactCheckerAPI()
+        
+        # Pool de asyncio.to_thread dimensionné par le budget (défaut Python : cœurs de la machine + 4)
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=thread_budget.request_threads, thread_name_prefix="request")
+        )
+
+        # Reprise des jobs interrompus et démarrage des workers
+        job_store = create_job_store()
+        job_workers = JobWorkerPool(
+            job_store,
+            _process_job_payload,
+            n_workers=thread_budget.resolved_job_workers,
+            gate=interactive_gate
+        )
+        job_workers.start()
+        
+        metrics_registry.register_collector(api_instance.collect_metrics)
+        metrics_registry.register_collector(_collect_job_metrics)
+        metrics_registry.register_collector(collect_thread_budget_metrics)
+        if api_instance.shard_coordinator is not None:
+            metrics_registry.register_collector(api_instance.shard_coordinator.collect_metrics)
+        api_instance.start_warm_up()
         print("🚀 API Quantum Fact-Checker démarrée avec succès!")
     except Exception as e:
         print(f"❌ Erreur de démarrage: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Événement d'arrêt de l'API"""
+    if job_workers:
+        job_workers.stop()
+    if job_store:
+        job_store.close()
+    stop_logging()
+
 @app.get("/", response_model=Dict[str, str])
 async def root():
     """Endpoint racine"""
@@ -467,6 +1440,16 @@ async def root():
         "status": "running"
     }
 
+@app.get("/ready", response_model=ReadyResponse)
+async def readiness_probe():
+    """Sonde de disponibilité : 503 tant que le warm-up n'est pas terminé"""
+    if api_instance is None:
+        return JSONResponse(status_code=503, content={"ready": False, "warm_up": "pending", "steps": {}})
+    info = api_instance.readiness()
+    if not info["ready"]:
+        return JSONResponse(status_code=503, content=info)
+    return ReadyResponse(**info)
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Vérification de l'état de santé de l'API"""
@@ -491,13 +1474,18 @@ async def health_check():
         except:
             cassandra_status = "ERROR"
         
-        return HealthResponse(
+        health = HealthResponse(
             status="healthy" if all(s == "OK" for s in [quantum_status, cassandra_status, ollama_status]) else "degraded",
             quantum_system=quantum_status,
             cassandra_status=cassandra_status,
             ollama_status=ollama_status,
             timestamp=datetime.now().isoformat()
         )
+        # Warm-up définitivement en échec (API_WARM_UP_EXIT_ON_FAILURE=false) : instance à remplacer
+        if api_instance.warm_up_state == "failed":
+            health.status = "unhealthy"
+            return JSONResponse(status_code=503, content=health.model_dump())
+        return health
         
     except Exception as e:
         return HealthResponse(
@@ -508,19 +1496,37 @@ async def health_check():
             timestamp=datetime.now().isoformat()
         )
 
-@app.post("/fact-check", response_model=FactCheckResponse)
-async def fact_check(request: FactCheckRequest):
-    """Vérifier la véracité d'un message"""
+@app.post("/fact-check", response_model=Union[FactCheckResponse, ScreenResponse])
+async def fact_check(request: FactCheckRequest, response: Response,
+                     explain: bool = Query(False, description="Détailler le plan de récupération et le coût des étapes"),
+                     x_request_deadline_ms: Optional[float] = Header(None),
+                     x_request_id: Optional[str] = Header(None)):
+    """
+    Vérifier la véracité d'un message (échéance optionnelle via l'en-tête X-Request-Deadline-Ms,
+    identifiant de corrélation des logs et de la trace via X-Request-Id, renvoyé dans la réponse)
+    """
     if not api_instance:
         raise HTTPException(status_code=503, detail="API non initialisée")
     
+    x_request_id = x_request_id or new_request_id()
+    response.headers["X-Request-Id"] = x_request_id
+    
     try:
-        result = await api_instance.fact_check_message(request)
-        return result
+        # Délestage immédiat si la file LLM est déjà trop longue
+        api_instance.check_admission()
+        # Les workers de jobs attendent tant qu'une requête interactive est en cours
+        with interactive_gate:
+            result = await api_instance.fact_check_message(
+                request, deadline_ms=x_request_deadline_ms, shed_load=True, request_id=x_request_id,
+                explain=explain
+            )
+        return to_mode_response(result, request.mode)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la vérification: {str(e)}")
 
-@app.post("/fact-check/batch", response_model=List[FactCheckResponse])
+@app.post("/fact-check/batch", response_model=List[Union[FactCheckResponse, ScreenResponse]])
 async def fact_check_batch(requests: List[FactCheckRequest]):
     """Vérifier plusieurs messages en lot"""
     if not api_instance:
@@ -530,11 +1536,151 @@ async def fact_check_batch(requests: List[FactCheckRequest]):
         results = []
         for request in requests:
             result = await api_instance.fact_check_message(request)
-            results.append(result)
+            results.append(to_mode_response(result, request.mode))
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la vérification en lot: {str(e)}")
 
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: Request):
+    """Soumettre un job asynchrone (liste JSON ou fichier JSONL uploadé)"""
+    if not job_store:
+        raise HTTPException(status_code=503, detail="File de jobs non initialisée")
+
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None:
+                raise ValueError("Champ 'file' manquant")
+            content = (await upload.read()).decode("utf-8")
+            submission = JobSubmitRequest(
+                requests=parse_jsonl_payloads(content),
+                priority=form.get("priority", "normal"),
+                mode=form.get("mode")
+            )
+        else:
+            submission = JobSubmitRequest(**(await request.json()))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Soumission invalide: {str(e)}")
+
+    if submission.priority not in PRIORITY_CLASSES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Priorité inconnue: {submission.priority} (attendu: {', '.join(PRIORITY_CLASSES)})"
+        )
+
+    if submission.mode:
+        for r in submission.requests:
+            r.mode = submission.mode
+
+    job_id = job_store.create_job(
+        [r.model_dump() for r in submission.requests],
+        PRIORITY_CLASSES[submission.priority],
+        params={"priority": submission.priority}
+    )
+    job_workers.notify()
+
+    return JobSubmitResponse(
+        job_id=job_id,
+        total=len(submission.requests),
+        priority=submission.priority,
+        status_url=f"/jobs/{job_id}",
+        results_url=f"/jobs/{job_id}/results"
+    )
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """Obtenir l'avancement d'un job"""
+    if not job_store:
+        raise HTTPException(status_code=503, detail="File de jobs non initialisée")
+
+    job = job_store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job inconnu: {job_id}")
+    return JobStatusResponse(**job)
+
+@app.get("/jobs/{job_id}/results", response_model=JobResultsResponse)
+async def get_job_results(job_id: str,
+                          offset: int = Query(0, ge=0),
+                          limit: int = Query(100, ge=1, le=1000)):
+    """Récupérer les résultats d'un job par pages"""
+    if not job_store:
+        raise HTTPException(status_code=503, detail="File de jobs non initialisée")
+
+    job = job_store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job inconnu: {job_id}")
+
+    return JobResultsResponse(
+        job_id=job_id,
+        offset=offset,
+        limit=limit,
+        total=job["total"],
+        items=[JobResultItem(**item) for item in job_store.get_results(job_id, offset, limit)]
+    )
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Endpoints d'administration : en-tête X-Admin-Token égal à ADMIN_TOKEN (désactivés sans ADMIN_TOKEN)"""
+    admin_token = os.getenv("ADMIN_TOKEN", "")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Endpoints d'administration désactivés")
+    if x_admin_token != admin_token:
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide")
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def start_profile(request: ProfileStartRequest):
+    """Profiler les N prochaines requêtes ou les T prochaines secondes"""
+    try:
+        session = profiler_controller.start(
+            request.kind, max_requests=request.requests, duration_s=request.duration_s,
+            interval_ms=request.interval_ms, top_n=request.top_n
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.result()
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def get_profile(format: str = Query("json", pattern="^(json|collapsed)$")):
+    """Résultat de la session en cours ou de la dernière session (collapsed : piles pour flamegraph)"""
+    session = profiler_controller.session
+    if session is None:
+        raise HTTPException(status_code=404, detail="Aucune session de profilage")
+    if format == "collapsed":
+        if session.kind != "sampling":
+            raise HTTPException(status_code=400, detail="Piles repliées disponibles en mode sampling uniquement")
+        return PlainTextResponse(session.collapsed_stacks())
+    return session.result()
+
+@app.post("/admin/profile/stop", dependencies=[Depends(require_admin)])
+async def stop_profile():
+    """Arrêter la session en cours et retourner son résultat"""
+    session = profiler_controller.stop()
+    if session is None:
+        raise HTTPException(status_code=404, detail="Aucune session de profilage")
+    return session.result()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Métriques au format texte Prometheus (latences par étape, verdicts, files, caches, mémoire)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/traces")
+async def get_traces():
+    """Traces récentes conservées en mémoire (TRACE_BUFFER_SIZE)"""
+    return {"traces": list_traces()}
+
+@app.get("/traces/{trace_id}")
+async def get_trace_detail(trace_id: str, format: str = Query("waterfall", pattern="^(waterfall|chrome)$")):
+    """Cascade des spans d'une requête, ou export Chrome trace-event (chrome://tracing, Perfetto)"""
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace inconnue: {trace_id}")
+    return trace.to_chrome_trace() if format == "chrome" else trace.to_dict()
+
 @app.get("/stats")
 async def get_stats():
     """Obtenir les statistiques de l'API"""
@@ -547,6 +1693,22 @@ async def get_stats():
                 "n_qubits": api_instance.n_qubits,
                 "db_folder": api_instance.db_folder,
                 "k_results": api_instance.k_results
+            },
+            "embedding_batcher": api_instance.embedding_batcher.get_stats(),
+            "speculation": api_instance.get_speculation_stats(),
+            "ollama_pool": api_instance.ollama_pool.get_stats() if api_instance.ollama_pool else None,
+            "concurrency": {
+                "llm": api_instance.llm_limiter.get_stats(),
+                "embedding": api_instance.embedding_limiter.get_stats(),
+                "admission": {
+                    "max_queue_wait_s": api_instance.admission_max_queue_wait_s,
+                    "rejected": api_instance.admission_rejected
+                }
+            },
+            "jobs": {
+                "queue_depth": job_store.queue_depth() if job_store else 0,
+                "busy_workers": job_workers.busy_workers if job_workers else 0,
+                "interactive_in_flight": interactive_gate.in_flight
             }
         }
     except Exception as e:
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Calibration hors-ligne de la porte de confiance avant le LLM
+Exécute le pipeline sur climate_dataset.py (porte désactivée), enregistre les signaux
+de récupération, puis choisit pour chaque signal le seuil le plus élevé dont la perte
+d'accuracy reste sous la cible.
+
+Usage:
+    python calibrate_retrieval_gate.py --target-loss 0.01
+    python calibrate_retrieval_gate.py --records gate_records.json --target-loss 0.02
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+from typing import Dict, List, Any, Optional
+
+# Ajouter les chemins nécessaires
+sys.path.append('../api')
+sys.path.append('../system')
+sys.path.append('../src/quantum')
+
+from climate_dataset import CLIMATE_DATASET
+from retrieval_gate import GATE_SIGNALS, retrieval_signals
+
+# Claims hors sujet : la bonne réponse est UNVERIFIABLE, ils mesurent le gain de la porte
+OFF_TOPIC_CLAIMS = [
+    "The Eiffel Tower was completed in 1889.",
+    "Drinking coffee improves long-term memory.",
+    "The stock market always rises in December.",
+    "Cats sleep more than sixteen hours per day.",
+    "The Great Wall of China is visible from the Moon.",
+    "Vaccines cause autism.",
+    "Chess was invented in India.",
+    "Mount Everest is the tallest mountain on Earth.",
+    "Bitcoin was created by a government agency.",
+    "Eating carrots improves night vision.",
+]
+
+
+def collect_records(max_claims: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Exécuter récupération + LLM pour chaque claim et enregistrer signaux et verdicts"""
+    from quantum_search import retrieve_top_k
+    from quantum_fact_checker_api import QuantumFactCheckerAPI
+
+    api = QuantumFactCheckerAPI()
+    dataset = [dict(item, off_topic=False) for item in CLIMATE_DATASET]
+    dataset += [
+        {"claim": claim, "expected_verdict": "UNVERIFIABLE", "category": "off_topic", "off_topic": True}
+        for claim in OFF_TOPIC_CLAIMS
+    ]
+    if max_claims:
+        dataset = dataset[:max_claims]
+
+    records = []
+    for i, item in enumerate(dataset, 1):
+        print(f"Claim {i}/{len(dataset)}: {item['claim'][:50]}...")
+        retrieval_info = {}
+        start_time = time.time()
+        results = retrieve_top_k(
+            item["claim"], api.db_folder, k=api.k_results, n_qubits=api.n_qubits,
+            cassandra_manager=api.cassandra_manager, embedding_batcher=api.embedding_batcher,
+            retrieval_info=retrieval_info
+        )
+        retrieval_time = time.time() - start_time
+
+        chunk_ids = [chunk_id for _, _, chunk_id in results]
+        similarity_scores = [score for score, _, _ in results]
+        _, llm_response = api.generate_llm_response(item["claim"], chunk_ids)
+        llm_result = api.parse_llm_response(llm_response)
+
+        records.append({
+            "claim": item["claim"],
+            "category": item["category"],
+            "off_topic": item["off_topic"],
+            "expected_verdict": item["expected_verdict"],
+            "verdict": llm_result["verdict"],
+            "is_correct": llm_result["verdict"] == item["expected_verdict"],
+            "signals": retrieval_signals(similarity_scores, retrieval_info),
+            "retrieval_time": retrieval_time,
+            "total_time": time.time() - start_time,
+        })
+        print(f"  {'✅' if records[-1]['is_correct'] else '❌'} {item['expected_verdict']} / {llm_result['verdict']}")
+    return records
+
+
+def gated_accuracy(records: List[Dict[str, Any]], signal: str, threshold: float) -> Dict[str, float]:
+    """Accuracy et part de trafic court-circuitée si la porte utilisait ce seuil"""
+    correct = 0
+    gated = 0
+    gated_off_topic = 0
+    for record in records:
+        value = record["signals"].get(signal)
+        if value is not None and value < threshold:
+            gated += 1
+            gated_off_topic += record["off_topic"]
+            correct += record["expected_verdict"] == "UNVERIFIABLE"
+        else:
+            correct += record["is_correct"]
+    n_off_topic = sum(r["off_topic"] for r in records)
+    return {
+        "accuracy": correct / len(records),
+        "gated_share": gated / len(records),
+        "off_topic_gated_share": gated_off_topic / n_off_topic if n_off_topic else 0.0,
+    }
+
+
+def calibrate(records: List[Dict[str, Any]], target_loss: float) -> Dict[str, Any]:
+    """Choisir, pour chaque signal, le seuil le plus agressif sous la perte d'accuracy cible"""
+    baseline = sum(r["is_correct"] for r in records) / len(records)
+    calibration = {"baseline_accuracy": baseline, "target_loss": target_loss, "signals": {}}
+
+    for signal in GATE_SIGNALS:
+        values = sorted({r["signals"][signal] for r in records if r["signals"].get(signal) is not None})
+        if not values:
+            continue
+        best = {"threshold": 0.0, **gated_accuracy(records, signal, 0.0)}
+        # Un seuil juste au-dessus de chaque valeur observée court-circuite cette valeur
+        for value in values:
+            threshold = value + 1e-6
+            stats = gated_accuracy(records, signal, threshold)
+            if baseline - stats["accuracy"] <= target_loss:
+                best = {"threshold": threshold, **stats}
+        calibration["signals"][signal] = best
+    return calibration
+
+
+def print_calibration(calibration: Dict[str, Any]):
+    print("\n" + "=" * 60)
+    print("📊 CALIBRATION DE LA PORTE DE CONFIANCE")
+    print("=" * 60)
+    print(f"🎯 Accuracy sans porte: {calibration['baseline_accuracy']:.2%} "
+          f"(perte tolérée: {calibration['target_loss']:.2%})")
+    for signal, stats in calibration["signals"].items():
+        print(f"\n  {signal}: seuil {stats['threshold']:.4f}")
+        print(f"    accuracy {stats['accuracy']:.2%}, trafic court-circuité {stats['gated_share']:.2%}, "
+              f"hors sujet court-circuité {stats['off_topic_gated_share']:.2%}")
+
+    print("\n💡 Configuration suggérée (un seul critère suffit en général):")
+    print("RETRIEVAL_GATE_ENABLED=true")
+    for signal, stats in calibration["signals"].items():
+        print(f"# {signal}")
+        print(f"# RETRIEVAL_GATE_{GATE_SIGNALS[signal].upper()}={stats['threshold']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibration de la porte de confiance avant le LLM")
+    parser.add_argument("--target-loss", type=float, default=0.01,
+                        help="Perte d'accuracy maximale acceptée (fraction, défaut 0.01)")
+    parser.add_argument("--records", help="Réutiliser des enregistrements sauvegardés au lieu de relancer le pipeline")
+    parser.add_argument("--max-claims", type=int, help="Limiter le nombre de claims évalués")
+    parser.add_argument("--output", default="gate_calibration.json", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    if args.records:
+        with open(args.records, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    else:
+        records = collect_records(args.max_claims)
+        records_file = f"gate_records_{time.strftime('%Y%m%d_%H%M%S')}.json"
+        with open(records_file, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Enregistrements sauvegardés dans: {records_file}")
+
+    calibration = calibrate(records, args.target_loss)
+    print_calibration(calibration)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(calibration, f, indent=2)
+    print(f"\n💾 Calibration sauvegardée dans: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
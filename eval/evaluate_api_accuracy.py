@@ -54,6 +54,8 @@ class APIEvaluator:
                     "api_score": api_score,
                     "api_explanation": api_explanation[:200] + "..." if len(api_explanation) > 200 else api_explanation,
                     "api_sources": api_sources,
+                    "evidence_accounting": api_response.get("evidence_accounting"),
+                    "llm_tier": api_response.get("llm_tier"),
                     "processing_time": processing_time,
                     "status": "success"
                 }
@@ -142,11 +144,27 @@ class APIEvaluator:
         # Temps de traitement moyen
         avg_processing_time = sum(r["processing_time"] for r in self.results if r["status"] == "success") / len([r for r in self.results if r["status"] == "success"]) if any(r["status"] == "success" for r in self.results) else 0
         
+        # Économie de tokens de la compression des preuves (si activée côté API)
+        savings = [r["evidence_accounting"]["saving_ratio"] for r in self.results if r.get("evidence_accounting")]
+        avg_prompt_saving = sum(savings) / len(savings) if savings else None
+        
+        # Latence de bout en bout (côté client), à comparer avec et sans compression
+        latencies = sorted(r["processing_time"] for r in self.results if r["status"] == "success")
+        latency_p50 = latencies[len(latencies) // 2] if latencies else None
+        latency_p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        pack_ms = [r["evidence_accounting"]["pack_ms"] for r in self.results
+                   if r.get("evidence_accounting") and "pack_ms" in r["evidence_accounting"]]
+        avg_pack_ms = sum(pack_ms) / len(pack_ms) if pack_ms else None
+        
         evaluation_summary = {
             "total_tests": total_count,
             "correct_predictions": correct_count,
             "accuracy": accuracy,
             "avg_processing_time": avg_processing_time,
+            "latency_p50": latency_p50,
+            "latency_p95": latency_p95,
+            "avg_prompt_saving": avg_prompt_saving,
+            "avg_evidence_pack_ms": avg_pack_ms,
             "category_stats": category_stats,
             "verdict_stats": verdict_stats,
             "results": self.results
@@ -162,6 +180,12 @@ class APIEvaluator:
         
         print(f"🎯 Accuracy globale: {summary['accuracy']:.2%} ({summary['correct_predictions']}/{summary['total_tests']})")
         print(f"⏱️ Temps de traitement moyen: {summary['avg_processing_time']:.2f} secondes")
+        if summary.get("latency_p50") is not None:
+            print(f"⏱️ Latence de bout en bout: p50 {summary['latency_p50']:.2f} s, p95 {summary['latency_p95']:.2f} s")
+        if summary.get("avg_prompt_saving") is not None:
+            print(f"✂️ Réduction moyenne des preuves du prompt: {summary['avg_prompt_saving']:.2%}")
+        if summary.get("avg_evidence_pack_ms") is not None:
+            print(f"✂️ Temps moyen de compression des preuves: {summary['avg_evidence_pack_ms']:.1f} ms")
         
         print("\n📈 Performance par catégorie:")
         for cat, stats in summary["category_stats"].items():
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Évaluation hors-ligne de la cascade de modèles (petit modèle puis grand modèle)
+Pour chaque claim de climate_dataset.py, le même prompt est envoyé aux deux modèles ;
+la cascade est rejouée à partir des deux réponses pour comparer accuracy et latence
+de "petit seul", "grand seul" et "cascade".
+
+Usage:
+    OLLAMA_SMALL_MODEL=llama3.2:1b python evaluate_model_cascade.py
+    python evaluate_model_cascade.py --records cascade_records.json --borderline-min 0.3 --borderline-max 0.5
+"""
+
+import sys
+import time
+import json
+import argparse
+import numpy as np
+from typing import Dict, List, Any, Optional
+
+# Ajouter les chemins nécessaires
+sys.path.append('../api')
+sys.path.append('../system')
+sys.path.append('../src/quantum')
+
+from climate_dataset import CLIMATE_DATASET
+
+
+def collect_records(max_claims: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Exécuter les deux modèles sur chaque claim et enregistrer verdicts et latences"""
+    from quantum_search import retrieve_top_k
+    from quantum_fact_checker_api import QuantumFactCheckerAPI
+    from deadline import Deadline
+
+    api = QuantumFactCheckerAPI()
+    if api.small_ollama_client is None:
+        raise SystemExit("❌ OLLAMA_SMALL_MODEL doit être défini pour évaluer la cascade")
+
+    dataset = CLIMATE_DATASET[:max_claims] if max_claims else CLIMATE_DATASET
+    records = []
+    for i, item in enumerate(dataset, 1):
+        print(f"Claim {i}/{len(dataset)}: {item['claim'][:50]}...")
+        results = retrieve_top_k(
+            item["claim"], api.db_folder, k=api.k_results, n_qubits=api.n_qubits,
+            cassandra_manager=api.cassandra_manager, embedding_batcher=api.embedding_batcher
+        )
+        chunk_ids = [chunk_id for _, _, chunk_id in results]
+        system, prompt = api.build_llm_prompt(item["claim"], chunk_ids, Deadline())
+
+        record = {
+            "claim": item["claim"],
+            "category": item["category"],
+            "expected_verdict": item["expected_verdict"],
+            "retrieval_certainty": api.retrieval_certainty([score for score, _, _ in results]),
+        }
+        for tier, client in (("small", api.small_ollama_client), ("large", api.ollama_client)):
+            start_time = time.time()
+            llm_result = api.parse_llm_response(api.run_llm(system, prompt, Deadline(), client))
+            record[tier] = {
+                "verdict": llm_result["verdict"],
+                "parsed": llm_result["parsed"],
+                "latency": time.time() - start_time,
+            }
+        records.append(record)
+        print(f"  attendu {item['expected_verdict']} / petit {record['small']['verdict']} "
+              f"/ grand {record['large']['verdict']}")
+    return records
+
+
+def escalation_reason(record: Dict[str, Any], borderline_min: float, borderline_max: float) -> Optional[str]:
+    """Même règle que QuantumFactCheckerAPI.cascade_escalation_reason, rejouée hors-ligne"""
+    small = record["small"]
+    if not small["parsed"]:
+        return "parse_failed"
+    if small["verdict"] == "UNVERIFIABLE":
+        return "unverifiable"
+    if borderline_min <= record["retrieval_certainty"] < borderline_max:
+        return "borderline_retrieval"
+    return None
+
+
+def evaluate(records: List[Dict[str, Any]], borderline_min: float, borderline_max: float) -> Dict[str, Any]:
+    """Accuracy et latence des trois stratégies"""
+    strategies = {"small_only": [], "large_only": [], "cascade": []}
+    reasons: Dict[str, int] = {}
+    for record in records:
+        expected = record["expected_verdict"]
+        small, large = record["small"], record["large"]
+        strategies["small_only"].append((small["verdict"] == expected, small["latency"]))
+        strategies["large_only"].append((large["verdict"] == expected, large["latency"]))
+
+        reason = escalation_reason(record, borderline_min, borderline_max)
+        if reason is None:
+            strategies["cascade"].append((small["verdict"] == expected, small["latency"]))
+        else:
+            reasons[reason] = reasons.get(reason, 0) + 1
+            strategies["cascade"].append((large["verdict"] == expected, small["latency"] + large["latency"]))
+
+    summary = {"borderline": [borderline_min, borderline_max], "strategies": {}}
+    for name, outcomes in strategies.items():
+        latencies = np.array([latency for _, latency in outcomes])
+        summary["strategies"][name] = {
+            "accuracy": sum(correct for correct, _ in outcomes) / len(outcomes),
+            "latency_mean": float(latencies.mean()),
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+        }
+    summary["escalation_rate"] = sum(reasons.values()) / len(records)
+    summary["escalation_reasons"] = reasons
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    print("\n" + "=" * 60)
+    print("📊 CASCADE DE MODÈLES : ACCURACY / LATENCE")
+    print("=" * 60)
+    for name, stats in summary["strategies"].items():
+        print(f"  {name:11s} accuracy {stats['accuracy']:.2%}, latence moyenne {stats['latency_mean']:.2f}s "
+              f"(p50 {stats['latency_p50']:.2f}s, p95 {stats['latency_p95']:.2f}s)")
+    print(f"\n🐇 Escalade vers le grand modèle: {summary['escalation_rate']:.2%}")
+    for reason, count in summary["escalation_reasons"].items():
+        print(f"  {reason}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluation de la cascade petit modèle / grand modèle")
+    parser.add_argument("--records", help="Réutiliser des enregistrements sauvegardés au lieu de relancer les modèles")
+    parser.add_argument("--max-claims", type=int, help="Limiter le nombre de claims évalués")
+    parser.add_argument("--borderline-min", type=float, default=0.0, help="Bas de la bande de certitude limite")
+    parser.add_argument("--borderline-max", type=float, default=0.0, help="Haut de la bande de certitude limite")
+    parser.add_argument("--output", default="cascade_evaluation.json", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    if args.records:
+        with open(args.records, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    else:
+        records = collect_records(args.max_claims)
+        records_file = f"cascade_records_{time.strftime('%Y%m%d_%H%M%S')}.json"
+        with open(records_file, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Enregistrements sauvegardés dans: {records_file}")
+
+    summary = evaluate(records, args.borderline_min, args.borderline_max)
+    print_summary(summary)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n💾 Évaluation sauvegardée dans: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Découpage d'un message en affirmations indépendantes
+Chaque affirmation est récupérée et vérifiée séparément, puis les verdicts sont agrégés
+"""
+
+import re
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DECOMPOSITION_MODES = ("off", "rules", "llm")
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;])\s+')
+_LIST_MARKER = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s*')
+
+DECOMPOSE_PROMPT_TEMPLATE = """
+Split the following message into its independent factual claims.
+Write each claim as a complete, self-contained sentence on its own line, starting with "- ".
+Do not add, explain or judge anything. If the message contains a single claim, write only that claim.
+
+MESSAGE: {message}
+"""
+
+
+def split_claims_rules(message: str, max_claims: int = 4, min_chars: int = 20) -> List[str]:
+    """
+    Découper un message en affirmations par règles de phrases
+
+    Les fragments trop courts pour être vérifiés seuls sont rattachés à la phrase précédente ;
+    au-delà de max_claims, les dernières phrases sont regroupées avec la dernière affirmation.
+    """
+    claims: List[str] = []
+    for sentence in _SENTENCE_BOUNDARY.split(message.strip()):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        if claims and (len(sentence) < min_chars or len(claims) >= max_claims):
+            claims[-1] = f"{claims[-1]} {sentence}"
+        else:
+            claims.append(sentence)
+    claims = [claim.rstrip(";").strip() for claim in claims]
+    return claims or [message.strip()]
+
+
+def parse_claim_list(text: str) -> List[str]:
+    """Extraire la liste d'affirmations (une par ligne) renvoyée par le LLM"""
+    claims = []
+    for line in text.splitlines():
+        claim = _LIST_MARKER.sub("", line).strip()
+        if claim:
+            claims.append(claim)
+    return claims
+
+
+def decompose_message(message: str, mode: str = "rules", max_claims: int = 4,
+                      generate_fn: Optional[Callable[[str], str]] = None) -> List[str]:
+    """
+    Découper un message selon le mode demandé
+
+    Args:
+        message: Message à vérifier
+        mode: "off" (message entier), "rules" (phrases) ou "llm" (appel LLM court)
+        max_claims: Nombre maximum d'affirmations
+        generate_fn: Fonction de génération utilisée en mode "llm"
+
+    Returns:
+        Liste d'affirmations (le message entier s'il n'y a rien à découper)
+    """
+    if mode == "off":
+        return [message]
+    if mode == "llm" and generate_fn is not None:
+        try:
+            claims = parse_claim_list(generate_fn(DECOMPOSE_PROMPT_TEMPLATE.format(message=message)))
+            if claims:
+                return claims[:max_claims]
+        except Exception as e:
+            logger.warning(f"Découpage LLM impossible, règles de phrases utilisées: {e}")
+    return split_claims_rules(message, max_claims)
+
+
+def aggregate_verdicts(verdicts: List[str]) -> str:
+    """Verdict global : le verdict commun s'il est unanime, MIXED sinon"""
+    distinct = set(verdicts)
+    if len(distinct) == 1:
+        return verdicts[0]
+    return "MIXED"
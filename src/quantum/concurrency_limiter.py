@@ -0,0 +1,176 @@
+"""
+Limiteur de concurrence adaptatif (AIMD) devant Ollama
+La limite augmente de 1 par fenêtre de requêtes rapides et diminue de façon
+multiplicative quand la latence observée dépasse la latence de référence de sa
+classe (appels de durées normales différentes : modèle, mode de génération)
+"""
+
+import math
+import time
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AdmissionRejected(Exception):
+    """Requête refusée : l'attente dans la file dépasserait le seuil d'admission"""
+
+    def __init__(self, limiter_name: str, retry_after_s: float):
+        super().__init__(f"File '{limiter_name}' saturée, réessayer dans {retry_after_s:.0f}s")
+        self.limiter_name = limiter_name
+        self.retry_after_s = retry_after_s
+
+
+class AdaptiveConcurrencyLimiter:
+    """Nombre d'appels simultanés ajusté selon la latence observée (AIMD)"""
+
+    def __init__(self, name: str, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 latency_tolerance: float = 2.0, backoff: float = 0.7, baseline_window: int = 100):
+        """
+        Args:
+            name: Nom du limiteur (métriques et messages)
+            initial_limit: Limite de départ
+            min_limit / max_limit: Bornes de la limite
+            latency_tolerance: Latence acceptée = référence × tolérance ; au-delà la limite baisse
+            backoff: Facteur de réduction multiplicative
+            baseline_window: Nombre de latences récentes (par classe) dont le minimum sert de référence
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self.baseline_window = baseline_window
+        # Latences récentes par classe : un appel n'est comparé qu'aux appels de même nature
+        self._recent_latencies: Dict[str, deque] = {}
+        self._mean_latency = 0.0
+        self._stats = {
+            'acquired': 0,
+            'rejected': 0,
+            'errors': 0,
+            'increases': 0,
+            'decreases': 0,
+            'total_queue_wait': 0.0,
+            'max_queue_wait': 0.0,
+        }
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def expected_queue_wait(self) -> float:
+        """Attente estimée pour une nouvelle requête (files d'attente × latence moyenne / limite)"""
+        with self._condition:
+            if self._in_flight < self.limit:
+                return 0.0
+            return (self._waiting + 1) * self._mean_latency / self.limit
+
+    def acquire(self, timeout: Optional[float] = None, shed: bool = True):
+        """
+        Réserver une place (bloque tant que la limite est atteinte)
+
+        shed=False : attente bornée par une échéance, pas un délestage (non comptée comme refus)
+
+        Raises:
+            AdmissionRejected: si aucune place ne se libère avant timeout
+        """
+        start_time = time.time()
+        with self._condition:
+            self._waiting += 1
+            try:
+                acquired = self._condition.wait_for(lambda: self._in_flight < self.limit, timeout=timeout)
+                if not acquired:
+                    if shed:
+                        self._stats['rejected'] += 1
+                    retry_after = max(1.0, (self._waiting * self._mean_latency) / self.limit)
+                    raise AdmissionRejected(self.name, retry_after)
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+            queue_wait = time.time() - start_time
+            self._stats['acquired'] += 1
+            self._stats['total_queue_wait'] += queue_wait
+            self._stats['max_queue_wait'] = max(self._stats['max_queue_wait'], queue_wait)
+
+    def release(self, latency: Optional[float], sample: bool = True, latency_class: str = "default"):
+        """
+        Libérer une place et ajuster la limite (latency=None : l'appel a échoué)
+
+        sample=False libère la place sans ajuster la limite (appel annulé, latence non significative).
+        latency_class regroupe les appels de même durée normale (ex. "large:full", "small:screen") :
+        la latence n'est comparée qu'à la référence de sa classe.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if sample and latency is None:
+                self._stats['errors'] += 1
+                self._decrease()
+            elif sample:
+                recent = self._recent_latencies.get(latency_class)
+                if recent is None:
+                    recent = self._recent_latencies[latency_class] = deque(maxlen=self.baseline_window)
+                recent.append(latency)
+                self._mean_latency = latency if not self._mean_latency else 0.9 * self._mean_latency + 0.1 * latency
+                baseline = min(recent)
+                if latency > baseline * self.latency_tolerance:
+                    self._decrease()
+                elif self._in_flight + 1 >= self.limit:
+                    # Augmentation additive : +1 par fenêtre complète de requêtes rapides,
+                    # seulement si la limite actuelle est réellement utilisée
+                    self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                    self._stats['increases'] += 1
+            self._condition.notify_all()
+
+    def _decrease(self):
+        new_limit = max(float(self.min_limit), self._limit * self.backoff)
+        if new_limit < self._limit:
+            self._limit = new_limit
+            self._stats['decreases'] += 1
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None, latency_class: str = "default"):
+        """Exécuter un appel dans une place du limiteur en mesurant sa latence"""
+        self.acquire(timeout)
+        start_time = time.time()
+        try:
+            yield
+        except Exception:
+            self.release(None, latency_class=latency_class)
+            raise
+        self.release(time.time() - start_time, latency_class=latency_class)
+
+    def wrap(self, fn: Callable[..., T], timeout: Optional[float] = None) -> Callable[..., T]:
+        """Envelopper une fonction pour que chaque appel passe par le limiteur"""
+        def limited(*args, **kwargs):
+            with self.slot(timeout):
+                return fn(*args, **kwargs)
+        return limited
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            acquired = self._stats['acquired']
+            return {
+                'name': self.name,
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'queue_depth': self._waiting,
+                'mean_latency': self._mean_latency,
+                'baseline_latency': {name: min(recent) for name, recent in self._recent_latencies.items()},
+                'avg_queue_wait': self._stats['total_queue_wait'] / acquired if acquired else 0.0,
+                **self._stats,
+            }
+
+
+def retry_after_header(error: AdmissionRejected) -> Dict[str, str]:
+    """En-tête Retry-After (secondes entières) pour une réponse 503"""
+    return {"Retry-After": str(int(math.ceil(error.retry_after_s)))}
@@ -0,0 +1,92 @@
+"""
+Budget de temps par requête et suivi des dégradations appliquées
+Chaque étape du pipeline consulte le budget restant pour choisir un mode dégradé
+"""
+
+import time
+from typing import List, Optional
+
+
+class Deadline:
+    """Échéance d'une requête, propagée à travers récupération, chunks et LLM"""
+
+    def __init__(self, budget_s: Optional[float] = None, llm_reserve_s: float = 0.0,
+                 max_queue_wait_s: Optional[float] = None):
+        """
+        Args:
+            budget_s: Budget total en secondes (None = pas d'échéance)
+            llm_reserve_s: Temps réservé à la génération LLM, que la récupération ne doit pas consommer
+            max_queue_wait_s: Attente maximale dans la file d'un limiteur de concurrence (None = attendre)
+        """
+        self.start_time = time.time()
+        self.budget_s = budget_s
+        self.expires_at = self.start_time + budget_s if budget_s is not None else None
+        self.llm_reserve_s = llm_reserve_s
+        self.max_queue_wait_s = max_queue_wait_s
+        self.degradations: List[str] = []
+
+    @classmethod
+    def from_ms(cls, budget_ms: Optional[float], llm_reserve_s: float = 0.0,
+                max_queue_wait_s: Optional[float] = None) -> "Deadline":
+        """Créer une échéance à partir d'un budget en millisecondes (0 ou None = illimité)"""
+        if not budget_ms or budget_ms <= 0:
+            return cls(None, llm_reserve_s, max_queue_wait_s)
+        return cls(budget_ms / 1000.0, llm_reserve_s, max_queue_wait_s)
+
+    @property
+    def enabled(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> float:
+        """Temps restant en secondes (infini si pas d'échéance)"""
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - time.time())
+
+    def retrieval_remaining(self) -> float:
+        """Temps restant pour la récupération, une fois la réserve LLM mise de côté"""
+        return max(0.0, self.remaining() - self.llm_reserve_s)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def timeout(self, minimum: float = 1.0) -> Optional[float]:
+        """Timeout à passer aux appels réseau (None si pas d'échéance)"""
+        if self.expires_at is None:
+            return None
+        return max(minimum, self.remaining())
+
+    @property
+    def sheddable(self) -> bool:
+        """True si la requête peut être délestée (attente maximale en file fixée)"""
+        return self.max_queue_wait_s is not None
+
+    def queue_timeout(self) -> Optional[float]:
+        """
+        Attente maximale dans une file de limiteur avant délestage (bornée par le temps restant) ;
+        None pour une requête non délestable, qui attend sa place
+        """
+        if self.max_queue_wait_s is None:
+            return None
+        return min(self.max_queue_wait_s, self.remaining())
+
+    def degrade(self, name: str):
+        """Enregistrer une dégradation appliquée (une seule fois par nom)"""
+        if name not in self.degradations:
+            self.degradations.append(name)
+
+    def child(self) -> "Deadline":
+        """
+        Échéance dérivée partageant la même expiration mais avec ses propres dégradations,
+        pour un travail spéculatif dont le résultat peut être abandonné
+        """
+        child = Deadline(None, self.llm_reserve_s, self.max_queue_wait_s)
+        child.start_time = self.start_time
+        child.budget_s = self.budget_s
+        child.expires_at = self.expires_at
+        return child
+
+    def merge(self, other: "Deadline"):
+        """Reprendre les dégradations d'une échéance dérivée dont le résultat est retenu"""
+        for name in other.degradations:
+            self.degrade(name)
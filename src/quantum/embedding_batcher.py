@@ -0,0 +1,139 @@
+"""
+Micro-batching des embeddings de requêtes
+Regroupe les textes envoyés par des requêtes concurrentes en un seul appel d'embedding
+"""
+
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingMicroBatcher:
+    """Collecte les textes pendant une courte fenêtre puis les embedde en un seul appel"""
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        """
+        Args:
+            embed_fn: Fonction qui embedde une liste de textes en un seul appel
+            max_batch_size: Nombre maximum de textes par appel
+            max_wait_ms: Temps maximum d'attente après le premier texte d'un lot
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'items': 0,
+            'max_batch_size_seen': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'total_call_time': 0.0,
+            'errors': 0,
+            'batch_size_histogram': {},
+        }
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """Embedder un texte (bloque jusqu'à ce que son lot soit traité)"""
+        future: Future = Future()
+        self._queue.put((text, future, time.time()))
+        return future.result(timeout=timeout)
+
+    def embed_many(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """Embedder plusieurs textes, regroupés avec ceux des autres requêtes"""
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future, time.time()))
+            futures.append(future)
+        return [future.result(timeout=timeout) for future in futures]
+
+    def _collect_batch(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        window_end = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = window_end - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            dispatch_time = time.time()
+            texts = [text for text, _, _ in batch]
+            try:
+                vectors = self.embed_fn(texts)
+                if len(vectors) != len(texts):
+                    raise RuntimeError(f"{len(vectors)} embeddings reçus pour {len(texts)} textes")
+                for (_, future, _), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                logger.error(f"Erreur d'embedding par lot: {e}")
+                with self._stats_lock:
+                    self._stats['errors'] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            self._record_batch(batch, dispatch_time, time.time() - dispatch_time)
+
+    def _record_batch(self, batch: List[tuple], dispatch_time: float, call_time: float):
+        waits = [dispatch_time - enqueued for _, _, enqueued in batch]
+        size = len(batch)
+        with self._stats_lock:
+            stats = self._stats
+            stats['batches'] += 1
+            stats['items'] += size
+            stats['max_batch_size_seen'] = max(stats['max_batch_size_seen'], size)
+            stats['total_wait_time'] += sum(waits)
+            stats['max_wait_time'] = max(stats['max_wait_time'], max(waits))
+            stats['total_call_time'] += call_time
+            stats['batch_size_histogram'][size] = stats['batch_size_histogram'].get(size, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retourne la taille des lots et les temps d'attente observés"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['batch_size_histogram'] = dict(self._stats['batch_size_histogram'])
+        batches = stats['batches'] or 1
+        items = stats['items'] or 1
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': stats['batches'],
+            'items': stats['items'],
+            'errors': stats['errors'],
+            'avg_batch_size': stats['items'] / batches,
+            'max_batch_size_seen': stats['max_batch_size_seen'],
+            'avg_wait_ms': stats['total_wait_time'] / items * 1000.0,
+            'max_wait_ms_seen': stats['max_wait_time'] * 1000.0,
+            'avg_call_ms': stats['total_call_time'] / batches * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'batch_size_histogram': stats['batch_size_histogram'],
+        }
+
+
+def create_embedding_batcher(embed_model, max_batch_size: int = 16,
+                             max_wait_ms: float = 5.0,
+                             embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None) -> EmbeddingMicroBatcher:
+    """
+    Créer un micro-batcher à partir d'un modèle d'embedding LlamaIndex
+    (ou d'une fonction d'embedding par lot, par exemple répartie sur un pool Ollama)
+    """
+    return EmbeddingMicroBatcher(
+        embed_fn or embed_model.get_text_embedding_batch,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms
+    )
@@ -0,0 +1,200 @@
+"""
+Compression des preuves avant le prompt LLM
+Supprime les recouvrements entre chunks voisins d'un même PDF, garde les phrases
+les plus proches du claim et remplit un budget de tokens
+"""
+
+import re
+import time
+import logging
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Longueur d'extrait utilisée par le prompt non compressé (voir generate_llm_response)
+BASELINE_EXCERPT_CHARS = 1500
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+_WORD = re.compile(r'\w+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (≈ 4 caractères par token pour llama2)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def split_sentences(text: str) -> List[str]:
+    """Découper un texte en phrases (les retours à la ligne des PDF sont normalisés)"""
+    sentences = []
+    for part in _SENTENCE_BOUNDARY.split(text):
+        sentence = " ".join(part.split())
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def overlap_length(previous: str, current: str, min_overlap: int = 20, max_overlap: int = 400) -> int:
+    """Longueur du plus long suffixe de previous qui est aussi un préfixe de current"""
+    upper = min(max_overlap, len(previous), len(current))
+    for size in range(upper, min_overlap - 1, -1):
+        if previous.endswith(current[:size]):
+            return size
+    return 0
+
+
+def remove_overlaps(evidence: List[Dict[str, Any]], min_overlap: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Retirer le texte dupliqué par le chevauchement du découpage (chunk_overlap=100)
+
+    Pour chaque chunk, on cherche parmi les autres chunks du même PDF celui dont la fin
+    recouvre son début, et on retire ce préfixe : une seule copie du texte partagé reste.
+
+    Returns:
+        (preuves dédupliquées, nombre de caractères retirés)
+    """
+    deduplicated = []
+    removed = 0
+    for i, item in enumerate(evidence):
+        text = item['text']
+        best = 0
+        for j, other in enumerate(evidence):
+            if i == j or other['pdf_name'] != item['pdf_name']:
+                continue
+            best = max(best, overlap_length(other['text'], text, min_overlap))
+        if best:
+            text = text[best:]
+            removed += best
+        deduplicated.append(dict(item, text=text))
+    return deduplicated, removed
+
+
+def _lexical_scores(claim: str, sentences: List[str]) -> List[float]:
+    """Score de repli (recouvrement de mots) quand aucun embedding n'est disponible"""
+    claim_words = set(w.lower() for w in _WORD.findall(claim))
+    scores = []
+    for sentence in sentences:
+        words = set(w.lower() for w in _WORD.findall(sentence))
+        scores.append(len(claim_words & words) / (len(claim_words | words) or 1))
+    return scores
+
+
+class EvidencePacker:
+    """Construit le bloc de preuves du prompt sous un budget de tokens"""
+
+    def __init__(self, embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 token_budget: int = 1200, min_overlap_chars: int = 20, max_embedded_sentences: int = 48):
+        """
+        Args:
+            embed_fn: Fonction d'embedding par lot (phrases en un seul appel)
+            token_budget: Nombre maximum de tokens (estimés) pour le bloc de preuves
+            min_overlap_chars: Recouvrement minimal pour considérer deux chunks comme voisins
+            max_embedded_sentences: Phrases embeddées au plus par requête, présélectionnées
+                par recouvrement de mots avec le claim
+        """
+        self.embed_fn = embed_fn
+        self.token_budget = token_budget
+        self.min_overlap_chars = min_overlap_chars
+        self.max_embedded_sentences = max_embedded_sentences
+
+    def _rank_sentences(self, claim: str, sentences: List[str],
+                        claim_vector: Optional[List[float]] = None) -> Tuple[List[int], int]:
+        """
+        Ordre des phrases par pertinence décroissante
+
+        Les max_embedded_sentences meilleures phrases au score lexical sont reclassées par
+        similarité d'embedding ; les autres suivent dans l'ordre lexical. claim_vector
+        (embedding de la requête calculé par la récupération) évite de ré-embedder le claim.
+
+        Returns:
+            (indices ordonnés, nombre de phrases embeddées)
+        """
+        lexical = _lexical_scores(claim, sentences)
+        order = sorted(range(len(sentences)), key=lambda i: lexical[i], reverse=True)
+        if self.embed_fn is None or not sentences:
+            return order, 0
+        shortlist, rest = order[:self.max_embedded_sentences], order[self.max_embedded_sentences:]
+        try:
+            texts = [sentences[i] for i in shortlist]
+            if claim_vector is None:
+                vectors = np.array(self.embed_fn([claim] + texts), dtype=float)
+            else:
+                vectors = np.vstack([np.asarray(claim_vector, dtype=float),
+                                     np.array(self.embed_fn(texts), dtype=float)])
+            norms = np.linalg.norm(vectors, axis=1)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms[:, None]
+            scores = vectors[1:] @ vectors[0]
+        except Exception as e:
+            logger.warning(f"Embedding des phrases impossible, score lexical utilisé: {e}")
+            return order, 0
+        reranked = [shortlist[j] for j in np.argsort(-scores, kind='stable')]
+        return reranked + rest, len(shortlist)
+
+    def pack(self, claim: str, evidence: List[Dict[str, Any]],
+             claim_vector: Optional[List[float]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Args:
+            claim: Claim à vérifier
+            evidence: Chunks dans l'ordre de récupération ({'chunk_id', 'pdf_name', 'text'})
+            claim_vector: Embedding du claim déjà calculé (sinon embeddé avec les phrases)
+
+        Returns:
+            (bloc de preuves formaté, comptabilité des tokens)
+        """
+        start_time = time.time()
+        baseline_tokens = sum(
+            estimate_tokens(self._header(item)) + estimate_tokens(item['text'][:BASELINE_EXCERPT_CHARS])
+            for item in evidence
+        )
+
+        deduplicated, overlap_chars_removed = remove_overlaps(evidence, self.min_overlap_chars)
+
+        # (indice du chunk, position dans le chunk, phrase)
+        sentences = []
+        for chunk_index, item in enumerate(deduplicated):
+            for position, sentence in enumerate(split_sentences(item['text'])):
+                sentences.append((chunk_index, position, sentence))
+        order, embedded = self._rank_sentences(claim, [s for _, _, s in sentences], claim_vector)
+
+        # Remplissage glouton par pertinence décroissante
+        selected: Dict[int, List[Tuple[int, str]]] = {}
+        used_tokens = 0
+        for index in order:
+            chunk_index, position, sentence = sentences[index]
+            cost = estimate_tokens(sentence)
+            if chunk_index not in selected:
+                cost += estimate_tokens(self._header(deduplicated[chunk_index]))
+            if used_tokens + cost > self.token_budget:
+                continue
+            selected.setdefault(chunk_index, []).append((position, sentence))
+            used_tokens += cost
+
+        # Reconstruire les chunks dans l'ordre de récupération, phrases dans l'ordre d'origine
+        docs = []
+        for chunk_index, item in enumerate(deduplicated):
+            if chunk_index not in selected:
+                continue
+            text = " ".join(sentence for _, sentence in sorted(selected[chunk_index]))
+            docs.append(f"{self._header(item)}\n{text}")
+        packed = "\n\n".join(docs)
+
+        packed_tokens = estimate_tokens(packed)
+        accounting = {
+            'baseline_tokens': baseline_tokens,
+            'packed_tokens': packed_tokens,
+            'tokens_saved': max(0, baseline_tokens - packed_tokens),
+            'saving_ratio': 1.0 - packed_tokens / baseline_tokens if baseline_tokens else 0.0,
+            'token_budget': self.token_budget,
+            'overlap_chars_removed': overlap_chars_removed,
+            'sentences_total': len(sentences),
+            'sentences_kept': sum(len(v) for v in selected.values()),
+            'sentences_embedded': embedded,
+            'chunks_used': len(docs),
+            'pack_ms': (time.time() - start_time) * 1000,
+        }
+        return packed, accounting
+
+    @staticmethod
+    def _header(item: Dict[str, Any]) -> str:
+        return f"[Source PDF: {item['pdf_name']}]\n[Chunk ID: {item['chunk_id']}]"
@@ -4,15 +4,19 @@ Implémentation CORRECTE de l'algorithme de Grover pour la recherche de document
 Respectant tous les principes quantiques fondamentaux
 """
 
+from __future__ import annotations
+
 import os
 import numpy as np
-from qiskit import QuantumCircuit, transpile, QuantumRegister, ClassicalRegister
-from qiskit_aer import Aer
-from qiskit.quantum_info import Statevector
-from qiskit.circuit.library import MCMT
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, TYPE_CHECKING
 import logging
 from performance_metrics import time_operation, time_operation_context
+from prometheus_metrics import registry as metrics_registry
+from thread_budget import aer_run_options
+
+# Qiskit est importé à la première recherche Grover (démarrage rapide des processus)
+if TYPE_CHECKING:
+    from qiskit import QuantumCircuit
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +36,7 @@ class CorrectGroverSearch:
         """
         self.n_qubits = n_qubits
         self.threshold = threshold
+        from qiskit_aer import Aer
         self.backend = Aer.get_backend('statevector_simulator')
         self.shots = 1024
         
@@ -79,6 +84,9 @@ class CorrectGroverSearch:
         Returns:
             Circuit quantique oracle correct
         """
+        from qiskit import QuantumCircuit
+        from qiskit.circuit.library import MCMT
+        
         n_docs = len(similarities)
         n_qubits_needed = int(np.ceil(np.log2(n_docs)))
         
@@ -130,6 +138,9 @@ class CorrectGroverSearch:
         Returns:
             Circuit quantique de diffusion correct
         """
+        from qiskit import QuantumCircuit
+        from qiskit.circuit.library import MCMT
+        
         diffusion = QuantumCircuit(n_qubits)
         
         # Appliquer H^⊗n
@@ -222,6 +233,8 @@ class CorrectGroverSearch:
         Returns:
             Liste des résultats (index, similarité)
         """
+        from qiskit import QuantumCircuit, transpile
+        
         # Créer le circuit principal
         grover_circuit = QuantumCircuit(n_qubits + 1, n_qubits)
         
@@ -244,7 +257,7 @@ class CorrectGroverSearch:
         # Exécuter le circuit
         try:
             transpiled_circuit = transpile(grover_circuit, self.backend)
-            job = self.backend.run(transpiled_circuit, shots=self.shots)
+            job = self.backend.run(transpiled_circuit, shots=self.shots, **aer_run_options())
             result = job.result()
             counts = result.get_counts()
             
@@ -349,7 +362,8 @@ class CorrectGroverSearch:
         # 2. Récupérer tous les embeddings de la base
         with time_operation_context("database_embedding_retrieval"):
             query_cql = "SELECT row_id, vector FROM fact_checker_keyspace.fact_checker_docs"
-            rows = cassandra_manager.session.execute(query_cql)
+            with metrics_registry.in_flight("cassandra"):
+                rows = cassandra_manager.session.execute(query_cql)
             
             document_embeddings = []
             chunk_mapping = []
@@ -14,6 +14,11 @@ class OllamaConfig:
         self.default_model = os.getenv("OLLAMA_MODEL", "llama2:7b")
         self.default_temperature = float(os.getenv("OLLAMA_TEMPERATURE", "0.7"))
         self.default_max_tokens = int(os.getenv("OLLAMA_MAX_TOKENS", "2000"))
+        # Petit modèle qui répond en premier dans la cascade de fact-checking (vide = pas de cascade)
+        self.small_model = os.getenv("OLLAMA_SMALL_MODEL", "")
+        self.request_timeout = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+        # Durée pendant laquelle Ollama garde le modèle (et son cache de préfixe) en mémoire
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
         
         # Model-specific configurations
         self.model_configs = {
@@ -35,6 +40,12 @@ class OllamaConfig:
                 "top_p": 0.9,
                 "top_k": 40
             },
+            "llama3.2:1b": {
+                "temperature": 0.7,
+                "max_tokens": 2000,
+                "top_p": 0.9,
+                "top_k": 40
+            },
             "deepseek-r1:7b": {
                 "temperature": 0.7,
                 "max_tokens": 2000,
@@ -0,0 +1,339 @@
+"""
+Répartition de charge entre plusieurs instances Ollama
+Routage vers l'instance ayant le moins de requêtes en cours, suivi de santé et de
+latence par instance, et requêtes couvertes (hedging) au-delà du p95
+"""
+
+import os
+import time
+import threading
+import contextvars
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Any, Optional, TypeVar
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """
+    True si l'erreur met en cause l'instance (connexion impossible, réponse 5xx) ;
+    un timeout de lecture (échéance serrée côté client) ou une 4xx ne l'écarte pas
+    """
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) if response is not None else getattr(error, "status_code", None)
+    if isinstance(status, int) and status > 0:
+        return status >= 500
+    try:
+        import requests
+        # ConnectTimeout hérite de ConnectionError, ReadTimeout non
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return True
+    except ImportError:
+        pass
+    try:
+        import httpx
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, ConnectionError)
+
+
+class OllamaEndpoint:
+    """
+    État d'une instance Ollama : requêtes en cours, latences récentes et santé
+
+    Les latences sont gardées par opération (embedding, génération par modèle et taille) :
+    un p95 ne compare que des requêtes de même nature. Lecture et écriture sous le verrou du pool.
+    """
+
+    def __init__(self, base_url: str, latency_window: int = 200):
+        self.base_url = base_url.rstrip("/")
+        self.outstanding = 0
+        self.latency_window = latency_window
+        self.latencies: Dict[str, deque] = {}
+        self._mean_latency = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.errors = 0
+        self.hedged = 0
+        self.unhealthy_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.time() >= self.unhealthy_until
+
+    def record(self, operation: str, latency: float):
+        window = self.latencies.get(operation)
+        if window is None:
+            window = self.latencies[operation] = deque(maxlen=self.latency_window)
+        window.append(latency)
+        self._mean_latency = latency if not self._mean_latency else 0.9 * self._mean_latency + 0.1 * latency
+
+    def samples(self, operation: str) -> int:
+        return len(self.latencies.get(operation, ()))
+
+    def p95(self, operation: str) -> Optional[float]:
+        window = self.latencies.get(operation)
+        if not window:
+            return None
+        return float(np.percentile(window, 95))
+
+    def mean_latency(self) -> float:
+        """Latence moyenne récente toutes opérations confondues (départage du routage)"""
+        return self._mean_latency
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "errors": self.errors,
+            "hedged": self.hedged,
+            "latency_mean": self.mean_latency(),
+            "latency_p95": {operation: self.p95(operation) for operation in self.latencies},
+        }
+
+
+class OllamaPool:
+    """Pool d'instances Ollama partagé par les clients de génération et d'embedding"""
+
+    def __init__(self, base_urls: List[str], hedge: bool = False, hedge_min_samples: int = 20,
+                 unhealthy_cooldown_s: float = 30.0, max_hedge_workers: int = 8):
+        """
+        Args:
+            base_urls: URLs des instances Ollama
+            hedge: Envoyer une requête dupliquée à une autre instance quand la première dépasse son p95
+            hedge_min_samples: Nombre de latences mesurées avant d'activer le hedging sur une instance
+            unhealthy_cooldown_s: Durée d'exclusion d'une instance après une erreur
+            max_hedge_workers: Nombre maximum de requêtes couvertes simultanées ; au-delà,
+                une requête lente n'est pas dupliquée (jamais mise en file derrière les autres)
+        """
+        if not base_urls:
+            raise ValueError("OllamaPool nécessite au moins une instance")
+        self.endpoints = [OllamaEndpoint(url) for url in base_urls]
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedge_min_samples = hedge_min_samples
+        self.unhealthy_cooldown_s = unhealthy_cooldown_s
+        self.max_hedge_workers = max_hedge_workers
+        self.hedges_skipped = 0
+        self._hedges_running = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_hedge_workers,
+                                            thread_name_prefix="ollama-hedge") if self.hedge else None
+
+    @property
+    def base_urls(self) -> List[str]:
+        return [endpoint.base_url for endpoint in self.endpoints]
+
+    def _acquire(self, exclude: Optional[OllamaEndpoint] = None) -> Optional[OllamaEndpoint]:
+        """Choisir l'instance saine la moins chargée (à égalité, la plus rapide) et la réserver"""
+        with self._lock:
+            candidates = [e for e in self.endpoints if e is not exclude and e.healthy]
+            if not candidates:
+                if exclude is not None:
+                    return None
+                # Toutes les instances sont marquées en échec : tenter quand même la moins chargée
+                candidates = list(self.endpoints)
+            endpoint = min(candidates, key=lambda e: (e.outstanding, e.mean_latency()))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release(self, endpoint: OllamaEndpoint, latency: Optional[float], endpoint_failure: bool = False,
+                 operation: str = "default"):
+        """latency=None : appel en erreur ; endpoint_failure écarte l'instance pendant le cooldown"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if endpoint_failure:
+                endpoint.failures += 1
+                endpoint.unhealthy_until = time.time() + self.unhealthy_cooldown_s
+            elif latency is None:
+                endpoint.errors += 1
+            else:
+                endpoint.record(operation, latency)
+                endpoint.unhealthy_until = 0.0
+
+    def _run(self, endpoint: OllamaEndpoint, fn: Callable[[str], T], operation: str = "default") -> T:
+        start_time = time.time()
+        try:
+            result = fn(endpoint.base_url)
+        except Exception as e:
+            failure = is_endpoint_failure(e)
+            self._release(endpoint, None, endpoint_failure=failure, operation=operation)
+            if failure:
+                logger.warning(f"Instance Ollama en échec: {endpoint.base_url} ({type(e).__name__})")
+            raise
+        self._release(endpoint, time.time() - start_time, operation=operation)
+        return result
+
+    def _run_hedge(self, endpoint: OllamaEndpoint, fn: Callable[[str], T], operation: str) -> T:
+        try:
+            return self._run(endpoint, fn, operation)
+        finally:
+            with self._lock:
+                self._hedges_running -= 1
+
+    def _retry_elsewhere(self, failed: OllamaEndpoint, fn: Callable[[str], T], error: Exception,
+                         operation: str = "default") -> T:
+        """Nouvel essai sur une autre instance si l'erreur met en cause l'instance, sinon la relancer"""
+        secondary = self._acquire(exclude=failed) if is_endpoint_failure(error) else None
+        if secondary is None:
+            raise error
+        return self._run(secondary, fn, operation)
+
+    def _hedge_threshold(self, endpoint: OllamaEndpoint, operation: str) -> Optional[float]:
+        with self._lock:
+            if endpoint.samples(operation) < self.hedge_min_samples:
+                return None
+            return endpoint.p95(operation)
+
+    def call(self, fn: Callable[[str], T], hedge: bool = True, operation: str = "default") -> T:
+        """
+        Exécuter fn(base_url) sur l'instance la moins chargée
+
+        operation identifie la nature de la requête (ex. "embed:nomic-embed-text",
+        "generate:llama2:7b:512") : latences et p95 sont suivis par opération.
+
+        Si le hedging est actif et que l'instance dépasse le p95 de l'opération, la même
+        requête est envoyée à une deuxième instance ; la première réponse obtenue est
+        retournée. La requête principale démarre immédiatement (thread de l'appelant, ou
+        thread dédié quand elle peut être couverte), jamais dans une file ; la requête
+        couverte n'est envoyée que si un thread de hedging est libre.
+        Une instance en échec (connexion, 5xx) déclenche un nouvel essai sur une autre ;
+        les autres erreurs (timeout de lecture, 4xx) sont relancées telles quelles.
+        """
+        primary = self._acquire()
+        threshold = self._hedge_threshold(primary, operation) if hedge and self.hedge else None
+        if threshold is None:
+            try:
+                return self._run(primary, fn, operation)
+            except Exception as e:
+                return self._retry_elsewhere(primary, fn, e, operation)
+
+        # Requête principale sur un thread démarré tout de suite : le p95 compte depuis son début
+        first: Future = Future()
+        first.set_running_or_notify_cancel()
+        context = contextvars.copy_context()
+
+        def run_primary():
+            try:
+                first.set_result(context.run(self._run, primary, fn, operation))
+            except BaseException as e:
+                first.set_exception(e)
+
+        threading.Thread(target=run_primary, name="ollama-primary", daemon=True).start()
+        done, _ = wait([first], timeout=threshold)
+        if done:
+            # Réponse (ou échec rapide) avant le p95 : pas de requête couverte
+            error = first.exception()
+            if error is None:
+                return first.result()
+            return self._retry_elsewhere(primary, fn, error, operation)
+
+        futures = [first]
+        secondary = None
+        with self._lock:
+            if self._hedges_running < self.max_hedge_workers:
+                self._hedges_running += 1
+            else:
+                self.hedges_skipped += 1
+                secondary = False
+        if secondary is None:
+            secondary = self._acquire(exclude=primary)
+            if secondary is not None:
+                with self._lock:
+                    secondary.hedged += 1
+                futures.append(self._executor.submit(contextvars.copy_context().run,
+                                                     self._run_hedge, secondary, fn, operation))
+            else:
+                with self._lock:
+                    self._hedges_running -= 1
+
+        # Première réponse réussie ; la requête perdante se termine en arrière-plan
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if len(futures) == 1:
+            return self._retry_elsewhere(primary, fn, error, operation)
+        raise error
+
+    def check_health(self, timeout: float = 2.0):
+        """Interroger chaque instance (/api/tags) et mettre à jour son état"""
+        import requests
+
+        for endpoint in self.endpoints:
+            try:
+                requests.get(f"{endpoint.base_url}/api/tags", timeout=timeout).raise_for_status()
+                with self._lock:
+                    endpoint.unhealthy_until = 0.0
+            except Exception:
+                with self._lock:
+                    endpoint.unhealthy_until = time.time() + self.unhealthy_cooldown_s
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hedge": self.hedge,
+                "hedges_running": self._hedges_running,
+                "hedges_skipped": self.hedges_skipped,
+                "endpoints": [endpoint.to_dict() for endpoint in self.endpoints],
+            }
+
+
+def create_pooled_embed_fn(pool: OllamaPool, model_name: str) -> Callable[[List[str]], List[List[float]]]:
+    """
+    Fonction d'embedding par lot répartie sur le pool (un modèle LlamaIndex par instance)
+
+    LlamaIndex est importé et les modèles créés au premier appel, pas à la construction.
+    """
+    embed_models: Dict[str, Any] = {}
+    embed_models_lock = threading.Lock()
+
+    def embed_model_for(url: str):
+        with embed_models_lock:
+            if not embed_models:
+                from llama_index.embeddings.ollama import OllamaEmbedding
+                embed_models.update({base_url: OllamaEmbedding(model_name=model_name, base_url=base_url)
+                                     for base_url in pool.base_urls})
+            return embed_models[url]
+
+    def embed_fn(texts: List[str]) -> List[List[float]]:
+        return pool.call(lambda url: embed_model_for(url).get_text_embedding_batch(texts),
+                         operation=f"embed:{model_name}")
+
+    return embed_fn
+
+
+_default_pool: Optional[OllamaPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> Optional[OllamaPool]:
+    """Pool partagé construit depuis OLLAMA_ENDPOINTS (None si la variable n'est pas définie)"""
+    global _default_pool
+    endpoints = [url.strip() for url in os.getenv("OLLAMA_ENDPOINTS", "").split(",") if url.strip()]
+    if not endpoints:
+        return None
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = OllamaPool(
+                endpoints,
+                hedge=os.getenv("OLLAMA_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes"),
+                hedge_min_samples=int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", "20")),
+                unhealthy_cooldown_s=float(os.getenv("OLLAMA_UNHEALTHY_COOLDOWN_S", "30"))
+            )
+            logger.info(f"Pool Ollama: {len(endpoints)} instances (hedging: {_default_pool.hedge})")
+        return _default_pool
@@ -8,45 +8,199 @@ import numpy as np
 from typing import List, Dict, Any
 import re
 from ollama_config import config
+from ollama_pool import get_default_pool
 
 class OllamaClient:
     """Client for interacting with Ollama API"""
     
-    def __init__(self, base_url="http://localhost:11434", model="llama2:7b"):
+    def __init__(self, base_url="http://localhost:11434", model="llama2:7b", timeout=None, keep_alive=None,
+                 pool=None):
+        """
+        `pool` spreads requests over several Ollama instances (see ollama_pool);
+        it defaults to the pool configured by OLLAMA_ENDPOINTS, otherwise `base_url` is used.
+        """
         self.base_url = base_url
+        self.pool = pool if pool is not None else get_default_pool()
         self.model = model
+        self.timeout = timeout if timeout is not None else config.request_timeout
+        self.keep_alive = keep_alive if keep_alive is not None else config.keep_alive
         self.tokens_used = 0
+        # Timing details of the last generation (prompt_eval_count, prompt_eval_duration, ...)
+        self.last_stats = {}
+        self._prefix_contexts = {}
+        self.prefix_cache_stats = {"hits": 0, "misses": 0}
     
-    def generate(self, prompt, temperature=0.7, max_tokens=2000):
-        """Generate text using Ollama API"""
-        try:
+    def _build_payload(self, prompt, temperature, max_tokens, stream, system=None, context=None,
+                       raw=False, stop=None):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens
+            }
+        }
+        if stop:
+            payload["options"]["stop"] = list(stop)
+        if system is not None:
+            payload["system"] = system
+        if context is not None:
+            payload["context"] = context
+        if raw:
+            payload["raw"] = True
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+    
+    def _operation(self, payload):
+        """
+        Pool latency key: model and num_predict rounded up to a power of two, so that
+        short (screen) and long (full) generations get separate p95 hedge thresholds
+        """
+        num_predict = max(1, int(payload["options"].get("num_predict") or 1))
+        return f"generate:{payload['model']}:{1 << (num_predict - 1).bit_length()}"
+    
+    def _post_json(self, path, payload, timeout=None):
+        """POST to the least loaded instance (or `base_url`) and return the JSON response"""
+        def send(base_url):
             response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens
-                    }
-                }
+                f"{base_url}{path}",
+                json=payload,
+                timeout=timeout if timeout is not None else self.timeout
             )
             response.raise_for_status()
-            result = response.json()
+            return response.json()
+        
+        if self.pool is None:
+            return send(self.base_url)
+        return self.pool.call(send, operation=self._operation(payload))
+    
+    def _record_stats(self, result, stopped_early=False):
+        self.last_stats = {
+            key: result.get(key)
+            for key in ("prompt_eval_count", "prompt_eval_duration", "eval_count",
+                        "eval_duration", "load_duration", "total_duration")
+        }
+        self.last_stats["stopped_early"] = stopped_early
+    
+    def generate(self, prompt, temperature=0.7, max_tokens=2000, timeout=None,
+                 system=None, context=None, raw=False, stop=None):
+        """
+        Generate text using Ollama API (timeout in seconds, defaults to the client timeout)
+        
+        `system` is sent as Ollama's system prompt, which keeps a fixed instruction prefix
+        identical across requests so that Ollama can reuse its evaluated KV cache.
+        `context` continues from the token context returned by a previous call.
+        `stop` is a list of stop sequences ending the generation.
+        """
+        payload = self._build_payload(prompt, temperature, max_tokens, False, system, context, raw, stop)
+        
+        try:
+            result = self._post_json("/api/generate", payload, timeout)
+            self._record_stats(result)
             # Estimate tokens (rough approximation)
             self.tokens_used += len(prompt.split()) + len(result.get('response', '').split())
             return result.get('response', '')
         except Exception as e:
             print(f"Error calling Ollama: {str(e)}")
             return ""
+    
+    def generate_stream(self, prompt, temperature=0.7, max_tokens=2000, timeout=None,
+                        system=None, context=None, raw=False, stop=None, should_stop=None):
+        """
+        Generate text in streaming mode and cancel as soon as the output is sufficient
+        
+        `should_stop(text)` is called with the text generated so far after each chunk;
+        when it returns True the connection is closed, which makes Ollama abort the
+        generation instead of decoding up to `max_tokens`.
+        """
+        payload = self._build_payload(prompt, temperature, max_tokens, True, system, context, raw, stop)
+        
+        # Partial text is kept if the connection fails mid-generation
+        state = {"text": ""}
+        
+        def stream(base_url):
+            state["text"] = ""
+            with requests.post(
+                f"{base_url}/api/generate",
+                json=payload,
+                stream=True,
+                timeout=timeout if timeout is not None else self.timeout
+            ) as response:
+                response.raise_for_status()
+                stopped_early = False
+                n_chunks = 0
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    state["text"] += chunk.get('response', '')
+                    n_chunks += 1
+                    if chunk.get('done'):
+                        self._record_stats(chunk)
+                        break
+                    if should_stop is not None and should_stop(state["text"]):
+                        stopped_early = True
+                        break
+                if stopped_early:
+                    # Ollama only sends the final statistics when the generation completes
+                    self._record_stats({"eval_count": n_chunks}, stopped_early=True)
+            return state["text"]
+        
+        try:
+            # A stream cannot be duplicated, so it is routed without hedging; streams stopped
+            # early have their own latency key
+            if self.pool is None:
+                text = stream(self.base_url)
+            else:
+                text = self.pool.call(stream, hedge=False, operation="stream:" + self._operation(payload))
+            self.tokens_used += len(prompt.split()) + len(text.split())
+            return text
+        except Exception as e:
+            print(f"Error calling Ollama: {str(e)}")
+            return state["text"]
+    
+    def get_prefix_context(self, prefix, timeout=None):
+        """
+        Evaluate a fixed prompt prefix once and return its token context
+        
+        The context is cached per prefix, so the prefix is only evaluated again
+        if the cache is cleared (e.g. after a model change). Ollama needs at least one
+        predicted token to return a context; that token is dropped so the generation
+        continues right after the prefix.
+        """
+        if prefix in self._prefix_contexts:
+            self.prefix_cache_stats["hits"] += 1
+        else:
+            self.prefix_cache_stats["misses"] += 1
+            result = self._post_json("/api/generate", {
+                "model": self.model,
+                "prompt": prefix,
+                "raw": True,
+                "stream": False,
+                "keep_alive": self.keep_alive,
+                "options": {"num_predict": 1}
+            }, timeout)
+            context = result.get('context', [])
+            # The returned context ends with the generated token(s), which are not part of the prefix
+            generated = result.get('eval_count') or 0
+            self._prefix_contexts[prefix] = context[:len(context) - generated] if generated else context
+        return self._prefix_contexts[prefix]
+    
+    def is_prefix_cached(self, prefix):
+        return prefix in self._prefix_contexts
+    
+    def clear_prefix_contexts(self):
+        self._prefix_contexts = {}
 
 class OllamaEmbeddings:
     """Simple embeddings class to replace OpenAI embeddings"""
     
-    def __init__(self, model="llama2:7b"):
+    def __init__(self, model="llama2:7b", pool=None):
         self.model = model
         self.base_url = config.base_url
+        self.pool = pool if pool is not None else get_default_pool()
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed a list of documents"""
@@ -59,15 +213,20 @@ class OllamaEmbeddings:
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query"""
         try:
-            response = requests.post(
-                f"{self.base_url}/api/embeddings",
-                json={
-                    "model": self.model,
-                    "prompt": text
-                }
-            )
-            response.raise_for_status()
-            result = response.json()
+            def send(base_url):
+                response = requests.post(
+                    f"{base_url}/api/embeddings",
+                    json={
+                        "model": self.model,
+                        "prompt": text
+                    },
+                    timeout=config.request_timeout
+                )
+                response.raise_for_status()
+                return response.json()
+            
+            result = send(self.base_url) if self.pool is None else \
+                self.pool.call(send, operation=f"embed:{self.model}")
             return result.get('embedding', [])
         except Exception as e:
             print(f"Error getting embeddings: {e}")
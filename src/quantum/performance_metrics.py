@@ -1,12 +1,17 @@
 import time
+import math
 import functools
 import logging
+import threading
+from collections import deque
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 import json
 import os
 
+from tracing import start_span, end_span
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,89 +32,205 @@ class PerformanceMetric:
             'metadata': self.metadata
         }
 
+class LogHistogram:
+    """
+    Histogramme de durées à buckets logarithmiques (taille fixe, enregistrement O(1))
+
+    Chaque bucket couvre un facteur `growth` ; l'erreur relative sur les percentiles
+    est donc bornée par ce facteur (≈ 9 % avec 8 buckets par puissance de 2).
+    """
+
+    def __init__(self, min_value: float = 1e-6, max_value: float = 3600.0, buckets_per_doubling: int = 8):
+        self.min_value = min_value
+        self.growth = 2 ** (1.0 / buckets_per_doubling)
+        self._log_growth = math.log(self.growth)
+        self.buckets = [0] * (int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 2)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def _bucket_index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return min(len(self.buckets) - 1, int(math.log(value / self.min_value) / self._log_growth) + 1)
+
+    def record(self, value: float):
+        self.buckets[self._bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Percentile q (0-100), estimé au milieu géométrique du bucket et borné par min/max"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(math.ceil(q / 100.0 * self.count)))
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                if index == 0:
+                    return self.min
+                estimate = self.min_value * self.growth ** (index - 0.5)
+                return min(self.max, max(self.min, estimate))
+        return self.max
+
+    def cumulative_counts(self, bounds: List[float]) -> List[int]:
+        """Nombre de valeurs ≤ chaque borne (buckets regroupés selon leur borne supérieure)"""
+        counts = []
+        cumulative = 0
+        index = 0
+        for bound in bounds:
+            while index < len(self.buckets) and self.min_value * self.growth ** index <= bound:
+                cumulative += self.buckets[index]
+                index += 1
+            counts.append(cumulative)
+        return counts
+
+    def merge(self, other: "LogHistogram"):
+        """Ajouter les valeurs d'un histogramme de même découpage"""
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def bucket_values(self) -> List[tuple]:
+        """(valeur représentative, nombre) des buckets non vides (milieu géométrique borné par min/max)"""
+        values = []
+        for index, bucket_count in enumerate(self.buckets):
+            if bucket_count:
+                value = self.min if index == 0 else self.min_value * self.growth ** (index - 0.5)
+                values.append((min(self.max, max(self.min, value)), bucket_count))
+        return values
+
+    def to_sparse(self) -> Dict[str, Any]:
+        """Forme compacte sérialisable (buckets non vides seulement)"""
+        return {
+            'min_value': self.min_value,
+            'growth': self.growth,
+            'n_buckets': len(self.buckets),
+            'count': self.count,
+            'total': self.total,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+            'buckets': {str(index): n for index, n in enumerate(self.buckets) if n},
+        }
+
+    @classmethod
+    def from_sparse(cls, data: Dict[str, Any]) -> "LogHistogram":
+        histogram = cls.__new__(cls)
+        histogram.min_value = data['min_value']
+        histogram.growth = data['growth']
+        histogram._log_growth = math.log(histogram.growth)
+        histogram.buckets = [0] * data['n_buckets']
+        for index, n in data['buckets'].items():
+            histogram.buckets[int(index)] = n
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min'] if data['count'] else float('inf')
+        histogram.max = data['max']
+        return histogram
+
+    def copy(self) -> "LogHistogram":
+        histogram = LogHistogram.__new__(LogHistogram)
+        histogram.__dict__.update(self.__dict__)
+        histogram.buckets = list(self.buckets)
+        return histogram
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'total_time': self.total,
+            'avg_time': self.total / self.count if self.count else 0.0,
+            'min_time': self.min if self.count else 0.0,
+            'max_time': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
 class PerformanceTracker:
-    """Classe pour tracker les métriques de performance"""
-    
-    def __init__(self):
-        self.metrics: List[PerformanceMetric] = []
-        self.current_session_start = None
-        self.session_metrics: Dict[str, List[float]] = {}
-    
-    def start_session(self):
-        """Démarre une nouvelle session de tracking"""
+    """
+    Classe pour tracker les métriques de performance
+
+    Mémoire bornée : un histogramme par opération (au plus max_operations noms distincts,
+    les suivants sont regroupés sous OVERFLOW_OPERATION) et, en option, un buffer
+    circulaire des ring_buffer_size dernières mesures brutes.
+    """
+
+    OVERFLOW_OPERATION = "other_operations"
+
+    def __init__(self, max_operations: Optional[int] = None, ring_buffer_size: Optional[int] = None):
+        self.max_operations = max_operations if max_operations is not None else \
+            int(os.getenv("PERF_METRICS_MAX_OPERATIONS", "256"))
+        ring_buffer_size = ring_buffer_size if ring_buffer_size is not None else \
+            int(os.getenv("PERF_METRICS_RING_BUFFER_SIZE", "0"))
+        self.recent_metrics: Optional[deque] = deque(maxlen=ring_buffer_size) if ring_buffer_size > 0 else None
+        self.histograms: Dict[str, LogHistogram] = {}
+        self.metrics_count = 0
         self.current_session_start = time.time()
-        self.session_metrics = {}
+        self._lock = threading.Lock()
+
+    @property
+    def metrics(self) -> List[PerformanceMetric]:
+        """Dernières mesures brutes (vide si le buffer circulaire est désactivé)"""
+        with self._lock:
+            return list(self.recent_metrics) if self.recent_metrics is not None else []
+
+    def start_session(self):
+        """Démarre une nouvelle session de tracking (remet les histogrammes à zéro)"""
+        with self._lock:
+            self.current_session_start = time.time()
+            self.histograms = {}
+            self.metrics_count = 0
+            if self.recent_metrics is not None:
+                self.recent_metrics.clear()
         logger.info("🚀 Session de performance démarrée")
-    
+
     def end_session(self) -> Dict[str, Any]:
-        """Termine la session et retourne un résumé"""
-        if not self.current_session_start:
-            return {}
-        
-        total_duration = time.time() - self.current_session_start
-        session_summary = {
-            'total_duration': total_duration,
-            'metrics_count': len(self.metrics),
-            'operations': {}
-        }
-        
-        # Grouper les métriques par opération
-        for metric in self.metrics:
-            op_name = metric.operation_name
-            if op_name not in session_summary['operations']:
-                session_summary['operations'][op_name] = {
-                    'count': 0,
-                    'total_time': 0,
-                    'avg_time': 0,
-                    'min_time': float('inf'),
-                    'max_time': 0
-                }
-            
-            op_stats = session_summary['operations'][op_name]
-            op_stats['count'] += 1
-            op_stats['total_time'] += metric.duration
-            op_stats['min_time'] = min(op_stats['min_time'], metric.duration)
-            op_stats['max_time'] = max(op_stats['max_time'], metric.duration)
-        
-        # Calculer les moyennes
-        for op_stats in session_summary['operations'].values():
-            op_stats['avg_time'] = op_stats['total_time'] / op_stats['count']
-            if op_stats['min_time'] == float('inf'):
-                op_stats['min_time'] = 0
-        
-        logger.info(f"📊 Session terminée - Durée totale: {total_duration:.2f}s")
-        return session_summary
-    
+        """Retourne un résumé de la session (coût proportionnel au nombre d'opérations)"""
+        with self._lock:
+            total_duration = time.time() - self.current_session_start
+            return {
+                'total_duration': total_duration,
+                'metrics_count': self.metrics_count,
+                'operations': {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+            }
+
     def add_metric(self, operation_name: str, duration: float, metadata: Optional[Dict[str, Any]] = None):
-        """Ajoute une métrique de performance"""
-        metric = PerformanceMetric(
-            operation_name=operation_name,
-            duration=duration,
-            metadata=metadata or {}
-        )
-        self.metrics.append(metric)
-        
-        # Ajouter à la session courante
-        if operation_name not in self.session_metrics:
-            self.session_metrics[operation_name] = []
-        self.session_metrics[operation_name].append(duration)
-        
-        logger.info(f"⏱️ {operation_name}: {duration:.3f}s")
-    
+        """Ajoute une métrique de performance (O(1))"""
+        with self._lock:
+            histogram = self.histograms.get(operation_name)
+            if histogram is None:
+                if len(self.histograms) >= self.max_operations:
+                    operation_name = self.OVERFLOW_OPERATION
+                histogram = self.histograms.setdefault(operation_name, LogHistogram())
+            histogram.record(duration)
+            self.metrics_count += 1
+            if self.recent_metrics is not None:
+                self.recent_metrics.append(PerformanceMetric(
+                    operation_name=operation_name,
+                    duration=duration,
+                    metadata=metadata or {}
+                ))
+
+        logger.debug(f"⏱️ {operation_name}: {duration:.3f}s")
+
+    def get_histograms(self) -> Dict[str, LogHistogram]:
+        """Copie des histogrammes par opération (export Prometheus)"""
+        with self._lock:
+            return {name: histogram.copy() for name, histogram in self.histograms.items()}
+
     def get_operation_stats(self, operation_name: str) -> Dict[str, float]:
         """Retourne les statistiques pour une opération spécifique"""
-        durations = [m.duration for m in self.metrics if m.operation_name == operation_name]
-        if not durations:
-            return {}
-        
-        return {
-            'count': len(durations),
-            'total_time': sum(durations),
-            'avg_time': sum(durations) / len(durations),
-            'min_time': min(durations),
-            'max_time': max(durations)
-        }
-    
+        with self._lock:
+            histogram = self.histograms.get(operation_name)
+            return histogram.to_dict() if histogram else {}
+
     def save_metrics(self, filename: str = None):
         """Sauvegarde les métriques dans un fichier JSON"""
         if not filename:
@@ -118,6 +239,7 @@ class PerformanceTracker:
         
         data = {
             'session_summary': self.end_session(),
+            'histograms': {name: histogram.to_sparse() for name, histogram in self.get_histograms().items()},
             'detailed_metrics': [metric.to_dict() for metric in self.metrics]
         }
         
@@ -131,42 +253,46 @@ class PerformanceTracker:
 performance_tracker = PerformanceTracker()
 
 def time_operation(operation_name: str, metadata: Optional[Dict[str, Any]] = None):
-    """Décorateur pour mesurer le temps d'exécution d'une fonction"""
+    """Décorateur pour mesurer le temps d'exécution d'une fonction (et l'ajouter à la trace de la requête)"""
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             start_time = time.time()
+            span_handle = start_span(operation_name, metadata)
             try:
                 result = func(*args, **kwargs)
                 duration = time.time() - start_time
+                end_span(span_handle)
                 performance_tracker.add_metric(operation_name, duration, metadata)
                 return result
             except Exception as e:
                 duration = time.time() - start_time
-                error_metadata = metadata or {}
-                error_metadata['error'] = str(e)
+                end_span(span_handle, e)
+                error_metadata = {**(metadata or {}), 'error': str(e)}
                 performance_tracker.add_metric(f"{operation_name}_error", duration, error_metadata)
                 raise
         return wrapper
     return decorator
 
 def time_operation_context(operation_name: str, metadata: Optional[Dict[str, Any]] = None):
-    """Context manager pour mesurer le temps d'exécution d'un bloc de code"""
+    """Context manager pour mesurer le temps d'exécution d'un bloc de code (et l'ajouter à la trace de la requête)"""
     class TimeContext:
         def __init__(self, name, meta):
             self.name = name
             self.meta = meta
             self.start_time = None
+            self.span_handle = None
         
         def __enter__(self):
             self.start_time = time.time()
+            self.span_handle = start_span(self.name, self.meta)
             return self
         
         def __exit__(self, exc_type, exc_val, exc_tb):
             duration = time.time() - self.start_time
+            end_span(self.span_handle, exc_val)
             if exc_type:
-                error_meta = self.meta or {}
-                error_meta['error'] = str(exc_val)
+                error_meta = {**(self.meta or {}), 'error': str(exc_val)}
                 performance_tracker.add_metric(f"{self.name}_error", duration, error_meta)
             else:
                 performance_tracker.add_metric(self.name, duration, self.meta)
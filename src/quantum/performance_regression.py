@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Détection de régressions de performance entre deux séries de fichiers de métriques
+Compare, opération par opération, les percentiles de latence d'une exécution de référence
+et d'une exécution candidate, avec intervalles de confiance bootstrap ; le code de sortie
+permet de bloquer un déploiement.
+
+Usage:
+    python performance_regression.py --baseline base/performance_metrics_*.json \\
+        --candidate new/performance_metrics_*.json --threshold 10 --op-threshold "llm_*=20" \\
+        --report regression_report.json
+
+Codes de sortie : 0 aucune régression, 1 régression détectée, 2 erreur d'entrée.
+
+Les histogrammes ne situent une durée qu'à un bucket près (≈ 9 %) : les mesures brutes
+(PERF_METRICS_RING_BUFFER_SIZE) sont utilisées quand elles couvrent toute l'opération, et
+une opération dont le seuil est inférieur à la résolution n'est pas jugée.
+"""
+
+import sys
+import json
+import glob
+import fnmatch
+import argparse
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from performance_metrics import LogHistogram
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+EXIT_ERROR = 2
+
+# Distribution pondérée : valeurs distinctes et nombre d'occurrences
+Distribution = Tuple[np.ndarray, np.ndarray]
+
+
+def load_distributions(filenames: List[str]) -> Tuple[Dict[str, Distribution], Dict[str, float]]:
+    """
+    Distributions de durées par opération, fusionnées sur plusieurs fichiers
+
+    Les mesures brutes de detailed_metrics sont utilisées quand elles couvrent toutes les
+    mesures de l'opération (buffer circulaire assez grand, ou anciens fichiers sans
+    histogrammes) ; sinon les buckets de l'histogramme, dont la valeur n'est connue qu'à un
+    facteur growth près.
+
+    Returns:
+        (distributions, résolution relative par opération : 0 pour des mesures brutes,
+        growth - 1 dès qu'un fichier n'apporte que des buckets)
+    """
+    merged: Dict[str, List[Distribution]] = {}
+    resolutions: Dict[str, float] = {}
+    for filename in filenames:
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        raw: Dict[str, List[float]] = {}
+        for metric in data.get('detailed_metrics', []):
+            raw.setdefault(metric['operation_name'], []).append(metric['duration'])
+        for name, sparse in data.get('histograms', {}).items():
+            histogram = LogHistogram.from_sparse(sparse)
+            if len(raw.get(name, [])) == histogram.count:
+                continue
+            raw.pop(name, None)
+            pairs = histogram.bucket_values()
+            if pairs:
+                values, counts = zip(*pairs)
+                merged.setdefault(name, []).append((np.array(values, dtype=float), np.array(counts, dtype=float)))
+                resolutions[name] = max(resolutions.get(name, 0.0), histogram.growth - 1.0)
+        for name, durations in raw.items():
+            values, counts = np.unique(np.array(durations, dtype=float), return_counts=True)
+            merged.setdefault(name, []).append((values, counts.astype(float)))
+            resolutions.setdefault(name, 0.0)
+
+    distributions = {}
+    for name, parts in merged.items():
+        values = np.concatenate([v for v, _ in parts])
+        counts = np.concatenate([c for _, c in parts])
+        order = np.argsort(values)
+        distributions[name] = (values[order], counts[order])
+    return distributions, resolutions
+
+
+def weighted_percentile(values: np.ndarray, counts: np.ndarray, q: float) -> float:
+    """Percentile q (0-100) d'une distribution pondérée triée par valeur"""
+    cumulative = np.cumsum(counts)
+    rank = max(1.0, np.ceil(q / 100.0 * cumulative[-1]))
+    return float(values[np.searchsorted(cumulative, rank)])
+
+
+def bootstrap_ratio_ci(baseline: Distribution, candidate: Distribution, q: float, n_bootstrap: int,
+                       confidence: float, rng: np.random.Generator) -> Tuple[float, float]:
+    """Intervalle de confiance bootstrap du rapport percentile candidat / percentile référence"""
+    ratios = np.empty(n_bootstrap)
+    samples = []
+    for values, counts in (baseline, candidate):
+        n = int(counts.sum())
+        samples.append((values, n, counts / counts.sum()))
+    for i in range(n_bootstrap):
+        resampled = []
+        for values, n, probabilities in samples:
+            # Rééchantillonnage avec remise : tirage multinomial sur les valeurs distinctes
+            resampled.append(weighted_percentile(values, rng.multinomial(n, probabilities).astype(float), q))
+        ratios[i] = resampled[1] / resampled[0] if resampled[0] > 0 else np.inf
+    alpha = (1.0 - confidence) / 2.0
+    return float(np.quantile(ratios, alpha)), float(np.quantile(ratios, 1.0 - alpha))
+
+
+def threshold_for(operation: str, default_pct: float, op_thresholds: List[Tuple[str, float]]) -> float:
+    """Seuil (%) de l'opération : premier motif correspondant, sinon le seuil par défaut"""
+    for pattern, pct in op_thresholds:
+        if fnmatch.fnmatch(operation, pattern):
+            return pct
+    return default_pct
+
+
+def classify(ratio: float, ci: Tuple[float, float], threshold_pct: float) -> str:
+    """regression si tout l'intervalle dépasse le seuil ; possible_regression si seul le point le dépasse"""
+    limit = 1.0 + threshold_pct / 100.0
+    if ci[0] > limit:
+        return "regression"
+    if ratio > limit:
+        return "possible_regression"
+    if ci[1] < 1.0:
+        return "improvement"
+    return "ok"
+
+
+STATUS_SEVERITY = ["improvement", "ok", "insufficient_data", "insufficient_resolution",
+                   "possible_regression", "regression"]
+
+
+def compare_runs(baseline: Dict[str, Distribution], candidate: Dict[str, Distribution],
+                 operations: List[str], percentiles: List[float], threshold_pct: float,
+                 op_thresholds: List[Tuple[str, float]], min_samples: int, n_bootstrap: int,
+                 confidence: float, seed: int = 0,
+                 resolutions: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Comparer les opérations sélectionnées (motifs fnmatch) entre référence et candidat
+
+    resolutions donne, par opération, la résolution relative des durées (voir
+    load_distributions) ; une opération dont le seuil est inférieur à cette résolution
+    reçoit le statut insufficient_resolution au lieu d'un verdict.
+    """
+    resolutions = resolutions or {}
+    rng = np.random.default_rng(seed)
+    names = sorted(name for name in set(baseline) | set(candidate)
+                   if any(fnmatch.fnmatch(name, pattern) for pattern in operations))
+    results: Dict[str, Any] = {}
+    for name in names:
+        threshold = threshold_for(name, threshold_pct, op_thresholds)
+        resolution_pct = 100.0 * resolutions.get(name, 0.0)
+        entry: Dict[str, Any] = {'threshold_pct': threshold, 'resolution_pct': resolution_pct, 'percentiles': {}}
+        for side, distributions in (('baseline', baseline), ('candidate', candidate)):
+            values, counts = distributions.get(name, (np.array([]), np.array([])))
+            entry[side] = {'count': int(counts.sum())}
+            if len(values):
+                entry[side].update({f"p{q:g}": weighted_percentile(values, counts, q) for q in percentiles})
+        if min(entry['baseline']['count'], entry['candidate']['count']) < min_samples:
+            entry['status'] = 'insufficient_data'
+            results[name] = entry
+            continue
+        if threshold < resolution_pct:
+            # Un écart inférieur à la largeur d'un bucket ne peut pas être distingué du bruit de mesure
+            entry['status'] = 'insufficient_resolution'
+            results[name] = entry
+            continue
+
+        statuses = []
+        for q in percentiles:
+            base_value = entry['baseline'][f"p{q:g}"]
+            cand_value = entry['candidate'][f"p{q:g}"]
+            ratio = cand_value / base_value if base_value > 0 else float('inf')
+            ci = bootstrap_ratio_ci(baseline[name], candidate[name], q, n_bootstrap, confidence, rng)
+            if resolution_pct:
+                # Les percentiles de buckets ne sont connus qu'à un bucket près : l'intervalle
+                # bootstrap (sur les milieux de buckets) est élargi de cette incertitude
+                growth = 1.0 + resolution_pct / 100.0
+                ci = (ci[0] / growth, ci[1] * growth)
+            status = classify(ratio, ci, threshold)
+            statuses.append(status)
+            entry['percentiles'][f"p{q:g}"] = {
+                'baseline': base_value,
+                'candidate': cand_value,
+                'ratio': ratio,
+                'ci': list(ci),
+                'status': status,
+            }
+        entry['status'] = max(statuses, key=STATUS_SEVERITY.index)
+        results[name] = entry
+    return results
+
+
+def build_report(results: Dict[str, Any], baseline_files: List[str], candidate_files: List[str],
+                 settings: Dict[str, Any], fail_on_missing: bool) -> Dict[str, Any]:
+    by_status: Dict[str, List[str]] = {status: [] for status in STATUS_SEVERITY}
+    for name, entry in results.items():
+        by_status[entry['status']].append(name)
+    failed = by_status['regression'] or (
+        fail_on_missing and (by_status['insufficient_data'] or by_status['insufficient_resolution']))
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'baseline_files': baseline_files,
+        'candidate_files': candidate_files,
+        'settings': settings,
+        'operations': results,
+        'summary': by_status,
+        'exit_code': EXIT_REGRESSION if failed else EXIT_OK,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    icons = {'regression': '🔴', 'possible_regression': '🟠', 'ok': '🟢',
+             'improvement': '🚀', 'insufficient_data': '⚪', 'insufficient_resolution': '⚪'}
+    print("\n" + "=" * 80)
+    print("📊 COMPARAISON DE PERFORMANCE : RÉFÉRENCE → CANDIDAT")
+    print("=" * 80)
+    for name, entry in report['operations'].items():
+        print(f"{icons[entry['status']]} {name} ({entry['status']}, seuil {entry['threshold_pct']:g}%, "
+              f"n={entry['baseline']['count']}→{entry['candidate']['count']}, "
+              f"résolution {entry['resolution_pct']:.1f}%)")
+        if entry['status'] == 'insufficient_resolution':
+            print(f"    ⚠️ Seuil inférieur à la résolution des histogrammes : activer "
+                  f"PERF_METRICS_RING_BUFFER_SIZE pour comparer les mesures brutes")
+        for label, stats in entry['percentiles'].items():
+            print(f"    {label}: {stats['baseline'] * 1000:.1f}ms → {stats['candidate'] * 1000:.1f}ms "
+                  f"(×{stats['ratio']:.2f}, IC [{stats['ci'][0]:.2f}, {stats['ci'][1]:.2f}])")
+    regressions = report['summary']['regression']
+    print(f"\n{'❌' if report['exit_code'] else '✅'} {len(regressions)} régression(s)"
+          + (f": {', '.join(regressions)}" if regressions else ""))
+
+
+def expand_files(patterns: List[str]) -> List[str]:
+    files = []
+    for pattern in patterns:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+    return files
+
+
+def parse_op_threshold(value: str) -> Tuple[str, float]:
+    pattern, _, pct = value.rpartition("=")
+    if not pattern:
+        raise argparse.ArgumentTypeError(f"Format attendu MOTIF=POURCENT: {value}")
+    return pattern, float(pct)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Détection de régressions de latence entre deux exécutions")
+    parser.add_argument("--baseline", nargs="+", required=True, help="Fichiers de métriques de référence (motifs glob acceptés)")
+    parser.add_argument("--candidate", nargs="+", required=True, help="Fichiers de métriques candidats (motifs glob acceptés)")
+    parser.add_argument("--operations", nargs="+", default=["*"], help="Opérations comparées (motifs fnmatch)")
+    parser.add_argument("--percentiles", default="50,95,99", help="Percentiles comparés")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Hausse tolérée en %% (défaut 10)")
+    parser.add_argument("--op-threshold", type=parse_op_threshold, action="append", default=[],
+                        help="Seuil par opération, ex: 'llm_*=20' (répétable, premier motif correspondant)")
+    parser.add_argument("--min-samples", type=int, default=20, help="Mesures minimales par côté")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="Nombre de rééchantillonnages bootstrap")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Niveau de confiance des intervalles")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur aléatoire")
+    parser.add_argument("--fail-on-missing", action="store_true",
+                        help="Échouer si une opération n'a pas assez de mesures ou de résolution")
+    parser.add_argument("--report", help="Rapport JSON de sortie")
+    args = parser.parse_args(argv)
+
+    try:
+        baseline_files = expand_files(args.baseline)
+        candidate_files = expand_files(args.candidate)
+        baseline, baseline_resolutions = load_distributions(baseline_files)
+        candidate, candidate_resolutions = load_distributions(candidate_files)
+        percentiles = [float(q) for q in args.percentiles.split(",")]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Lecture des métriques impossible: {e}")
+        return EXIT_ERROR
+
+    settings = {
+        'operations': args.operations,
+        'percentiles': percentiles,
+        'threshold_pct': args.threshold,
+        'op_thresholds': [list(t) for t in args.op_threshold],
+        'min_samples': args.min_samples,
+        'bootstrap': args.bootstrap,
+        'confidence': args.confidence,
+        'seed': args.seed,
+    }
+    results = compare_runs(baseline, candidate, args.operations, percentiles, args.threshold,
+                           args.op_threshold, args.min_samples, args.bootstrap, args.confidence, args.seed,
+                           resolutions={name: max(baseline_resolutions.get(name, 0.0),
+                                                  candidate_resolutions.get(name, 0.0))
+                                        for name in set(baseline_resolutions) | set(candidate_resolutions)})
+    report = build_report(results, baseline_files, candidate_files, settings, args.fail_on_missing)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Rapport sauvegardé dans: {args.report}")
+    return report['exit_code']
+
+
+if __name__ == "__main__":
+    sys.exit(main())
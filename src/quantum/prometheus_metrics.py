@@ -0,0 +1,187 @@
+"""
+Exposition des métriques au format texte Prometheus (sans dépendance externe)
+Les latences viennent des histogrammes de performance_metrics (alimentés par
+time_operation / time_operation_context) ; compteurs, jauges et collecteurs
+complètent les familles exposées par /metrics.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from performance_metrics import LogHistogram, performance_tracker
+
+# Étapes du pipeline → opérations chronométrées qui les alimentent
+# (chemin quantique classique, chemin Grover et API)
+STAGE_OPERATIONS: Dict[str, Tuple[str, ...]] = {
+    "embedding": ("semantic_embedding_generation", "query_embedding_generation"),
+    "prefilter": ("cosine_prefilter", "database_embedding_retrieval"),
+    "quantum_scoring": ("quantum_similarity_computation", "grover_search"),
+    "chunk_fetch": ("chunk_fetch",),
+    "llm": ("llm_generate",),
+    "parse": ("llm_parse",),
+}
+
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+Labels = Dict[str, str]
+Sample = Tuple[str, Labels, float]
+
+
+class MetricFamily:
+    """Famille de métriques : nom, type, aide et échantillons (suffixe, labels, valeur)"""
+
+    def __init__(self, name: str, metric_type: str, help_text: str, samples: Optional[List[Sample]] = None):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.samples: List[Sample] = samples or []
+
+    def add(self, value: float, labels: Optional[Labels] = None, suffix: str = ""):
+        self.samples.append((suffix, labels or {}, value))
+        return self
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def render_families(families: Iterable[MetricFamily]) -> str:
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {_escape(family.help_text)}")
+        lines.append(f"# TYPE {family.name} {family.metric_type}")
+        for suffix, labels, value in family.samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            name = family.name + suffix
+            lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def histogram_family(name: str, help_text: str, histograms: Dict[str, LogHistogram], label: str,
+                     bounds: List[float] = LATENCY_BUCKETS) -> MetricFamily:
+    """Histogrammes Prometheus (buckets cumulés, _sum, _count), un par valeur de label"""
+    family = MetricFamily(name, "histogram", help_text)
+    for label_value, histogram in histograms.items():
+        for bound, count in zip(bounds, histogram.cumulative_counts(bounds)):
+            family.add(count, {label: label_value, "le": _format_value(bound)}, "_bucket")
+        family.add(histogram.count, {label: label_value, "le": "+Inf"}, "_bucket")
+        family.add(histogram.total, {label: label_value}, "_sum")
+        family.add(histogram.count, {label: label_value}, "_count")
+    return family
+
+
+def process_rss_bytes() -> Optional[float]:
+    """Mémoire résidente du processus (/proc, sinon pic RSS via resource)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return float(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+    except Exception:
+        return None
+
+
+class MetricsRegistry:
+    """Compteurs, jauges d'appels en cours et collecteurs, rendus ensemble par render()"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._descriptions: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        with self._lock:
+            self._descriptions[name] = (metric_type, help_text)
+            self._values.setdefault(name, {})
+
+    def inc(self, name: str, labels: Optional[Labels] = None, value: float = 1.0):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    @contextmanager
+    def in_flight(self, resource: str):
+        """Jauge des appels en cours vers une ressource externe (Cassandra, Ollama...)"""
+        self.inc("fact_check_in_flight", {"resource": resource})
+        try:
+            yield
+        finally:
+            self.inc("fact_check_in_flight", {"resource": resource}, -1.0)
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            families = []
+            for name, series in self._values.items():
+                metric_type, help_text = self._descriptions.get(name, ("untyped", name))
+                family = MetricFamily(name, metric_type, help_text)
+                for key, value in series.items():
+                    family.add(value, dict(key))
+                families.append(family)
+            collectors = list(self._collectors)
+        for collector in collectors:
+            families.extend(collector())
+        return families
+
+    def render(self) -> str:
+        return render_families(self.collect())
+
+
+def collect_performance_metrics() -> List[MetricFamily]:
+    """Latences par étape du pipeline et résumé de toutes les opérations chronométrées"""
+    histograms = performance_tracker.get_histograms()
+    stages: Dict[str, LogHistogram] = {}
+    for stage, operations in STAGE_OPERATIONS.items():
+        for operation in operations:
+            if operation in histograms:
+                if stage in stages:
+                    stages[stage].merge(histograms[operation])
+                else:
+                    stages[stage] = histograms[operation].copy()
+
+    operations = MetricFamily("fact_check_operation_duration_seconds", "summary",
+                              "Durée des opérations chronométrées (percentiles estimés)")
+    for name, histogram in histograms.items():
+        for quantile in (50, 95, 99):
+            operations.add(histogram.percentile(quantile), {"operation": name, "quantile": str(quantile / 100)})
+        operations.add(histogram.total, {"operation": name}, "_sum")
+        operations.add(histogram.count, {"operation": name}, "_count")
+
+    families = [
+        histogram_family("fact_check_stage_duration_seconds", "Durée de chaque étape du pipeline",
+                         stages, "stage"),
+        operations,
+    ]
+    rss = process_rss_bytes()
+    if rss is not None:
+        families.append(MetricFamily("process_resident_memory_bytes", "gauge",
+                                     "Mémoire résidente du processus").add(rss))
+    return families
+
+
+# Registre global (comme performance_tracker)
+registry = MetricsRegistry()
+registry.describe("fact_check_in_flight", "gauge", "Appels en cours par ressource externe")
+registry.register_collector(collect_performance_metrics)
+
+
+def render_metrics() -> str:
+    """Texte d'exposition Prometheus (version 0.0.4)"""
+    return registry.render()
@@ -1,5 +1,4 @@
 import os
-from qiskit import QuantumCircuit
 
 def list_qasm_files(db_folder):
     """Liste les fichiers QASM présents dans le dossier."""
@@ -7,6 +6,7 @@ def list_qasm_files(db_folder):
 
 def load_qasm_circuit(qasm_path):
     """Charge un circuit Qiskit depuis un fichier QASM."""
+    from qiskit import QuantumCircuit
     with open(qasm_path, 'r') as f:
         qasm_str = f.read()
     qc = QuantumCircuit.from_qasm_str(qasm_str)
@@ -1,7 +1,5 @@
 import os
 import numpy as np
-from qiskit import QuantumCircuit
-from sklearn.decomposition import PCA # Added for PCA
 
 def text_to_vector(text, n_qubits):
     vec = [ord(c) for c in text if ord(c) < 128]
@@ -15,6 +13,7 @@ def text_to_vector(text, n_qubits):
     return vec
 
 def angle_encoding(vec):
+    from qiskit import QuantumCircuit
     n_qubits = len(vec)
     qc = QuantumCircuit(n_qubits)
     for i, angle in enumerate(vec):
@@ -49,7 +48,8 @@ def improved_amplitude_encoding(vec, n_qubits=None):
     if norm > 0:
         normalized = normalized / norm
     
-    # Créer le circuit quantique
+    # Créer le circuit quantique (Qiskit importé au premier encodage)
+    from qiskit import QuantumCircuit
     qc = QuantumCircuit(n_qubits)
     
     # Amélioration 1: Utiliser des rotations plus sophistiquées
@@ -1,10 +1,13 @@
 import os
+import threading
 import numpy as np
-from qiskit_aer import Aer
-from qiskit import transpile
 from quantum_encoder import text_to_vector, angle_encoding, amplitude_encoding
 from quantum_db import list_qasm_files, load_qasm_circuit
 from performance_metrics import time_operation, time_operation_context, log_quantum_operation
+from prometheus_metrics import registry as metrics_registry
+from tracing import add_span_counter
+from structured_logging import payload_sampled
+from thread_budget import aer_run_options, compute_slot
 import logging
 import time
 
@@ -19,30 +22,36 @@ logging.getLogger('performance_metrics').setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
+def overlap_transform(overlap):
+    """
+    Transformation non-linéaire de la fidélité pour mieux séparer les similarités
+    (scalaire ou tableau numpy)
+    """
+    overlap = np.asarray(overlap, dtype=float)
+    # Compression des très hautes similarités, expansion des très basses
+    return np.where(overlap > 0.9, 0.9 + 0.1 * (overlap - 0.9) ** 2,
+                    np.where(overlap < 0.1, np.sqrt(overlap), overlap))
+
 @time_operation("quantum_overlap_calculation")
 def quantum_overlap_similarity(qc1, qc2):
     """Calcule l'overlap (fidelity) entre deux circuits via simulation Qiskit Aer."""
     try:
+        # Qiskit Aer est importé au premier calcul (ou par warm_up), pas au chargement du module
+        from qiskit_aer import Aer
+        from qiskit import transpile
         backend = Aer.get_backend('statevector_simulator')
         qc1_t = transpile(qc1, backend)
         qc2_t = transpile(qc2, backend)
-        state1 = backend.run(qc1_t).result().get_statevector()
-        state2 = backend.run(qc2_t).result().get_statevector()
+        # Parallélisme interne d'Aer borné par le budget de threads (sinon tous les cœurs)
+        aer_options = aer_run_options()
+        state1 = backend.run(qc1_t, **aer_options).result().get_statevector()
+        state2 = backend.run(qc2_t, **aer_options).result().get_statevector()
         
         # Calculer la fidélité (overlap) entre les deux états quantiques
         # La fidélité est |<ψ1|ψ2>|²
         overlap = np.abs(np.vdot(state1, state2)) ** 2
         
-        # Amélioration: Appliquer une transformation non-linéaire pour mieux différencier
-        # Cela permet d'avoir une meilleure séparation entre les similarités
-        if overlap > 0.9:
-            # Pour les très hautes similarités, appliquer une compression
-            overlap = 0.9 + 0.1 * (overlap - 0.9) ** 2
-        elif overlap < 0.1:
-            # Pour les très basses similarités, appliquer une expansion
-            overlap = overlap ** 0.5
-        
-        return overlap
+        return float(overlap_transform(overlap))
     except Exception as e:
         print(f"⚠️ Erreur dans quantum_overlap_similarity: {e}")
         print(f"   Circuit 1: {qc1.name if hasattr(qc1, 'name') else 'Unknown'}")
@@ -52,12 +61,84 @@ def quantum_overlap_similarity(qc1, qc2):
         # Fallback vers une similarité basique
         return 0.5
 
-@time_operation("retrieve_top_k_search")
-def retrieve_top_k(query_text, db_folder, k=5, n_qubits=8, cassandra_manager=None):
+def qasm_name_for_chunk(chunk_id, n_qubits):
+    """Nom du fichier QASM d'un chunk (chunk_id sans le préfixe 'doc_')"""
+    if n_qubits == 4:
+        # Format: 0 → embedding_4qubits_None_doc_0.qasm
+        return f"embedding_4qubits_None_doc_{chunk_id}.qasm"
+    elif n_qubits == 8:
+        # Format: 0 → None_doc_0_8qubits.qasm
+        return f"None_doc_{chunk_id}_8qubits.qasm"
+    # Format pour autres qubits
+    return f"{chunk_id}.qasm"
+
+def qasm_path_for_chunk_id(db_folder, chunk_id, n_qubits):
+    """Chemin QASM d'un chunk désigné par son row_id ('doc_XXXX')"""
+    chunk_number = chunk_id[len('doc_'):] if chunk_id.startswith('doc_') else chunk_id
+    return os.path.join(db_folder, qasm_name_for_chunk(chunk_number, n_qubits))
+
+def chunk_id_from_qasm_path(qasm_path):
+    """Extraire le chunk_id ('doc_XXXX') d'un chemin QASM en gérant les préfixes/suffixes de nommage"""
+    filename = os.path.basename(qasm_path).replace('.qasm', '')
+    # Retirer le suffixe spécifique 8 qubits si présent
+    if filename.endswith('_8qubits'):
+        filename = filename.replace('_8qubits', '')
+    # Pour les QASM 4 qubits: 'embedding_4qubits_None_doc_XXXX' → 'doc_XXXX'
+    if filename.startswith('embedding_4qubits_'):
+        filename = filename.replace('embedding_4qubits_', '')
+    # Pour les QASM 8 qubits: 'None_doc_XXXX_8qubits' → 'XXXX'
+    if filename.startswith('None_doc_') and filename.endswith('_8qubits'):
+        filename = filename.replace('None_doc_', '').replace('_8qubits', '')
+    # Retirer le préfixe 'None_' si présent
+    if filename.startswith('None_'):
+        filename = filename.replace('None_', '')
+    return filename
+
+# Modèles PCA déjà chargés, par chemin (joblib.load une seule fois par processus)
+_pca_models = {}
+_pca_models_lock = threading.Lock()
+
+PCA_MODEL_PATH = "src/quantum/pca_model_8qubits.pkl"
+
+
+def load_pca_model(pca_model_path=PCA_MODEL_PATH):
+    """PCA fixe sauvegardé, mis en cache après le premier chargement (None si absent)"""
+    with _pca_models_lock:
+        if pca_model_path not in _pca_models:
+            if not os.path.exists(pca_model_path):
+                return None
+            import joblib
+            _pca_models[pca_model_path] = joblib.load(pca_model_path)
+            print("✅ PCA fixe chargé depuis le fichier")
+        return _pca_models[pca_model_path]
+
+
+def warm_up(n_qubits=8):
     """
-    Encode la requête avec embedding sémantique + PCA fixe + amplitude encoding, 
-    charge tous les circuits QASM, calcule l'overlap, retourne les top-k chunks.
+    Préchauffer le chemin quantique : imports Qiskit/Aer, PCA fixe et une première simulation
+    (transpilation et backend initialisés hors du chemin des requêtes)
     """
+    with time_operation_context("quantum_warm_up", {"n_qubits": n_qubits}):
+        load_pca_model()
+        qc = amplitude_encoding(np.ones(n_qubits), n_qubits)
+        quantum_overlap_similarity(qc, qc)
+
+
+def embed_query(query_text, cassandra_manager, embedding_batcher=None, timeout=None):
+    """Embedding sémantique de la requête (micro-batché si un embedding_batcher est fourni)"""
+    with time_operation_context("semantic_embedding_generation"):
+        if embedding_batcher is not None:
+            return embedding_batcher.embed(query_text, timeout=timeout)
+        return cassandra_manager.embed_model.get_text_embedding_batch([query_text])[0]
+
+def encode_query(query_text, n_qubits=8, cassandra_manager=None, embedding_batcher=None, timeout=None,
+                 pca=None):
+    """
+    Encode la requête en circuit quantique.
+    Retourne (circuit, embedding sémantique ou None).
+    Un PCA déjà chargé (par exemple celui du bundle de service) remplace le PCA fixe.
+    """
+    query_embedding = None
     with time_operation_context("query_encoding", {"n_qubits": n_qubits, "query_length": len(query_text)}):
         if cassandra_manager is None:
             print("⚠️ Aucun cassandra_manager fourni, utilisation de l'ancienne méthode")
@@ -66,19 +147,13 @@ def retrieve_top_k(query_text, db_folder, k=5, n_qubits=8, cassandra_manager=Non
             qc_query = angle_encoding(vec)
         else:
             # Utiliser l'embedding sémantique + PCA fixe + amplitude encoding
-            print("🔄 Génération de l'embedding sémantique pour la requête...")
-            with time_operation_context("semantic_embedding_generation"):
-                query_embedding = cassandra_manager.embed_model.get_text_embedding_batch([query_text])[0]
+            query_embedding = embed_query(query_text, cassandra_manager, embedding_batcher, timeout)
             
             # Charger le PCA fixe sauvegardé
             with time_operation_context("pca_loading"):
                 try:
-                    import joblib
-                    pca_model_path = "src/quantum/pca_model_8qubits.pkl"
-                    if os.path.exists(pca_model_path):
-                        pca = joblib.load(pca_model_path)
-                        print("✅ PCA fixe chargé depuis le fichier")
-                    else:
+                    pca = pca if pca is not None else load_pca_model()
+                    if pca is None:
                         print("⚠️ PCA fixe non trouvé, utilisation du PCA dynamique")
                         # Fallback vers l'ancienne méthode
                         all_chunks = cassandra_manager.get_all_chunks_with_embeddings()
@@ -103,150 +178,318 @@ def retrieve_top_k(query_text, db_folder, k=5, n_qubits=8, cassandra_manager=Non
             with time_operation_context("amplitude_encoding"):
                 qc_query = amplitude_encoding(query_emb_reduced, n_qubits)
     
-    # Pré-filtrer les candidats via Cassandra pour limiter le nombre de QASM comparés
-    if cassandra_manager is not None:
-        try:
-            # Récupérer les 100 meilleurs candidats via recherche vectorielle sur les embeddings
-            print(f"🔍 Recherche vectorielle sur les embeddings pour la requête: '{query_text[:50]}...'")
-            
-            # Étape 1: Calculer l'embedding de la requête
-            from ollama import Client
-            client = Client(host='http://localhost:11434')
-            
-            # Générer l'embedding de la requête
-            query_embedding = client.embeddings(model='llama2:7b', prompt=query_text)
-            query_vector = query_embedding['embedding']
-            
-            print(f"📊 Embedding de la requête calculé: {len(query_vector)} dimensions")
-            
-            # Étape 2: Récupérer TOUS les embeddings stockés et calculer les similarités
-            query_cql = "SELECT row_id, metadata_s, body_blob, vector FROM fact_checker_keyspace.fact_checker_docs"
-            rows = cassandra_manager.session.execute(query_cql)
-            
-            # Calculer les similarités et trier
-            similarities = []
-            total_chunks = 0
-            processed_chunks = 0
-            
-            print(f"🧮 Calcul des similarités cosinus sur tous les chunks...")
-            for row in rows:
-                total_chunks += 1
-                if hasattr(row, 'vector') and row.vector:
-                    processed_chunks += 1
-                    # Calculer la similarité cosinus
-                    doc_vector = row.vector
-                    # Utiliser numpy pour la similarité cosinus
-                    similarity = np.dot(query_vector, doc_vector) / (np.linalg.norm(query_vector) * np.linalg.norm(doc_vector))
-                    
-                    # Utiliser row_id directement car metadata_s est None
-                    raw_chunk_id = row.row_id
-                    
-                    # Extraire le numéro du chunk depuis row_id (ex: 'doc_0' → '0')
-                    if raw_chunk_id.startswith('doc_'):
-                        chunk_id = raw_chunk_id.replace('doc_', '')
-                    else:
-                        chunk_id = str(raw_chunk_id)
-                    
-                    similarities.append((similarity, {
-                        'metadata': {'chunk_id': chunk_id},
-                        'id': row.row_id,
-                        'chunk_id': chunk_id,
-                        'content': row.body_blob,
-                        'source': 'unknown'  # metadata_s est None
-                    }))
-                    
-                    # Afficher le progrès tous les 1000 chunks
-                    if processed_chunks % 1000 == 0:
-                        print(f"   📊 {processed_chunks} chunks traités...")
-            
-            print(f"📊 Total chunks dans la base: {total_chunks}")
-            print(f"📊 Chunks avec embeddings: {processed_chunks}")
-            print(f"📊 Chunks traités pour similarité: {len(similarities)}")
-            
-            # Trier par similarité décroissante et prendre les 100 meilleurs
-            similarities.sort(reverse=True, key=lambda x: x[0])
-            base_results = [item[1] for item in similarities[:100]]
+    return qc_query, query_embedding
+
+def prefilter_candidates(query_text, db_folder, n_qubits=8, cassandra_manager=None,
+                         query_embedding=None, n_candidates=100, retrieval_info=None):
+    """
+    Pré-filtre les candidats par similarité cosinus sur les embeddings Cassandra.
+    Retourne la liste des candidats dont le circuit QASM existe, triés par cosinus décroissant :
+    [(cosine, qasm_path, chunk_id), ...]
+
+    Si retrieval_info est fourni, il reçoit le nombre de lignes lues, de vecteurs comparés
+    et de circuits trouvés ou manquants ; les octets lus (estimés) sont ajoutés au span courant.
+    """
+    if retrieval_info is None:
+        retrieval_info = {}
+    # Détail par candidat seulement pour les requêtes échantillonnées (LOG_PAYLOAD_SAMPLE_RATE)
+    detailed = payload_sampled() and logger.isEnabledFor(logging.DEBUG)
+    
+    # Étape 1: Calculer l'embedding de la requête
+    if query_embedding is not None:
+        # Même modèle : la similarité cosinus ne dépend pas de la normalisation
+        query_vector = query_embedding
+    else:
+        from ollama import Client
+        client = Client(host='http://localhost:11434')
+        
+        # Générer l'embedding de la requête
+        query_vector = client.embeddings(model='llama2:7b', prompt=query_text)['embedding']
+    
+    # Étape 2: Récupérer TOUS les embeddings stockés et calculer les similarités
+    query_cql = "SELECT row_id, metadata_s, body_blob, vector FROM fact_checker_keyspace.fact_checker_docs"
+    with metrics_registry.in_flight("cassandra"):
+        rows = cassandra_manager.session.execute(query_cql)
+    
+    # Calculer les similarités et trier
+    similarities = []
+    total_chunks = 0
+    processed_chunks = 0
+    bytes_read = 0
+    
+    for row in rows:
+        total_chunks += 1
+        # Estimation : caractères du texte et de l'identifiant, 4 octets par composante du vecteur
+        bytes_read += len(row.row_id or "") + len(row.body_blob or "") + 4 * len(row.vector or [])
+        if hasattr(row, 'vector') and row.vector:
+            processed_chunks += 1
+            # Calculer la similarité cosinus
+            doc_vector = row.vector
+            # Utiliser numpy pour la similarité cosinus
+            similarity = np.dot(query_vector, doc_vector) / (np.linalg.norm(query_vector) * np.linalg.norm(doc_vector))
             
-            print(f"🔍 Recherche vectorielle terminée: {len(base_results)} meilleurs candidats trouvés")
-            if base_results:
-                print(f"📊 Similarité max: {similarities[0][0]:.4f}, min: {similarities[-1][0]:.4f}")
-                print(f"🔍 Top 5 documents par similarité vectorielle:")
-                for i, (score, doc) in enumerate(similarities[:5]):
-                    chunk_id = doc['chunk_id']
-                    source = doc['source']
-                    print(f"   {i+1}. Chunk {chunk_id} (Similarité: {score:.4f}) - {source}")
+            # Utiliser row_id directement car metadata_s est None
+            raw_chunk_id = row.row_id
             
-            # Construire la liste des fichiers QASM candidats
-            candidate_files = []
-            print(f"🔍 Construction des candidats QASM...")
-            print(f"📁 Dossier QASM: {db_folder}")
+            # Extraire le numéro du chunk depuis row_id (ex: 'doc_0' → '0')
+            if raw_chunk_id.startswith('doc_'):
+                chunk_id = raw_chunk_id.replace('doc_', '')
+            else:
+                chunk_id = str(raw_chunk_id)
             
-            for i, res in enumerate(base_results):  # Traiter TOUS les candidats
-                chunk_id = res.get('metadata', {}).get('chunk_id') or res.get('id') or res.get('chunk_id')
-                print(f"   📝 Résultat {i+1}: chunk_id = '{chunk_id}'")
-                
-                if chunk_id:
-                    # Adapter le nom du fichier QASM selon le format réel
-                    if n_qubits == 4:
-                        # Format: 0 → embedding_4qubits_None_doc_0.qasm
-                        qasm_name = f"embedding_4qubits_None_doc_{chunk_id}.qasm"
-                    elif n_qubits == 8:
-                        # Format: 0 → None_doc_0_8qubits.qasm
-                        qasm_name = f"None_doc_{chunk_id}_8qubits.qasm"
-                    else:
-                        # Format pour autres qubits
-                        qasm_name = f"{chunk_id}.qasm"
-                    
-                    qasm_path = os.path.join(db_folder, qasm_name)
-                    if os.path.exists(qasm_path):
-                        candidate_files.append(qasm_path)
-                        print(f"      ✅ AJOUTÉ")
-                    else:
-                        print(f"      ❌ NON TROUVÉ")
-                else:
-                    print(f"      ⚠️ Pas de chunk_id")
+            similarities.append((similarity, {
+                'metadata': {'chunk_id': chunk_id},
+                'id': row.row_id,
+                'chunk_id': chunk_id,
+                'content': row.body_blob,
+                'source': 'unknown'  # metadata_s est None
+            }))
+    
+    retrieval_info['prefilter_rows_scanned'] = total_chunks
+    retrieval_info['prefilter_vectors_scored'] = processed_chunks
+    add_span_counter("cassandra_bytes_read", bytes_read)
+    
+    # Trier par similarité décroissante et prendre les meilleurs
+    similarities.sort(reverse=True, key=lambda x: x[0])
+    top_similarities = similarities[:n_candidates]
+    
+    # Construire la liste des fichiers QASM candidats
+    candidates = []
+    missing = []
+    for similarity, res in top_similarities:  # Traiter TOUS les candidats
+        chunk_id = res.get('metadata', {}).get('chunk_id') or res.get('id') or res.get('chunk_id')
+        if chunk_id:
+            qasm_path = os.path.join(db_folder, qasm_name_for_chunk(chunk_id, n_qubits))
+            if os.path.exists(qasm_path):
+                candidates.append((float(similarity), qasm_path, chunk_id_from_qasm_path(qasm_path)))
+                continue
+        missing.append(chunk_id)
+    
+    retrieval_info['circuits_resolved'] = len(candidates)
+    retrieval_info['circuits_missing'] = len(top_similarities) - len(candidates)
+    if detailed:
+        logger.debug("prefilter_candidates", extra={
+            'rows_scanned': total_chunks,
+            'vectors_scored': processed_chunks,
+            'qasm_folder': db_folder,
+            'top_cosine': [
+                {'chunk_id': doc['chunk_id'], 'score': round(float(score), 4)}
+                for score, doc in top_similarities[:5]
+            ],
+            'circuits_resolved': len(candidates),
+            'circuits_missing': missing,
+        })
+    return candidates
+
+# Coût moyen observé d'une comparaison de circuits (moyenne mobile exponentielle, secondes)
+_rerank_cost_per_circuit = None
+
+def estimated_rerank_time(n_files):
+    """Estimation du temps de reranking quantique pour n_files circuits"""
+    if _rerank_cost_per_circuit is None:
+        return 0.0
+    return n_files * _rerank_cost_per_circuit
+
+def quantum_rerank(qc_query, qasm_files, deadline=None):
+    """
+    Calcule l'overlap quantique entre la requête et chaque circuit.
+    Retourne (scores, complet) ; complet vaut False si l'échéance a interrompu le calcul.
+    """
+    global _rerank_cost_per_circuit
+    logger.info(f"Début comparaison quantique sur {len(qasm_files)} fichiers")
+    scores = []
+    start_time = time.time()
+    with time_operation_context("quantum_similarity_computation", {"n_files": len(qasm_files)}), \
+            compute_slot(deadline.retrieval_remaining() if deadline is not None else None) as acquired:
+        if not acquired:
+            logger.warning("Aucun slot de calcul libre avant l'échéance")
+            return scores, False
+        for i, qasm_path in enumerate(qasm_files):
+            if deadline is not None and deadline.retrieval_remaining() <= 0:
+                logger.warning(f"Échéance atteinte après {i}/{len(qasm_files)} circuits")
+                return scores, False
+            with time_operation_context("circuit_comparison", {"file": qasm_path}):
+                qc_doc = load_qasm_circuit(qasm_path)
+                score = quantum_overlap_similarity(qc_query, qc_doc)
+                scores.append((score, qasm_path, chunk_id_from_qasm_path(qasm_path)))
+    if qasm_files:
+        cost = (time.time() - start_time) / len(qasm_files)
+        if _rerank_cost_per_circuit is None:
+            _rerank_cost_per_circuit = cost
+        else:
+            _rerank_cost_per_circuit = 0.8 * _rerank_cost_per_circuit + 0.2 * cost
+    return scores, True
+
+def bundle_retrieve_top_k(bundle, query_text, db_folder, k=5, n_qubits=8, cassandra_manager=None,
+                          embedding_batcher=None, deadline=None, retrieval_info=None, on_prefilter=None,
+                          n_candidates=100):
+    """
+    Même récupération que retrieve_top_k (pré-filtre cosinus puis reranking par fidélité),
+    calculée sur le bundle de service : produit matriciel sur les embeddings projetés en
+    mémoire et vecteurs d'état précalculés, sans lecture Cassandra ni simulation par chunk.
+    """
+    from qiskit.quantum_info import Statevector
+    
+    qc_query, query_embedding = encode_query(
+        query_text, n_qubits, cassandra_manager, embedding_batcher,
+        timeout=deadline.timeout() if deadline is not None else None, pca=bundle.pca
+    )
+    retrieval_info['query_embedding'] = query_embedding
+    retrieval_info['engine'] = 'serving_bundle'
+    retrieval_info['bundle_generation'] = bundle.generation
+    
+    with time_operation_context("cosine_prefilter"):
+        with compute_slot():
+            indices, cosines = bundle.cosine_top(query_embedding, n_candidates)
+        resolved = bundle.has_circuit[indices].astype(bool)
+        retrieval_info['prefilter_rows_scanned'] = len(bundle)
+        retrieval_info['prefilter_vectors_scored'] = len(bundle)
+        retrieval_info['circuits_resolved'] = int(resolved.sum())
+        retrieval_info['circuits_missing'] = int(len(indices) - resolved.sum())
+        indices, cosines = indices[resolved], cosines[resolved]
+        add_span_counter("bundle_bytes_read", len(bundle) * bundle.embeddings.shape[1] * bundle.embeddings.itemsize)
+    
+    def candidate(score, i):
+        chunk_id = bundle.chunk_ids[i]
+        return (float(score), qasm_path_for_chunk_id(db_folder, chunk_id, n_qubits), chunk_id)
+    
+    cosine_candidates = [candidate(score, i) for score, i in zip(cosines, indices)]
+    retrieval_info['prefilter_candidates'] = len(cosine_candidates)
+    retrieval_info['circuits_candidates'] = len(cosine_candidates)
+    if cosine_candidates:
+        retrieval_info['prefilter_max_cosine'] = cosine_candidates[0][0]
+        if on_prefilter is not None:
+            on_prefilter(cosine_candidates[:k])
+    
+    if deadline is not None and cosine_candidates and deadline.retrieval_remaining() <= 0:
+        logger.warning("Budget épuisé avant le reranking quantique, ordre cosinus conservé")
+        deadline.degrade("quantum_rerank_skipped")
+        retrieval_info['ranking'] = 'cosine'
+        retrieval_info['circuits_scored'] = 0
+        return cosine_candidates[:k]
+    
+    with time_operation_context("quantum_similarity_computation", {"n_files": len(indices)}), compute_slot():
+        query_state = np.asarray(Statevector.from_instruction(qc_query).data)
+        scores = overlap_transform(bundle.fidelities(query_state, indices))
+    retrieval_info['circuits_scored'] = len(indices)
+    retrieval_info['ranking'] = 'quantum'
+    
+    with time_operation_context("results_sorting"):
+        order = np.argsort(-scores, kind='stable')[:k]
+    return [candidate(scores[j], indices[j]) for j in order]
+
+@time_operation("retrieve_top_k_search")
+def retrieve_top_k(query_text, db_folder, k=5, n_qubits=8, cassandra_manager=None,
+                   embedding_batcher=None, deadline=None, retrieval_info=None, on_prefilter=None,
+                   serving_bundle=None, shard_coordinator=None):
+    """
+    Encode la requête avec embedding sémantique + PCA fixe + amplitude encoding, 
+    charge tous les circuits QASM, calcule l'overlap, retourne les top-k chunks.
+
+    Si un embedding_batcher est fourni, l'embedding de la requête est regroupé avec
+    ceux des requêtes concurrentes et réutilisé pour le pré-filtrage cosinus.
+
+    Si une échéance (Deadline) est fournie et que le budget de récupération est épuisé,
+    le reranking quantique est sauté ou interrompu et l'ordre cosinus du pré-filtre est
+    utilisé ; les dégradations appliquées sont enregistrées dans l'échéance.
+
+    Si un dictionnaire retrieval_info est fourni, il est rempli avec les informations
+    de la récupération (nombre de candidats, cosinus maximal, classement utilisé) et
+    l'embedding de la requête (réutilisé par la compression des preuves).
+
+    Si on_prefilter est fourni, il est appelé avec le top-k cosinus du pré-filtre
+    avant le reranking quantique (lancement spéculatif de l'étape suivante).
+
+    Si un bundle de service (serving_bundle.ServingBundle) du même nombre de qubits est
+    fourni (avec cassandra_manager pour l'embedding de la requête), embeddings, vecteurs
+    d'état et PCA sont lus dans le bundle.
+
+    Si un coordinateur de shards (sharded_retrieval.ShardCoordinator) est fourni, seul
+    l'embedding de la requête est calculé ici ; pré-filtre et reranking sont répartis.
+    """
+    if retrieval_info is None:
+        retrieval_info = {}
+    if shard_coordinator is not None and cassandra_manager is not None:
+        timeout = deadline.timeout() if deadline is not None else None
+        with time_operation_context("query_encoding", {"n_qubits": n_qubits, "query_length": len(query_text)}):
+            query_embedding = embed_query(query_text, cassandra_manager, embedding_batcher, timeout)
+        retrieval_info['query_embedding'] = query_embedding
+        return shard_coordinator.retrieve_top_k(
+            query_embedding, db_folder, k, n_qubits, deadline=deadline,
+            retrieval_info=retrieval_info, on_prefilter=on_prefilter
+        )
+    if serving_bundle is not None and cassandra_manager is not None:
+        if serving_bundle.n_qubits == n_qubits:
+            return bundle_retrieve_top_k(
+                serving_bundle, query_text, db_folder, k, n_qubits, cassandra_manager,
+                embedding_batcher, deadline, retrieval_info, on_prefilter
+            )
+        logger.warning(f"Bundle {serving_bundle.generation} en {serving_bundle.n_qubits} qubits, "
+                       f"{n_qubits} attendus : récupération classique")
+    qc_query, query_embedding = encode_query(
+        query_text, n_qubits, cassandra_manager, embedding_batcher,
+        timeout=deadline.timeout() if deadline is not None else None
+    )
+    retrieval_info['query_embedding'] = query_embedding
+    
+    # Pré-filtrer les candidats via Cassandra pour limiter le nombre de QASM comparés
+    cosine_candidates = []
+    if cassandra_manager is not None:
+        try:
+            with time_operation_context("cosine_prefilter"):
+                cosine_candidates = prefilter_candidates(
+                    query_text, db_folder, n_qubits, cassandra_manager,
+                    query_embedding=query_embedding if embedding_batcher is not None else None,
+                    retrieval_info=retrieval_info
+                )
             
-            print(f"\n🔍 {len(candidate_files)} fichiers QASM candidats trouvés")
+            retrieval_info['prefilter_candidates'] = len(cosine_candidates)
+            if cosine_candidates:
+                retrieval_info['prefilter_max_cosine'] = cosine_candidates[0][0]
+                if on_prefilter is not None:
+                    on_prefilter(cosine_candidates[:k])
             
             # Utiliser les candidats si on en a trouvé
-            if len(candidate_files) > 0:
-                qasm_files = candidate_files
+            if len(cosine_candidates) > 0:
+                retrieval_info['engine'] = 'cosine_prefilter+quantum_rerank'
+                qasm_files = [qasm_path for _, qasm_path, _ in cosine_candidates]
                 logger.info(f"SYSTÈME HYBRIDE ACTIVÉ: {len(qasm_files)} candidats au lieu de tous les fichiers")
             else:
+                retrieval_info['engine'] = 'full_qasm_scan'
                 qasm_files = list_qasm_files(db_folder)
                 logger.warning(f"AUCUN CANDIDAT TROUVÉ, fallback sur {len(qasm_files)} fichiers QASM")
                 
         except Exception as e:
             logger.error(f"Erreur pré-filtrage: {e}")
+            retrieval_info['engine'] = 'full_qasm_scan'
             qasm_files = list_qasm_files(db_folder)
             logger.warning(f"Fallback sur {len(qasm_files)} fichiers QASM")
     else:
         logger.warning("Pas de cassandra_manager, utilisation de tous les fichiers QASM")
+        retrieval_info['engine'] = 'full_qasm_scan'
         qasm_files = list_qasm_files(db_folder)
     
-    logger.info(f"Début comparaison quantique sur {len(qasm_files)} fichiers")
-    with time_operation_context("quantum_similarity_computation", {"n_files": len(qasm_files)}):
-        scores = []
-        for i, qasm_path in enumerate(qasm_files):
-            with time_operation_context(f"circuit_comparison_{i}", {"file": qasm_path}):
-                qc_doc = load_qasm_circuit(qasm_path)
-                score = quantum_overlap_similarity(qc_query, qc_doc)
-                # Extraire le chunk_id en gérant les préfixes/suffixes de nommage
-                filename = os.path.basename(qasm_path).replace('.qasm', '')
-                # Retirer le suffixe spécifique 8 qubits si présent
-                if filename.endswith('_8qubits'):
-                    filename = filename.replace('_8qubits', '')
-                # Pour les QASM 4 qubits: 'embedding_4qubits_None_doc_XXXX' → 'doc_XXXX'
-                if filename.startswith('embedding_4qubits_'):
-                    filename = filename.replace('embedding_4qubits_', '')
-                # Pour les QASM 8 qubits: 'None_doc_XXXX_8qubits' → 'XXXX'
-                if filename.startswith('None_doc_') and filename.endswith('_8qubits'):
-                    filename = filename.replace('None_doc_', '').replace('_8qubits', '')
-                # Retirer le préfixe 'None_' si présent
-                if filename.startswith('None_'):
-                    filename = filename.replace('None_', '')
-                chunk_id = filename
-                scores.append((score, qasm_path, chunk_id))
+    retrieval_info['circuits_candidates'] = len(qasm_files)
+    
+    # Mode dégradé : budget insuffisant pour le reranking, garder l'ordre cosinus
+    if (deadline is not None and cosine_candidates
+            and deadline.retrieval_remaining() <= estimated_rerank_time(len(qasm_files))):
+        logger.warning("Budget épuisé avant le reranking quantique, ordre cosinus conservé")
+        deadline.degrade("quantum_rerank_skipped")
+        retrieval_info['ranking'] = 'cosine'
+        retrieval_info['circuits_scored'] = 0
+        return cosine_candidates[:k]
+    
+    scores, complete = quantum_rerank(qc_query, qasm_files, deadline)
+    retrieval_info['circuits_scored'] = len(scores)
+    retrieval_info['ranking'] = 'quantum'
+    if not complete:
+        if cosine_candidates:
+            deadline.degrade("quantum_rerank_aborted")
+            retrieval_info['ranking'] = 'cosine'
+            return cosine_candidates[:k]
+        deadline.degrade("quantum_rerank_partial")
+        retrieval_info['ranking'] = 'quantum_partial'
     
     with time_operation_context("results_sorting"):
         scores.sort(reverse=True, key=lambda x: x[0])
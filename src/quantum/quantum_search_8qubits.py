@@ -45,7 +45,7 @@ def retrieve_top_k_8qubits(query, db_folder, k=10, n_qubits=8, cassandra_manager
         qasm_files = list_qasm_files(db_folder)
         
         for i, qasm_path in enumerate(qasm_files):
-            with time_operation_context(f"circuit_comparison_8qubits_{i}", {"file": qasm_path}):
+            with time_operation_context("circuit_comparison_8qubits", {"file": qasm_path}):
                 try:
                     # Charger le circuit du document
                     qc_doc = load_qasm_circuit_8qubits(qasm_path)
@@ -0,0 +1,99 @@
+"""
+Porte de confiance avant le LLM
+Si les preuves récupérées sont clairement sans rapport avec le claim, on répond
+UNVERIFIABLE directement au lieu de payer une génération LLM complète
+"""
+
+import os
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+
+
+@dataclass
+class RetrievalGateConfig:
+    """Seuils de la porte (0.0 = critère désactivé)"""
+    enabled: bool = False
+    min_prefilter_cosine: float = 0.0
+    min_overlap_max: float = 0.0
+    min_overlap_mean: float = 0.0
+    min_overlap_margin: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "RetrievalGateConfig":
+        return cls(
+            enabled=os.getenv("RETRIEVAL_GATE_ENABLED", "false").lower() in ("1", "true", "yes"),
+            min_prefilter_cosine=float(os.getenv("RETRIEVAL_GATE_MIN_PREFILTER_COSINE", "0")),
+            min_overlap_max=float(os.getenv("RETRIEVAL_GATE_MIN_OVERLAP_MAX", "0")),
+            min_overlap_mean=float(os.getenv("RETRIEVAL_GATE_MIN_OVERLAP_MEAN", "0")),
+            min_overlap_margin=float(os.getenv("RETRIEVAL_GATE_MIN_OVERLAP_MARGIN", "0")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# Signal → attribut de seuil correspondant
+GATE_SIGNALS = {
+    'prefilter_max_cosine': 'min_prefilter_cosine',
+    'overlap_max': 'min_overlap_max',
+    'overlap_mean': 'min_overlap_mean',
+    'overlap_margin': 'min_overlap_margin',
+}
+
+
+def retrieval_signals(similarity_scores: List[float], retrieval_info: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """
+    Extraire les signaux de confiance de la récupération
+
+    Args:
+        similarity_scores: Scores des top-k chunks retournés par retrieve_top_k
+        retrieval_info: Informations remplies par retrieve_top_k
+
+    Returns:
+        Cosinus maximal du pré-filtre et distribution des overlaps quantiques
+        (max, moyenne et marge = max - moyenne). Un signal absent vaut None.
+    """
+    signals = {
+        'prefilter_max_cosine': retrieval_info.get('prefilter_max_cosine'),
+        'overlap_max': None,
+        'overlap_mean': None,
+        'overlap_margin': None,
+    }
+    # Les overlaps n'existent que si le reranking quantique a réellement tourné
+    if similarity_scores and retrieval_info.get('ranking') == 'quantum':
+        scores = np.array(similarity_scores, dtype=float)
+        signals['overlap_max'] = float(scores.max())
+        signals['overlap_mean'] = float(scores.mean())
+        signals['overlap_margin'] = float(scores.max() - scores.mean())
+    return signals
+
+
+def evaluate_gate(signals: Dict[str, Optional[float]], config: RetrievalGateConfig) -> Tuple[bool, List[str]]:
+    """
+    Vérifier si la récupération est assez pertinente pour appeler le LLM
+
+    Returns:
+        (passe, raisons de l'échec)
+    """
+    if not config.enabled:
+        return True, []
+
+    reasons = []
+    for signal_name, threshold_name in GATE_SIGNALS.items():
+        threshold = getattr(config, threshold_name)
+        value = signals.get(signal_name)
+        if threshold > 0 and value is not None and value < threshold:
+            reasons.append(f"{signal_name}={value:.4f} < {threshold:.4f}")
+    return not reasons, reasons
+
+
+UNVERIFIABLE_EXPLANATION_TEMPLATE = (
+    "The retrieved evidence is not related closely enough to the claim to verify it "
+    "({reasons}). No source in the knowledge base addresses this claim directly."
+)
+
+
+def gated_explanation(reasons: List[str]) -> str:
+    """Explication standard renvoyée quand la porte est fermée"""
+    return UNVERIFIABLE_EXPLANATION_TEMPLATE.format(reasons="; ".join(reasons))
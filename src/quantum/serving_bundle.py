@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Bundle de service en lecture seule partagé entre les workers
+Une génération est un dossier contenant la matrice d'embeddings normalisés, les vecteurs
+d'état des circuits, les matrices du PCA, la table des identifiants et les textes des chunks,
+décrits par manifest.json. Les workers l'ouvrent avec np.memmap : le cache de pages du
+système garde une seule copie physique pour tous les processus. Le fichier CURRENT désigne
+la génération active ; il est remplacé atomiquement et relu périodiquement par les workers.
+
+Usage:
+    python serving_bundle.py build --root /srv/quantum_bundles --qasm-folder quantum_db_8qubits \\
+        --pca pca_model_8qubits.pkl --n-qubits 8 --keep 3
+    python serving_bundle.py activate --root /srv/quantum_bundles gen-20250101T120000-ab12cd
+    python serving_bundle.py info --root /srv/quantum_bundles
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+import threading
+import numpy as np
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from quantum_search import qasm_path_for_chunk_id
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+GENERATION_PREFIX = "gen-"
+
+# Ligne source d'un bundle : (row_id, texte, source, vecteur d'embedding)
+BundleRow = Tuple[str, str, str, List[float]]
+
+
+class BundlePCA:
+    """PCA figé du bundle (même transformation que sklearn.decomposition.PCA.transform)"""
+
+    def __init__(self, components: np.ndarray, mean: np.ndarray, scale: np.ndarray):
+        self.components = components
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        return (X - self.mean) @ self.components.T / self.scale
+
+
+class ServingBundle:
+    """Génération ouverte en lecture seule ; les tableaux sont des np.memmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"Version de bundle non supportée: {self.manifest.get('format_version')}")
+        self.generation = self.manifest['generation']
+        self.n_qubits = self.manifest['n_qubits']
+
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.embeddings = self._array("embeddings")
+        self.statevectors = self._array("statevectors")
+        self.has_circuit = self._array("has_circuit")
+        self.pca = BundlePCA(self._array("pca_components"), self._array("pca_mean"), self._array("pca_scale"))
+        self._text_data = self._array("text_data")
+        self._text_offsets = self._array("text_offsets")
+        self._source_data = self._array("source_data")
+        self._source_offsets = self._array("source_offsets")
+
+        with open(os.path.join(path, self.manifest['ids_file']), 'r', encoding='utf-8') as f:
+            self.chunk_ids: List[str] = json.load(f)
+        self._index = {chunk_id: i for i, chunk_id in enumerate(self.chunk_ids)}
+
+    def _array(self, name: str) -> np.ndarray:
+        spec = self.manifest['arrays'][name]
+        shape = tuple(spec['shape'])
+        file_path = os.path.join(self.path, spec['file'])
+        expected = int(np.prod(shape)) * np.dtype(spec['dtype']).itemsize
+        if os.path.getsize(file_path) != expected:
+            raise ValueError(f"Taille inattendue pour {spec['file']}: {os.path.getsize(file_path)} ≠ {expected}")
+        if expected == 0:
+            # mmap refuse les fichiers vides
+            array = np.zeros(shape, dtype=spec['dtype'])
+        else:
+            array = np.memmap(file_path, dtype=spec['dtype'], mode='r', shape=shape)
+        self.arrays[name] = array
+        return array
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @staticmethod
+    def _blob(data: np.ndarray, offsets: np.ndarray, i: int) -> str:
+        return bytes(data[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    def chunk(self, chunk_id: str) -> Optional[Tuple[str, str]]:
+        """(texte, source) d'un chunk, None s'il n'est pas dans le bundle"""
+        i = self._index.get(chunk_id)
+        if i is None:
+            return None
+        return (self._blob(self._text_data, self._text_offsets, i),
+                self._blob(self._source_data, self._source_offsets, i))
+
+    def cosine_top(self, query_vector, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices et cosinus des n chunks les plus proches (ordre décroissant)"""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or not len(self):
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        cosines = self.embeddings @ (query / norm)
+        n = min(n, len(cosines))
+        top = np.argpartition(-cosines, n - 1)[:n]
+        top = top[np.argsort(-cosines[top], kind='stable')]
+        return top, cosines[top]
+
+    def fidelities(self, query_state: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """|<ψ_requête|ψ_chunk>|² pour les chunks indiqués (vecteurs d'état précalculés)"""
+        if not len(indices):
+            return np.array([], dtype=np.float64)
+        overlaps = self.statevectors[indices] @ np.conj(np.asarray(query_state, dtype=np.complex64))
+        return np.abs(overlaps).astype(np.float64) ** 2
+
+    def prefault(self) -> int:
+        """Lire toutes les pages (warm-up) ; retourne le nombre d'octets parcourus"""
+        total = 0
+        for array in self.arrays.values():
+            if array.size:
+                np.asarray(array).view(np.uint8).sum()
+            total += array.nbytes
+        return total
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "path": self.path,
+            "created_at": self.manifest.get('created_at'),
+            "chunks": len(self),
+            "circuits": int(np.count_nonzero(self.has_circuit)),
+            "n_qubits": self.n_qubits,
+            "embedding_dim": self.manifest['embedding_dim'],
+            "bytes": sum(spec['bytes'] for spec in self.manifest['arrays'].values()),
+        }
+
+
+def read_current(root: str) -> Optional[str]:
+    """Nom de la génération active (None si aucune n'est activée)"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate_generation(root: str, generation: str):
+    """Désigner la génération active (remplacement atomique de CURRENT)"""
+    if not os.path.exists(os.path.join(root, generation, MANIFEST_FILE)):
+        raise ValueError(f"Génération introuvable: {generation}")
+    tmp_path = os.path.join(root, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(generation + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def list_generations(root: str) -> List[str]:
+    """Générations présentes, de la plus ancienne à la plus récente"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if name.startswith(GENERATION_PREFIX) and os.path.isdir(os.path.join(root, name)))
+
+
+def prune_generations(root: str, keep: int) -> List[str]:
+    """
+    Supprimer les anciennes générations (la génération active est toujours conservée)
+
+    Les workers qui ont encore une ancienne génération ouverte continuent de la lire :
+    les fichiers supprimés restent accessibles tant qu'ils sont projetés en mémoire.
+    """
+    current = read_current(root)
+    removed = []
+    for generation in list_generations(root)[:-keep] if keep > 0 else []:
+        if generation != current:
+            shutil.rmtree(os.path.join(root, generation), ignore_errors=True)
+            removed.append(generation)
+    return removed
+
+
+class ServingBundleManager:
+    """
+    Bundle actif d'un worker, rechargé quand CURRENT change (vérifié au plus toutes les
+    check_interval_s secondes). Les requêtes en cours gardent la génération qu'elles ont obtenue.
+    """
+
+    def __init__(self, root: str, check_interval_s: float = 5.0):
+        self.root = root
+        self.check_interval_s = check_interval_s
+        self.swaps = 0
+        self._lock = threading.Lock()
+        self._bundle: Optional[ServingBundle] = None
+        self._generation: Optional[str] = None
+        self._checked_at = 0.0
+        self.refresh()
+
+    def current(self) -> Optional[ServingBundle]:
+        if time.time() - self._checked_at >= self.check_interval_s:
+            self.refresh()
+        return self._bundle
+
+    def refresh(self) -> Optional[ServingBundle]:
+        with self._lock:
+            self._checked_at = time.time()
+            generation = read_current(self.root)
+            if generation is None or generation == self._generation:
+                return self._bundle
+            try:
+                bundle = ServingBundle(os.path.join(self.root, generation))
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"❌ Bundle {generation} illisible, génération {self._generation} conservée: {e}")
+                self._generation = generation
+                return self._bundle
+            self._bundle = bundle
+            self._generation = generation
+            self.swaps += 1
+            logger.info(f"📦 Bundle de service actif: {generation} ({len(bundle)} chunks)")
+            return bundle
+
+
+def _write_array(directory: str, name: str, array: np.ndarray, arrays: Dict[str, Any]):
+    array = np.ascontiguousarray(array)
+    file_name = f"{name}.bin"
+    array.tofile(os.path.join(directory, file_name))
+    arrays[name] = {"file": file_name, "dtype": array.dtype.str, "shape": list(array.shape),
+                    "bytes": int(array.nbytes)}
+
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Textes concaténés (UTF-8) et offsets (n + 1)"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def circuit_statevector(qasm_path: str) -> np.ndarray:
+    """Vecteur d'état d'un circuit QASM (mesures finales retirées)"""
+    from qiskit.quantum_info import Statevector
+    from quantum_db import load_qasm_circuit
+    qc = load_qasm_circuit(qasm_path).remove_final_measurements(inplace=False)
+    return np.asarray(Statevector.from_instruction(qc).data, dtype=np.complex64)
+
+
+def build_bundle(root: str, rows: Iterable[BundleRow], qasm_folder: str, pca, n_qubits: int,
+                 source: Optional[Dict[str, Any]] = None, activate: bool = True, keep: int = 3,
+                 statevector_for: Optional[Callable[[str], Optional[np.ndarray]]] = None) -> str:
+    """
+    Construire une génération dans un dossier temporaire, la renommer (atomique), puis
+    l'activer et supprimer les générations au-delà de keep
+
+    pca : modèle sklearn (components_, mean_, whiten, explained_variance_) ou BundlePCA.
+    statevector_for : vecteurs d'état déjà calculés, par row_id (None = simuler le circuit QASM).
+    """
+    os.makedirs(root, exist_ok=True)
+    generation = f"{GENERATION_PREFIX}{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    tmp_dir = os.path.join(root, f".{generation}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        rows = sorted((row for row in rows if row[3] is not None and len(row[3])), key=lambda row: row[0])
+        if not rows:
+            raise ValueError("Aucun chunk avec embedding")
+        dim = len(rows[0][3])
+        embeddings = np.array([row[3] for row in rows], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms > 0, norms, 1.0)
+
+        statevectors = np.zeros((len(rows), 2 ** n_qubits), dtype=np.complex64)
+        has_circuit = np.zeros(len(rows), dtype=np.uint8)
+        for i, (row_id, _, _, _) in enumerate(rows):
+            if statevector_for is not None:
+                statevector = statevector_for(row_id)
+                if statevector is not None:
+                    statevectors[i] = statevector
+                    has_circuit[i] = 1
+            else:
+                qasm_path = qasm_path_for_chunk_id(qasm_folder, row_id, n_qubits)
+                if os.path.exists(qasm_path):
+                    statevectors[i] = circuit_statevector(qasm_path)
+                    has_circuit[i] = 1
+            if (i + 1) % 1000 == 0:
+                print(f"   📊 {i + 1}/{len(rows)} chunks traités...")
+
+        if isinstance(pca, BundlePCA):
+            components, mean, scale = pca.components, pca.mean, pca.scale
+        else:
+            components, mean = pca.components_, pca.mean_
+            scale = np.sqrt(pca.explained_variance_) if getattr(pca, 'whiten', False) else np.ones(len(components))
+
+        arrays: Dict[str, Any] = {}
+        _write_array(tmp_dir, "embeddings", embeddings, arrays)
+        _write_array(tmp_dir, "statevectors", statevectors, arrays)
+        _write_array(tmp_dir, "has_circuit", has_circuit, arrays)
+        _write_array(tmp_dir, "pca_components", np.asarray(components, dtype=np.float64), arrays)
+        _write_array(tmp_dir, "pca_mean", np.asarray(mean, dtype=np.float64), arrays)
+        _write_array(tmp_dir, "pca_scale", np.asarray(scale, dtype=np.float64), arrays)
+        text_data, text_offsets = _pack_strings([row[1] or "" for row in rows])
+        _write_array(tmp_dir, "text_data", text_data, arrays)
+        _write_array(tmp_dir, "text_offsets", text_offsets, arrays)
+        source_data, source_offsets = _pack_strings([row[2] or "[PDF inconnu]" for row in rows])
+        _write_array(tmp_dir, "source_data", source_data, arrays)
+        _write_array(tmp_dir, "source_offsets", source_offsets, arrays)
+        with open(os.path.join(tmp_dir, "ids.json"), 'w', encoding='utf-8') as f:
+            json.dump([row[0] for row in rows], f)
+
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "generation": generation,
+            "created_at": datetime.now().isoformat(),
+            "n_qubits": n_qubits,
+            "embedding_dim": dim,
+            "chunks": len(rows),
+            "circuits": int(has_circuit.sum()),
+            "ids_file": "ids.json",
+            "arrays": arrays,
+            "source": source or {},
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.rename(tmp_dir, os.path.join(root, generation))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if activate:
+        activate_generation(root, generation)
+        prune_generations(root, keep)
+    return generation
+
+
+def read_cassandra_rows(cassandra_manager) -> List[BundleRow]:
+    """Chunks, textes, sources et embeddings de la table Cassandra"""
+    query = (f"SELECT row_id, body_blob, metadata_s, vector "
+             f"FROM {cassandra_manager.keyspace}.{cassandra_manager.table_name}")
+    rows = []
+    for row in cassandra_manager.session.execute(query):
+        source = row.metadata_s.get('source', '[PDF inconnu]') if row.metadata_s else '[PDF inconnu]'
+        rows.append((row.row_id, row.body_blob or "", source, row.vector))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bundle de service partagé (np.memmap) pour l'API")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Construire une génération depuis Cassandra")
+    build.add_argument("--root", required=True, help="Dossier des générations")
+    build.add_argument("--qasm-folder", default="quantum_db_8qubits", help="Dossier des circuits QASM")
+    build.add_argument("--pca", default="pca_model_8qubits.pkl", help="Modèle PCA (joblib)")
+    build.add_argument("--n-qubits", type=int, default=8)
+    build.add_argument("--table", default="fact_checker_docs")
+    build.add_argument("--keyspace", default="fact_checker_keyspace")
+    build.add_argument("--keep", type=int, default=3, help="Générations conservées")
+    build.add_argument("--no-activate", action="store_true", help="Construire sans activer")
+    activate = subparsers.add_parser("activate", help="Activer une génération (retour arrière)")
+    activate.add_argument("--root", required=True)
+    activate.add_argument("generation")
+    info = subparsers.add_parser("info", help="Générations disponibles et génération active")
+    info.add_argument("--root", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        import joblib
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../system')))
+        from cassandra_manager import create_cassandra_manager
+        cassandra_manager = create_cassandra_manager(table_name=args.table, keyspace=args.keyspace, lean=True)
+        print("📊 Lecture des chunks depuis Cassandra...")
+        rows = read_cassandra_rows(cassandra_manager)
+        print(f"📊 {len(rows)} chunks lus")
+        generation = build_bundle(
+            args.root, rows, args.qasm_folder, joblib.load(args.pca), args.n_qubits,
+            source={"keyspace": args.keyspace, "table": args.table, "qasm_folder": args.qasm_folder, "pca": args.pca},
+            activate=not args.no_activate, keep=args.keep
+        )
+        print(f"✅ Génération construite: {generation}" + ("" if args.no_activate else " (active)"))
+    elif args.command == "activate":
+        try:
+            activate_generation(args.root, args.generation)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 2
+        print(f"✅ Génération active: {args.generation}")
+    else:
+        current = read_current(args.root)
+        for generation in list_generations(args.root):
+            print(f"{'*' if generation == current else ' '} {generation}")
+        if current:
+            print(json.dumps(ServingBundle(os.path.join(args.root, current)).info(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
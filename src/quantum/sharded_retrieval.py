@@ -0,0 +1,723 @@
+#!/usr/bin/env python3
+"""
+Récupération répartie (scatter-gather) sur plusieurs shards
+Le corpus est partitionné par hachage de rendez-vous des chunk_id ; chaque shard est un
+bundle de service (serving_bundle) servi par un processus, local ou sur un autre nœud, via
+un petit RPC HTTP/JSON. Chaque shard calcule son top local (pré-filtre cosinus et fidélité
+quantique) ; le coordinateur fusionne les listes par tas (k-way merge) sur le cosinus, écarte
+les chunks sans circuit du top global puis garde les k meilleures fidélités, soit les mêmes
+candidats que la récupération mono-processus (à égalité de cosinus près).
+
+Usage:
+    python sharded_retrieval.py build --root /srv/quantum_shards --shards s0,s1,s2,s3
+    python sharded_retrieval.py serve-local --root /srv/quantum_shards --base-port 9100
+    python sharded_retrieval.py serve --root /srv/quantum_shards --shard s2 --port 9100
+    python sharded_retrieval.py rebalance --root /srv/quantum_shards --shards s0,s1,s2,s3,s4 \
+        --urls s4=http://10.0.0.5:9100
+    python sharded_retrieval.py info --root /srv/quantum_shards
+
+Côté API : RETRIEVAL_SHARDS="s0=http://10.0.0.1:9100,s1=http://10.0.0.2:9100,..." et/ou
+RETRIEVAL_SHARD_MAP=/srv/quantum_shards (carte relue à chaud après un rééquilibrage)
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import base64
+import hashlib
+import logging
+import argparse
+import threading
+import contextvars
+import multiprocessing
+import urllib.request
+import numpy as np
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from performance_metrics import LogHistogram, time_operation_context
+from prometheus_metrics import MetricFamily, histogram_family
+from quantum_search import amplitude_encoding, overlap_transform, qasm_path_for_chunk_id
+from serving_bundle import (
+    BundleRow, ServingBundle, ServingBundleManager, build_bundle, activate_generation,
+    prune_generations, read_current, read_cassandra_rows
+)
+from thread_budget import apply_thread_budget, compute_slot, get_thread_budget
+from tracing import span, set_span_attribute
+
+logger = logging.getLogger(__name__)
+
+SHARD_MAP_FILE = "shards.json"
+ASSIGNMENT_SCHEME = "rendezvous-blake2b"
+
+
+def _rendezvous_weight(shard: str, chunk_id: str) -> int:
+    digest = hashlib.blake2b(f"{shard}\x00{chunk_id}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def assign_shard(chunk_id: str, shards: List[str]) -> str:
+    """
+    Shard d'un chunk (hachage de rendez-vous) : ajouter ou retirer un shard ne déplace
+    que les chunks qui lui reviennent ou lui appartenaient (≈ 1/N du corpus)
+    """
+    return max(shards, key=lambda shard: _rendezvous_weight(shard, chunk_id))
+
+
+def partition_rows(rows: List[BundleRow], shards: List[str]) -> Dict[str, List[BundleRow]]:
+    partitions: Dict[str, List[BundleRow]] = {shard: [] for shard in shards}
+    for row in rows:
+        partitions[assign_shard(row[0], shards)].append(row)
+    return partitions
+
+
+def shard_map_path(path: str) -> str:
+    """Chemin de shards.json (path peut désigner le dossier des shards ou le fichier lui-même)"""
+    return os.path.join(path, SHARD_MAP_FILE) if os.path.isdir(path) else path
+
+
+def read_shard_map_file(path: str) -> Dict[str, Any]:
+    """Contenu de la carte : liste des shards et URLs connues ({} si aucune)"""
+    with open(shard_map_path(path), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data.setdefault('urls', {})
+    return data
+
+
+def read_shard_map(root: str) -> List[str]:
+    return read_shard_map_file(root)['shards']
+
+
+def write_shard_map(root: str, shards: List[str], urls: Optional[Dict[str, str]] = None):
+    """
+    Écrire la liste des shards (remplacement atomique) ; les URLs déjà connues des shards
+    conservés sont gardées, celles fournies les complètent ou les remplacent
+    """
+    known: Dict[str, str] = {}
+    if os.path.exists(os.path.join(root, SHARD_MAP_FILE)):
+        known = read_shard_map_file(root)['urls']
+    known.update(urls or {})
+    tmp_path = os.path.join(root, f".{SHARD_MAP_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"shards": shards, "urls": {shard: known[shard] for shard in shards if shard in known},
+                   "assignment": ASSIGNMENT_SCHEME, "updated_at": datetime.now().isoformat()}, f, indent=2)
+    os.replace(tmp_path, os.path.join(root, SHARD_MAP_FILE))
+
+
+def parse_shard_urls(value: str) -> Dict[str, str]:
+    """'s0=http://...,s1=http://...' → {nom: url}"""
+    shards = {}
+    for entry in value.split(","):
+        if entry.strip():
+            name, _, url = entry.strip().partition("=")
+            if not url:
+                raise ValueError(f"Entrée de shard invalide '{entry}' (attendu nom=url)")
+            shards[name] = url
+    return shards
+
+
+def encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype='<f4').tobytes()).decode('ascii')
+
+
+def decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype='<f4')
+
+
+# ---------------------------------------------------------------------------
+# Côté shard
+# ---------------------------------------------------------------------------
+
+class ShardServer:
+    """Un shard : bundle de service rechargé à chaud et recherche locale"""
+
+    def __init__(self, name: str, bundle_root: str, check_interval_s: float = 5.0):
+        self.name = name
+        self.bundles = ServingBundleManager(bundle_root, check_interval_s=check_interval_s)
+
+    def _bundle(self) -> ServingBundle:
+        bundle = self.bundles.current()
+        if bundle is None:
+            raise RuntimeError(f"Shard {self.name}: aucune génération active")
+        return bundle
+
+    def search(self, query_embedding: np.ndarray, n_candidates: int) -> Dict[str, Any]:
+        """
+        Top local : n_candidates meilleurs cosinus, chacun avec sa fidélité quantique (None
+        pour un chunk sans circuit) ; liste triée par cosinus décroissant. Les chunks sans
+        circuit restent dans la liste pour que le coordinateur les écarte après la fusion,
+        comme la récupération mono-processus.
+        """
+        started = time.time()
+        bundle = self._bundle()
+        # Les requêtes HTTP concurrentes partagent les slots de calcul du budget de threads
+        with compute_slot():
+            indices, cosines = bundle.cosine_top(query_embedding, n_candidates)
+            resolved = bundle.has_circuit[indices].astype(bool)
+            scores: List[Optional[float]] = [None] * len(indices)
+            if resolved.any():
+                from qiskit.quantum_info import Statevector
+                qc_query = amplitude_encoding(bundle.pca.transform([query_embedding])[0], bundle.n_qubits)
+                query_state = np.asarray(Statevector.from_instruction(qc_query).data)
+                fidelities = overlap_transform(bundle.fidelities(query_state, indices[resolved]))
+                for position, fidelity in zip(np.flatnonzero(resolved), fidelities):
+                    scores[position] = float(fidelity)
+        return {
+            "shard": self.name,
+            "generation": bundle.generation,
+            "rows": len(bundle),
+            "circuits_missing": int(len(resolved) - resolved.sum()),
+            "compute_ms": (time.time() - started) * 1000,
+            "candidates": [[float(cosine), score, bundle.chunk_ids[i]]
+                           for cosine, score, i in zip(cosines, scores, indices)],
+        }
+
+    def chunks(self, chunk_ids: List[str]) -> Dict[str, Any]:
+        bundle = self._bundle()
+        found = {}
+        for chunk_id in chunk_ids:
+            chunk = bundle.chunk(chunk_id)
+            if chunk is not None:
+                found[chunk_id] = list(chunk)
+        return {"shard": self.name, "chunks": found}
+
+    def info(self) -> Dict[str, Any]:
+        bundle = self.bundles.current()
+        return {"shard": self.name, "bundle": bundle.info() if bundle else None, "swaps": self.bundles.swaps}
+
+
+def make_handler(server: ShardServer):
+    class ShardRequestHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: Dict[str, Any]):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/info":
+                self._reply(200, server.info())
+            else:
+                self._reply(404, {"error": f"Chemin inconnu: {self.path}"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/search":
+                    self._reply(200, server.search(decode_vector(body["embedding"]),
+                                                   int(body.get("n_candidates", 100))))
+                elif self.path == "/chunks":
+                    self._reply(200, server.chunks(body["ids"]))
+                else:
+                    self._reply(404, {"error": f"Chemin inconnu: {self.path}"})
+            except (KeyError, ValueError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                logger.error(f"❌ Shard {server.name}: {e}")
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(f"Shard {server.name}: " + format % args)
+
+    return ShardRequestHandler
+
+
+def serve_shard(name: str, bundle_root: str, host: str = "127.0.0.1", port: int = 9100,
+                check_interval_s: float = 5.0, worker_index: Optional[int] = None,
+                workers: Optional[int] = None):
+    """Servir un shard (bloquant) ; worker_index/workers : part de cœurs du budget de threads"""
+    apply_thread_budget(worker_index=worker_index, workers=workers)
+    server = ShardServer(name, bundle_root, check_interval_s)
+    httpd = ThreadingHTTPServer((host, port), make_handler(server))
+    print(f"🧩 Shard {name} sur http://{host}:{port} ({bundle_root})")
+    httpd.serve_forever()
+
+
+def start_local_shards(root: str, host: str = "127.0.0.1", base_port: int = 9100,
+                       check_interval_s: float = 5.0) -> Tuple[List[multiprocessing.Process], Dict[str, str]]:
+    """Lancer un processus par shard de la carte ; retourne les processus et les URLs"""
+    processes, urls = [], {}
+    shards = read_shard_map(root)
+    for i, shard in enumerate(shards):
+        port = base_port + i
+        # Chaque shard est un worker du budget : les cœurs de la machine sont répartis entre eux
+        process = multiprocessing.Process(
+            target=serve_shard,
+            args=(shard, os.path.join(root, shard), host, port, check_interval_s, i, len(shards)),
+            name=f"shard-{shard}"
+        )
+        process.start()
+        processes.append(process)
+        urls[shard] = f"http://{host}:{port}"
+    return processes, urls
+
+
+# ---------------------------------------------------------------------------
+# Côté coordinateur
+# ---------------------------------------------------------------------------
+
+class ShardCoordinator:
+    """Diffusion des requêtes aux shards, fusion des résultats et métriques par shard"""
+
+    def __init__(self, shards: Dict[str, str], timeout_s: float = 5.0, n_candidates: int = 100,
+                 map_path: Optional[str] = None, map_check_interval_s: float = 5.0,
+                 concurrent_requests: Optional[int] = None):
+        """
+        Args:
+            shards: URLs des shards par nom
+            map_path: Carte des shards (shards.json ou son dossier) relue quand elle change ;
+                la liste des shards interrogés suit alors la carte (rééquilibrage sans redémarrage),
+                les URLs venant de la carte ou, à défaut, de shards
+            map_check_interval_s: Intervalle minimal entre deux vérifications de la carte
+            concurrent_requests: Requêtes simultanées du worker (défaut : request_threads du
+                budget de threads) ; le pool RPC a une place par requête et par shard
+        """
+        self.configured_urls = {name: url.rstrip("/") for name, url in shards.items()}
+        self.timeout_s = timeout_s
+        self.n_candidates = n_candidates
+        self.map_path = map_path
+        self.map_check_interval_s = map_check_interval_s
+        self.concurrent_requests = concurrent_requests or get_thread_budget().request_threads
+        self.map_reloads = 0
+        self._map_mtime: Optional[Tuple[int, int]] = None
+        self._map_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.rpc_latency: Dict[str, LogHistogram] = {}
+        self.compute_latency: Dict[str, LogHistogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.generations: Dict[str, str] = {}
+        self._set_shards(self.configured_urls)
+        if map_path:
+            self.refresh_shard_map(force=True)
+        if not self.urls:
+            raise ValueError("ShardCoordinator: aucun shard avec une URL connue")
+
+    @classmethod
+    def from_env(cls) -> Optional["ShardCoordinator"]:
+        """
+        RETRIEVAL_SHARDS="nom=url,..." et/ou RETRIEVAL_SHARD_MAP (carte relue à chaud) ;
+        None si aucune des deux variables n'est définie
+        """
+        shards = parse_shard_urls(os.getenv("RETRIEVAL_SHARDS", ""))
+        map_path = os.getenv("RETRIEVAL_SHARD_MAP", "")
+        if not shards and not map_path:
+            return None
+        return cls(shards, timeout_s=float(os.getenv("RETRIEVAL_SHARD_TIMEOUT_S", "5")),
+                   n_candidates=int(os.getenv("RETRIEVAL_SHARD_CANDIDATES", "100")),
+                   map_path=map_path or None,
+                   map_check_interval_s=float(os.getenv("RETRIEVAL_SHARD_MAP_CHECK_INTERVAL_S", "5")),
+                   concurrent_requests=int(os.getenv("RETRIEVAL_SHARD_CONCURRENT_REQUESTS", "0")) or None)
+
+    def _set_shards(self, urls: Dict[str, str]):
+        """Remplacer l'ensemble des shards interrogés (les requêtes en cours gardent l'ancien)"""
+        with self._lock:
+            for name in urls:
+                self.rpc_latency.setdefault(name, LogHistogram())
+                self.compute_latency.setdefault(name, LogHistogram())
+                self.errors.setdefault(name, 0)
+            max_workers = self.concurrent_requests * max(1, len(urls))
+            if self.executor is None or self.executor._max_workers < max_workers:
+                # L'ancien pool n'est pas arrêté : les requêtes en cours (qui en gardent une
+                # référence) peuvent encore y soumettre ; ses threads s'arrêtent une fois
+                # le pool libéré par le ramasse-miettes
+                self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-rpc")
+            self.urls = dict(urls)
+            self.shard_names = sorted(urls)
+
+    def refresh_shard_map(self, force: bool = False) -> bool:
+        """
+        Relire la carte des shards si elle a changé (au plus toutes les map_check_interval_s) ;
+        retourne True si l'ensemble des shards a été remplacé
+        """
+        if not self.map_path or (not force and time.time() - self._map_checked_at < self.map_check_interval_s):
+            return False
+        self._map_checked_at = time.time()
+        try:
+            # Remplacement atomique : nouvel inode à chaque écriture de la carte
+            stat = os.stat(shard_map_path(self.map_path))
+            mtime = (stat.st_ino, stat.st_mtime_ns)
+            if mtime == self._map_mtime:
+                return False
+            shard_map = read_shard_map_file(self.map_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"❌ Carte des shards illisible ({self.map_path}), shards actuels conservés: {e}")
+            return False
+        self._map_mtime = mtime
+        urls, unknown = {}, []
+        for shard in shard_map['shards']:
+            url = shard_map['urls'].get(shard) or self.configured_urls.get(shard)
+            if url:
+                urls[shard] = url.rstrip("/")
+            else:
+                unknown.append(shard)
+        if unknown:
+            logger.error(f"❌ Shards sans URL (ni dans la carte ni dans RETRIEVAL_SHARDS): {unknown}")
+        if not urls or urls == self.urls:
+            return False
+        self._set_shards(urls)
+        self.map_reloads += 1
+        logger.info(f"🧩 Carte des shards rechargée: {', '.join(self.shard_names)}")
+        return True
+
+    def _call(self, shard: str, path: str, payload: Optional[Dict[str, Any]], timeout: float,
+              url: Optional[str] = None) -> Dict[str, Any]:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request((url or self.urls[shard]) + path, data=data,
+                                         headers={"Content-Type": "application/json"})
+        started = time.time()
+        with span("shard_rpc", {"shard": shard, "path": path}):
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    result = json.loads(response.read())
+            except Exception:
+                with self._lock:
+                    self.errors[shard] += 1
+                raise
+            if "compute_ms" in result:
+                set_span_attribute("compute_ms", result["compute_ms"])
+        with self._lock:
+            self.rpc_latency[shard].record(time.time() - started)
+            if "compute_ms" in result:
+                self.compute_latency[shard].record(result["compute_ms"] / 1000.0)
+            if "generation" in result:
+                self.generations[shard] = result["generation"]
+        return result
+
+    def scatter(self, path: str, payload: Optional[Dict[str, Any]], timeout: float,
+                shards: Optional[List[str]] = None,
+                max_wait: Optional[float] = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """
+        Appeler les shards en parallèle ; retourne (réponses, erreurs) par shard
+
+        timeout compte à partir du début de chaque appel (pas de l'attente d'un thread du pool) ;
+        max_wait borne en plus la durée totale, attente comprise (échéance de la requête).
+        """
+        # Instantané : un rechargement de la carte pendant l'appel ne touche pas cette requête
+        urls, executor = self.urls, self.executor
+        shards = shards or sorted(urls)
+        started: Dict[str, float] = {}
+
+        def call(shard: str) -> Dict[str, Any]:
+            started[shard] = time.time()
+            return self._call(shard, path, payload, timeout, urls.get(shard))
+
+        scatter_start = time.time()
+        futures = {executor.submit(contextvars.copy_context().run, call, shard): shard for shard in shards}
+        pending = set(futures)
+        while pending:
+            now = time.time()
+            # Échéance de chaque appel en cours ; un appel encore en file n'a que max_wait
+            expiries = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            if max_wait is not None:
+                expiries.append(scatter_start + max_wait)
+            wait_s = max(0.0, min(expiries) - now) if expiries else timeout
+            _, pending = wait(pending, timeout=wait_s, return_when=FIRST_COMPLETED)
+            now = time.time()
+            if max_wait is not None and now >= scatter_start + max_wait:
+                break
+            pending = {f for f in pending if futures[f] not in started or now < started[futures[f]] + timeout}
+        responses, failures = {}, {}
+        for future, shard in futures.items():
+            if not future.done():
+                future.cancel()
+                failures[shard] = "timeout"
+                with self._lock:
+                    self.errors[shard] += 1
+            elif future.exception() is not None:
+                failures[shard] = str(future.exception())
+            else:
+                responses[shard] = future.result()
+        return responses, failures
+
+    def _max_wait(self, deadline) -> Optional[float]:
+        """Durée totale accordée à la diffusion (file du pool comprise) : budget de récupération"""
+        if deadline is None or not deadline.enabled:
+            return None
+        return max(0.1, deadline.retrieval_remaining())
+
+    def _timeout(self, deadline) -> float:
+        if deadline is None or not deadline.enabled:
+            return self.timeout_s
+        return max(0.1, min(self.timeout_s, deadline.retrieval_remaining()))
+
+    def retrieve_top_k(self, query_embedding, db_folder: str, k: int = 5, n_qubits: int = 8,
+                       deadline=None, retrieval_info: Optional[Dict[str, Any]] = None,
+                       on_prefilter=None) -> List[Tuple[float, str, str]]:
+        """
+        Même contrat que quantum_search.retrieve_top_k : [(score, qasm_path, chunk_id), ...]
+
+        Chaque shard renvoie ses n_candidates meilleurs cosinus avec leur fidélité ; la fusion
+        par tas donne les n_candidates meilleurs cosinus globaux, dont on écarte ensuite les
+        chunks sans circuit, puis les k meilleures fidélités : même ensemble de candidats que
+        le pré-filtre d'un seul processus (à égalité de cosinus près).
+        """
+        if retrieval_info is None:
+            retrieval_info = {}
+        self.refresh_shard_map()
+        with time_operation_context("shard_scatter_gather", {"shards": len(self.shard_names)}):
+            responses, failures = self.scatter(
+                "/search", {"embedding": encode_vector(query_embedding), "n_candidates": self.n_candidates},
+                self._timeout(deadline), max_wait=self._max_wait(deadline)
+            )
+        if not responses:
+            raise RuntimeError(f"Aucun shard n'a répondu: {failures}")
+        if failures:
+            logger.warning(f"Shards sans réponse: {failures}")
+            if deadline is not None:
+                deadline.degrade("shards_partial")
+
+        with time_operation_context("shard_merge"):
+            merged, seen = [], set()
+            # Un chunk peut être présent dans deux shards pendant un rééquilibrage
+            for cosine, score, chunk_id in heapq.merge(
+                    *(response["candidates"] for response in responses.values()), key=lambda c: -c[0]):
+                if chunk_id not in seen:
+                    seen.add(chunk_id)
+                    merged.append((cosine, score, chunk_id))
+                    if len(merged) >= self.n_candidates:
+                        break
+            # Chunks sans circuit écartés après la sélection globale, comme en mono-processus
+            missing = sum(1 for _, score, _ in merged if score is None)
+            merged = [candidate for candidate in merged if candidate[1] is not None]
+            top = heapq.nlargest(k, merged, key=lambda c: c[1])
+
+        retrieval_info['engine'] = 'sharded'
+        retrieval_info['shards_queried'] = len(responses) + len(failures)
+        retrieval_info['shards_failed'] = sorted(failures)
+        retrieval_info['shard_compute_ms'] = {shard: r['compute_ms'] for shard, r in responses.items()}
+        retrieval_info['prefilter_rows_scanned'] = sum(r['rows'] for r in responses.values())
+        retrieval_info['prefilter_vectors_scored'] = retrieval_info['prefilter_rows_scanned']
+        retrieval_info['circuits_missing'] = missing
+        retrieval_info['circuits_resolved'] = len(merged)
+        retrieval_info['prefilter_candidates'] = len(merged)
+        retrieval_info['circuits_candidates'] = len(merged)
+        retrieval_info['circuits_scored'] = len(merged)
+        retrieval_info['ranking'] = 'quantum'
+        if merged:
+            retrieval_info['prefilter_max_cosine'] = merged[0][0]
+            if on_prefilter is not None:
+                on_prefilter([(cosine, qasm_path_for_chunk_id(db_folder, chunk_id, n_qubits), chunk_id)
+                              for cosine, _, chunk_id in merged[:k]])
+        return [(score, qasm_path_for_chunk_id(db_folder, chunk_id, n_qubits), chunk_id)
+                for _, score, chunk_id in top]
+
+    def get_chunk(self, chunk_id: str, timeout: Optional[float] = None) -> Optional[Tuple[str, str]]:
+        """
+        (texte, source) depuis le shard propriétaire ; pendant un rééquilibrage le chunk peut
+        encore être ailleurs, les autres shards sont alors interrogés (None si introuvable)
+        """
+        self.refresh_shard_map()
+        urls = self.urls
+        timeout = timeout or self.timeout_s
+        shard = assign_shard(chunk_id, sorted(urls))
+        try:
+            chunk = self._call(shard, "/chunks", {"ids": [chunk_id]}, timeout, urls[shard])["chunks"].get(chunk_id)
+        except Exception as e:
+            logger.warning(f"Shard {shard}: chunk {chunk_id} indisponible ({e})")
+            chunk = None
+        if chunk:
+            return tuple(chunk)
+        others = [name for name in sorted(urls) if name != shard]
+        if not others:
+            return None
+        responses, _ = self.scatter("/chunks", {"ids": [chunk_id]}, timeout, shards=others)
+        for response in responses.values():
+            if response["chunks"].get(chunk_id):
+                return tuple(response["chunks"][chunk_id])
+        return None
+
+    def ping(self) -> Dict[str, Any]:
+        """Interroger /info sur tous les shards (warm-up) ; erreur si aucun ne répond"""
+        self.refresh_shard_map()
+        responses, failures = self.scatter("/info", None, self.timeout_s)
+        if not responses:
+            raise RuntimeError(f"Aucun shard n'a répondu: {failures}")
+        if failures:
+            logger.warning(f"Shards sans réponse: {failures}")
+        return responses
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "map_reloads": self.map_reloads,
+                "shards": {
+                    shard: {
+                        "url": self.urls[shard],
+                        "generation": self.generations.get(shard),
+                        "errors": self.errors[shard],
+                        "rpc_p50_ms": self.rpc_latency[shard].percentile(50) * 1000,
+                        "rpc_p95_ms": self.rpc_latency[shard].percentile(95) * 1000,
+                        "compute_p95_ms": self.compute_latency[shard].percentile(95) * 1000,
+                    }
+                    for shard in self.shard_names
+                },
+            }
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Latences (appel complet et calcul dans le shard) et erreurs par shard, pour /metrics"""
+        with self._lock:
+            rpc = {shard: histogram.copy() for shard, histogram in self.rpc_latency.items()}
+            compute = {shard: histogram.copy() for shard, histogram in self.compute_latency.items()}
+            errors = dict(self.errors)
+        error_family = MetricFamily("fact_check_shard_errors_total", "counter", "Appels aux shards en échec")
+        for shard, count in errors.items():
+            error_family.add(count, {"shard": shard})
+        return [
+            histogram_family("fact_check_shard_rpc_duration_seconds",
+                             "Durée des appels aux shards (réseau compris)", rpc, "shard"),
+            histogram_family("fact_check_shard_compute_seconds", "Durée du calcul dans chaque shard",
+                             compute, "shard"),
+            error_family,
+            MetricFamily("fact_check_shard_map_reloads_total", "counter",
+                         "Rechargements de la carte des shards").add(self.map_reloads),
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Construction et rééquilibrage
+# ---------------------------------------------------------------------------
+
+def build_shards(root: str, rows: List[BundleRow], shards: List[str], keep: int = 3,
+                 urls: Optional[Dict[str, str]] = None, **bundle_options) -> Dict[str, str]:
+    """
+    Construire une génération par shard, puis activer toutes les générations et écrire la
+    carte des shards (les activations sont groupées à la fin pour réduire la fenêtre de transition ;
+    la carte, écrite en dernier, fait basculer les coordinateurs qui la relisent)
+    """
+    generations = {}
+    for shard, shard_rows in partition_rows(rows, shards).items():
+        print(f"🧩 Shard {shard}: {len(shard_rows)} chunks")
+        generations[shard] = build_bundle(os.path.join(root, shard), shard_rows, activate=False, **bundle_options)
+    for shard, generation in generations.items():
+        activate_generation(os.path.join(root, shard), generation)
+    write_shard_map(root, shards, urls)
+    for shard in shards:
+        prune_generations(os.path.join(root, shard), keep)
+    return generations
+
+
+def rebalance_shards(root: str, new_shards: List[str], keep: int = 3,
+                     urls: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Répartir le corpus actuel sur un nouvel ensemble de shards, à partir des bundles actifs
+    (ni Cassandra ni resimulation des circuits) ; retourne le bilan des déplacements
+    """
+    old_shards = read_shard_map(root)
+    rows: List[BundleRow] = []
+    statevectors: Dict[str, np.ndarray] = {}
+    owner: Dict[str, str] = {}
+    reference: Optional[ServingBundle] = None
+    for shard in old_shards:
+        generation = read_current(os.path.join(root, shard))
+        if generation is None:
+            continue
+        bundle = ServingBundle(os.path.join(root, shard, generation))
+        reference = reference or bundle
+        for i, chunk_id in enumerate(bundle.chunk_ids):
+            if chunk_id in owner:
+                continue
+            text, source = bundle.chunk(chunk_id)
+            rows.append((chunk_id, text, source, bundle.embeddings[i]))
+            owner[chunk_id] = shard
+            if bundle.has_circuit[i]:
+                statevectors[chunk_id] = bundle.statevectors[i]
+    if reference is None:
+        raise ValueError("Aucun shard actif à rééquilibrer")
+
+    moved = sum(1 for chunk_id in owner if assign_shard(chunk_id, new_shards) != owner[chunk_id])
+    generations = build_shards(
+        root, rows, new_shards, keep=keep, urls=urls, qasm_folder="", pca=reference.pca, n_qubits=reference.n_qubits,
+        source={"rebalanced_from": old_shards}, statevector_for=statevectors.get
+    )
+    return {
+        "old_shards": old_shards,
+        "new_shards": new_shards,
+        "chunks": len(rows),
+        "moved": moved,
+        "moved_fraction": moved / len(rows) if rows else 0.0,
+        "removed_shards": sorted(set(old_shards) - set(new_shards)),
+        "generations": generations,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Récupération répartie sur plusieurs shards")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Partitionner le corpus Cassandra en shards")
+    build.add_argument("--root", required=True, help="Dossier des shards")
+    build.add_argument("--shards", required=True, help="Noms des shards, séparés par des virgules")
+    build.add_argument("--qasm-folder", default="quantum_db_8qubits", help="Dossier des circuits QASM")
+    build.add_argument("--pca", default="pca_model_8qubits.pkl", help="Modèle PCA (joblib)")
+    build.add_argument("--n-qubits", type=int, default=8)
+    build.add_argument("--table", default="fact_checker_docs")
+    build.add_argument("--keyspace", default="fact_checker_keyspace")
+    build.add_argument("--keep", type=int, default=3, help="Générations conservées par shard")
+    build.add_argument("--urls", type=parse_shard_urls, default={},
+                       help="URLs des shards enregistrées dans la carte, ex: 's0=http://10.0.0.1:9100,...'")
+    rebalance = subparsers.add_parser("rebalance", help="Répartir le corpus sur un nouvel ensemble de shards")
+    rebalance.add_argument("--root", required=True)
+    rebalance.add_argument("--shards", required=True)
+    rebalance.add_argument("--keep", type=int, default=3)
+    rebalance.add_argument("--urls", type=parse_shard_urls, default={},
+                           help="URLs des nouveaux shards (les URLs connues des autres sont conservées)")
+    serve = subparsers.add_parser("serve", help="Servir un shard (un processus)")
+    serve.add_argument("--root", required=True)
+    serve.add_argument("--shard", required=True)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=9100)
+    serve.add_argument("--check-interval", type=float, default=5.0, help="Relecture de CURRENT (secondes)")
+    serve_local = subparsers.add_parser("serve-local", help="Servir tous les shards (un processus chacun)")
+    serve_local.add_argument("--root", required=True)
+    serve_local.add_argument("--host", default="127.0.0.1")
+    serve_local.add_argument("--base-port", type=int, default=9100)
+    serve_local.add_argument("--check-interval", type=float, default=5.0)
+    info = subparsers.add_parser("info", help="Carte des shards et générations actives")
+    info.add_argument("--root", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        import joblib
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../system')))
+        from cassandra_manager import create_cassandra_manager
+        cassandra_manager = create_cassandra_manager(table_name=args.table, keyspace=args.keyspace, lean=True)
+        rows = read_cassandra_rows(cassandra_manager)
+        print(f"📊 {len(rows)} chunks lus depuis Cassandra")
+        generations = build_shards(
+            args.root, rows, [s.strip() for s in args.shards.split(",") if s.strip()], keep=args.keep,
+            urls=args.urls, qasm_folder=args.qasm_folder, pca=joblib.load(args.pca), n_qubits=args.n_qubits,
+            source={"keyspace": args.keyspace, "table": args.table, "qasm_folder": args.qasm_folder, "pca": args.pca}
+        )
+        print(f"✅ {len(generations)} shards construits")
+    elif args.command == "rebalance":
+        report = rebalance_shards(args.root, [s.strip() for s in args.shards.split(",") if s.strip()], args.keep,
+                                  args.urls)
+        print(json.dumps(report, indent=2))
+        if report["removed_shards"]:
+            print(f"ℹ️ Shards retirés de la carte (à arrêter): {', '.join(report['removed_shards'])}")
+    elif args.command == "serve":
+        serve_shard(args.shard, os.path.join(args.root, args.shard), args.host, args.port, args.check_interval)
+    elif args.command == "serve-local":
+        processes, urls = start_local_shards(args.root, args.host, args.base_port, args.check_interval)
+        # URLs enregistrées dans la carte : RETRIEVAL_SHARD_MAP suffit côté API
+        write_shard_map(args.root, read_shard_map(args.root), urls)
+        print("RETRIEVAL_SHARDS=" + ",".join(f"{shard}={url}" for shard, url in urls.items()))
+        for process in processes:
+            process.join()
+    else:
+        for shard in read_shard_map(args.root):
+            generation = read_current(os.path.join(args.root, shard))
+            bundle = ServingBundle(os.path.join(args.root, shard, generation)) if generation else None
+            print(f"{shard}: {bundle.info() if bundle else 'aucune génération active'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
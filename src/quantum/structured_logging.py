@@ -0,0 +1,145 @@
+"""
+Logs structurés (JSON) non bloquants
+Les handlers d'écriture tournent dans un thread QueueListener ; chaque enregistrement porte
+l'identifiant de corrélation de la requête, et les charges détaillées (prompt, réponse brute)
+ne sont journalisées que pour un échantillon de requêtes
+"""
+
+import os
+import json
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# Identifiant de corrélation et décision d'échantillonnage de la requête en cours
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+payload_sampled_var: ContextVar[bool] = ContextVar("payload_sampled", default=False)
+
+_payload_sample_rate = 0.0
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Attributs standard d'un LogRecord, exclus des champs supplémentaires
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestContextFilter(logging.Filter):
+    """Copier l'identifiant de corrélation dans l'enregistrement (dans le thread appelant)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement ; les champs passés via extra sont inclus tels quels"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_file: Optional[str] = None, level: Optional[str] = None,
+                  json_format: Optional[bool] = None,
+                  payload_sample_rate: Optional[float] = None) -> logging.handlers.QueueListener:
+    """
+    Configurer le logger racine : QueueHandler côté appelant, écriture dans un thread dédié
+
+    Les valeurs non fournies viennent de LOG_FILE (vide = pas de fichier), LOG_LEVEL,
+    LOG_FORMAT (json ou text) et LOG_PAYLOAD_SAMPLE_RATE (fraction des requêtes dont
+    le prompt et la réponse brute sont journalisés).
+    """
+    global _payload_sample_rate, _listener
+
+    log_file = log_file if log_file is not None else os.getenv("LOG_FILE", "api_quantum_fact_checker.log")
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "json").lower() == "json"
+    _payload_sample_rate = payload_sample_rate if payload_sample_rate is not None else \
+        float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+    )
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, mode='a'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    stop_logging()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop_logging():
+    """Vider la file et arrêter le thread d'écriture (idempotent)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None):
+    """
+    Associer un identifiant de corrélation aux logs de la requête en cours
+
+    Si une requête englobante a déjà un identifiant (sous-affirmations), il est conservé.
+    La décision d'échantillonnage des charges détaillées est prise une fois par requête.
+    """
+    if request_id_var.get() is not None and request_id is None:
+        yield request_id_var.get()
+        return
+    request_id = request_id or new_request_id()
+    id_token = request_id_var.set(request_id)
+    sampled_token = payload_sampled_var.set(random.random() < _payload_sample_rate)
+    try:
+        yield request_id
+    finally:
+        request_id_var.reset(id_token)
+        payload_sampled_var.reset(sampled_token)
+
+
+def payload_sampled() -> bool:
+    """True si les charges détaillées de la requête en cours doivent être journalisées"""
+    return payload_sampled_var.get()
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Script de test du limiteur AIMD : rejoue des latences mélangées (petit/grand modèle,
+modes screen/full) sans surcharge et vérifie que la limite ne baisse pas, puis vérifie
+qu'une vraie surcharge la fait baisser
+"""
+
+import random
+
+from concurrency_limiter import AdaptiveConcurrencyLimiter
+
+
+def replay(limiter, calls):
+    """Rejouer des appels séquentiels (concurrence 1) : (latence, classe)"""
+    for latency, latency_class in calls:
+        limiter.acquire()
+        limiter.release(latency, latency_class=latency_class)
+
+
+def mixed_calls(n=400, seed=0):
+    """20 % d'appels rapides (~0,4 s, screen ou petit modèle), 80 % de générations complètes (~5 s)"""
+    rng = random.Random(seed)
+    calls = []
+    for _ in range(n):
+        if rng.random() < 0.2:
+            calls.append((0.4 * rng.uniform(0.9, 1.1), rng.choice(["large:screen", "small:full"])))
+        else:
+            calls.append((5.0 * rng.uniform(0.9, 1.1), "large:full"))
+    return calls
+
+
+def test_mixed_latencies_keep_limit():
+    limiter = AdaptiveConcurrencyLimiter("llm", initial_limit=4)
+    replay(limiter, mixed_calls())
+    stats = limiter.get_stats()
+    assert stats['limit'] == 4, stats
+    assert stats['decreases'] == 0, stats
+    print(f"✅ Latences mélangées : limite {stats['limit']}, {stats['decreases']} baisse(s)")
+
+
+def test_overload_lowers_limit():
+    limiter = AdaptiveConcurrencyLimiter("llm", initial_limit=4)
+    calls = mixed_calls(200)
+    # Surcharge : les générations complètes deviennent 3 fois plus lentes
+    calls += [(latency * 3 if latency_class == "large:full" else latency, latency_class)
+              for latency, latency_class in mixed_calls(50, seed=1)]
+    replay(limiter, calls)
+    stats = limiter.get_stats()
+    assert stats['limit'] < 4 and stats['decreases'] > 0, stats
+    print(f"✅ Surcharge : limite {stats['limit']}, {stats['decreases']} baisse(s)")
+
+
+if __name__ == "__main__":
+    print("🧪 TEST DU LIMITEUR DE CONCURRENCE")
+    print("=" * 40)
+    test_mixed_latencies_keep_limit()
+    test_overload_lowers_limit()
+    print("\n🎉 Tests terminés !")
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Budget de threads du processus
+NumPy/BLAS, Qiskit Aer et les pools de threads se dimensionnent chacun sur tous les cœurs
+de la machine ; sous charge concurrente (plusieurs requêtes, plusieurs workers) ils se
+disputent le CPU. Une seule configuration fixe ici : les threads BLAS (threadpoolctl),
+les options de parallélisme d'Aer, le nombre de sections de calcul simultanées, la taille
+des pools, et optionnellement l'épinglage de chaque worker sur sa part de cœurs.
+
+Usage:
+    python thread_budget.py info
+    python thread_budget.py benchmark --config blas=0,aer=0,slots=1024,concurrency=8 \\
+        --config blas=1,aer=1,concurrency=8 --duration 10 --report thread_budget_report.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_metrics import MetricFamily
+
+# Variables lues par les bibliothèques BLAS/OpenMP à leur chargement (processus enfants compris)
+BLAS_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                 "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def available_cores() -> List[int]:
+    """Cœurs utilisables par le processus (affinité courante si disponible)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Cœurs du processus avant tout épinglage (base du partage entre workers)
+MACHINE_CORES = available_cores()
+
+
+@dataclass
+class ThreadBudget:
+    """Répartition des cœurs entre workers, bibliothèques natives et pools (0 = automatique)"""
+    enabled: bool = True
+    cores: int = 0
+    workers: int = 1
+    blas_threads: int = 1
+    aer_threads: int = 1
+    aer_parallel_experiments: int = 1
+    compute_slots: int = 0
+    request_threads: int = 32
+    job_workers: int = 0
+    pin_cores: bool = False
+    worker_index: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ThreadBudget":
+        worker_index = os.getenv("THREAD_BUDGET_WORKER_INDEX")
+        return cls(
+            enabled=os.getenv("THREAD_BUDGET_ENABLED", "true").lower() in ("1", "true", "yes"),
+            cores=int(os.getenv("THREAD_BUDGET_CORES", "0")),
+            workers=int(os.getenv("THREAD_BUDGET_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1"),
+            blas_threads=int(os.getenv("THREAD_BUDGET_BLAS_THREADS", "1")),
+            aer_threads=int(os.getenv("THREAD_BUDGET_AER_THREADS", "1")),
+            aer_parallel_experiments=int(os.getenv("THREAD_BUDGET_AER_PARALLEL_EXPERIMENTS", "1")),
+            compute_slots=int(os.getenv("THREAD_BUDGET_COMPUTE_SLOTS", "0")),
+            request_threads=int(os.getenv("THREAD_BUDGET_REQUEST_THREADS", "32")),
+            job_workers=int(os.getenv("FACT_CHECK_JOB_WORKERS", "0")),
+            pin_cores=os.getenv("THREAD_BUDGET_PIN_CORES", "false").lower() in ("1", "true", "yes"),
+            worker_index=int(worker_index) if worker_index else None,
+        )
+
+    @property
+    def total_cores(self) -> int:
+        cores = len(MACHINE_CORES)
+        return min(self.cores, cores) if self.cores > 0 else cores
+
+    @property
+    def cores_per_worker(self) -> int:
+        return max(1, self.total_cores // max(1, self.workers))
+
+    @property
+    def resolved_compute_slots(self) -> int:
+        """Sections de calcul simultanées : part de cœurs du worker / threads natifs par section"""
+        if self.compute_slots > 0:
+            return self.compute_slots
+        return max(1, self.cores_per_worker // max(1, self.blas_threads, self.aer_threads))
+
+    @property
+    def resolved_job_workers(self) -> int:
+        return self.job_workers if self.job_workers > 0 else min(2, self.cores_per_worker)
+
+    def worker_cores(self, worker_index: int) -> List[int]:
+        """Cœurs attribués au worker worker_index (tranche contiguë, repliée modulo le nombre de workers)"""
+        cores = MACHINE_CORES[:self.total_cores]
+        per_worker = self.cores_per_worker
+        start = (worker_index % max(1, self.workers)) * per_worker
+        return cores[start:start + per_worker] or cores
+
+    def aer_options(self) -> Dict[str, int]:
+        """Options de parallélisme passées à backend.run (vide = réglages par défaut d'Aer)"""
+        if not self.enabled or self.aer_threads <= 0:
+            return {}
+        return {
+            "max_parallel_threads": self.aer_threads,
+            "max_parallel_experiments": max(1, self.aer_parallel_experiments),
+            "max_parallel_shots": self.aer_threads,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.update({
+            "total_cores": self.total_cores,
+            "cores_per_worker": self.cores_per_worker,
+            "resolved_compute_slots": self.resolved_compute_slots,
+            "resolved_job_workers": self.resolved_job_workers,
+        })
+        return data
+
+
+_lock = threading.Lock()
+_active_budget: Optional[ThreadBudget] = None
+_applied_pid: Optional[int] = None
+_blas_limiter = None
+_slot_lock_file = None
+_pinned_cores: List[int] = []
+_compute_semaphore: Optional[threading.BoundedSemaphore] = None
+_slot_stats = {"acquired": 0, "waited": 0, "wait_s": 0.0, "timeouts": 0}
+
+
+def set_blas_threads(n_threads: int) -> bool:
+    """
+    Limiter les pools BLAS/OpenMP déjà chargés (threadpoolctl) ; retourne False si
+    threadpoolctl est absent (seules les variables d'environnement s'appliquent alors)
+    """
+    global _blas_limiter
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return False
+    if _blas_limiter is not None:
+        _blas_limiter.restore_original_limits()
+    # Sans bloc with, la limite reste en place jusqu'à restore_original_limits()
+    _blas_limiter = threadpool_limits(limits=n_threads)
+    return True
+
+
+def blas_info() -> List[Dict[str, Any]]:
+    """Bibliothèques natives chargées et leur nombre de threads (vide sans threadpoolctl)"""
+    try:
+        from threadpoolctl import threadpool_info
+    except ImportError:
+        return []
+    return [{"library": lib.get("internal_api"), "num_threads": lib.get("num_threads"),
+             "version": lib.get("version")} for lib in threadpool_info()]
+
+
+def claim_worker_slot(workers: int, lock_dir: Optional[str] = None) -> Optional[int]:
+    """
+    Réserver un indice de worker libre par verrou de fichier, tenu jusqu'à la fin du processus
+    (les workers uvicorn/gunicorn ne reçoivent pas d'indice) ; None si tous sont pris
+    """
+    global _slot_lock_file
+    import fcntl
+    lock_dir = lock_dir or os.getenv("THREAD_BUDGET_LOCK_DIR",
+                                     os.path.join(tempfile.gettempdir(), "quantum_thread_budget"))
+    os.makedirs(lock_dir, exist_ok=True)
+    for index in range(max(1, workers)):
+        handle = open(os.path.join(lock_dir, f"worker-{index}.lock"), "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        handle.write(str(os.getpid()))
+        handle.flush()
+        _slot_lock_file = handle
+        return index
+    return None
+
+
+def pin_to_cores(cores: List[int]) -> bool:
+    """Épingler le processus (tous ses threads) sur les cœurs donnés ; False si non supporté"""
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, cores)
+    return True
+
+
+def apply_thread_budget(budget: Optional[ThreadBudget] = None, worker_index: Optional[int] = None,
+                        workers: Optional[int] = None) -> ThreadBudget:
+    """
+    Appliquer le budget au processus courant (idempotent, une fois par processus)
+
+    Args:
+        budget: Budget à appliquer (défaut : variables THREAD_BUDGET_*)
+        worker_index: Indice du worker pour l'épinglage (défaut : variable ou verrou de fichier)
+        workers: Nombre de workers partageant la machine (remplace celui du budget)
+    """
+    global _active_budget, _applied_pid, _compute_semaphore, _pinned_cores
+    with _lock:
+        if _active_budget is not None and _applied_pid == os.getpid() and budget is None:
+            return _active_budget
+        budget = budget or ThreadBudget.from_env()
+        if workers is not None:
+            budget.workers = workers
+        if worker_index is not None:
+            budget.worker_index = worker_index
+        _active_budget, _applied_pid = budget, os.getpid()
+        _compute_semaphore = None
+        if not budget.enabled:
+            print("ℹ️ Budget de threads désactivé (réglages par défaut des bibliothèques)")
+            return budget
+
+        if budget.pin_cores:
+            if budget.worker_index is None:
+                budget.worker_index = claim_worker_slot(budget.workers)
+            if budget.worker_index is None:
+                print(f"⚠️ Aucun indice de worker libre sur {budget.workers}, processus non épinglé")
+            elif pin_to_cores(budget.worker_cores(budget.worker_index)):
+                _pinned_cores = budget.worker_cores(budget.worker_index)
+
+        blas_applied = False
+        if budget.blas_threads > 0:
+            for name in BLAS_ENV_VARS:
+                os.environ.setdefault(name, str(budget.blas_threads))
+            blas_applied = set_blas_threads(budget.blas_threads)
+            if not blas_applied:
+                print("⚠️ threadpoolctl absent : limite BLAS appliquée aux seules bibliothèques chargées ensuite")
+        _compute_semaphore = threading.BoundedSemaphore(budget.resolved_compute_slots)
+        print(f"🧵 Budget de threads : {budget.cores_per_worker}/{budget.total_cores} cœurs par worker, "
+              f"BLAS={budget.blas_threads or 'défaut'}, Aer={budget.aer_threads or 'défaut'}, "
+              f"{budget.resolved_compute_slots} section(s) de calcul"
+              + (f", worker {budget.worker_index} épinglé sur {_pinned_cores}" if _pinned_cores else ""))
+        return budget
+
+
+def get_thread_budget() -> ThreadBudget:
+    """Budget appliqué au processus, sinon celui des variables d'environnement (non appliqué)"""
+    return _active_budget if _active_budget is not None else ThreadBudget.from_env()
+
+
+def aer_run_options() -> Dict[str, int]:
+    """Options de parallélisme Aer du budget courant, à passer à backend.run"""
+    return get_thread_budget().aer_options()
+
+
+@contextmanager
+def compute_slot(timeout: Optional[float] = None):
+    """
+    Section de calcul natif (BLAS, Aer) limitée au nombre de slots du budget ;
+    produit False si le slot n'a pas été obtenu avant timeout (le calcul doit alors être abandonné)
+    """
+    semaphore = _compute_semaphore
+    if semaphore is None:
+        yield True
+        return
+    acquired = semaphore.acquire(blocking=False)
+    if not acquired:
+        started = time.perf_counter()
+        acquired = semaphore.acquire(timeout=max(0.0, timeout)) if timeout is not None else semaphore.acquire()
+        with _lock:
+            _slot_stats["waited"] += 1
+            _slot_stats["wait_s"] += time.perf_counter() - started
+            if not acquired:
+                _slot_stats["timeouts"] += 1
+    if acquired:
+        with _lock:
+            _slot_stats["acquired"] += 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            semaphore.release()
+
+
+def get_stats() -> Dict[str, Any]:
+    budget = get_thread_budget()
+    with _lock:
+        slots = dict(_slot_stats)
+    return {
+        "budget": budget.to_dict(),
+        "applied": _active_budget is not None,
+        "pinned_cores": list(_pinned_cores),
+        "blas": blas_info(),
+        "compute_slots": slots,
+    }
+
+
+def collect_metrics() -> List[MetricFamily]:
+    """Budget effectif et attentes de slots de calcul, exposés par /metrics"""
+    budget = get_thread_budget()
+    with _lock:
+        slots = dict(_slot_stats)
+    settings = MetricFamily("thread_budget_setting", "gauge", "Budget de threads effectif du worker")
+    for name, value in (("total_cores", budget.total_cores), ("cores_per_worker", budget.cores_per_worker),
+                        ("blas_threads", budget.blas_threads), ("aer_threads", budget.aer_threads),
+                        ("compute_slots", budget.resolved_compute_slots),
+                        ("request_threads", budget.request_threads), ("pinned_cores", len(_pinned_cores))):
+        settings.add(value, {"setting": name})
+    return [
+        settings,
+        MetricFamily("thread_budget_compute_slot_acquired_total", "counter",
+                     "Sections de calcul exécutées").add(slots["acquired"]),
+        MetricFamily("thread_budget_compute_slot_waits_total", "counter",
+                     "Sections de calcul ayant attendu un slot libre").add(slots["waited"]),
+        MetricFamily("thread_budget_compute_slot_wait_seconds_total", "counter",
+                     "Temps total d'attente d'un slot de calcul").add(slots["wait_s"]),
+        MetricFamily("thread_budget_compute_slot_timeouts_total", "counter",
+                     "Slots de calcul non obtenus avant l'échéance").add(slots["timeouts"]),
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Benchmark : débit de la charge de récupération selon la configuration
+# ---------------------------------------------------------------------------
+
+CONFIG_KEYS = {"workers", "concurrency", "blas", "aer", "slots", "pin"}
+
+
+def parse_config(value: str) -> Dict[str, int]:
+    """'blas=1,aer=1,slots=4,concurrency=8,workers=2,pin=1' → dictionnaire (clés absentes = défaut)"""
+    config = {}
+    for item in filter(None, value.split(",")):
+        key, _, number = item.partition("=")
+        if key not in CONFIG_KEYS or not number.lstrip("-").isdigit():
+            raise argparse.ArgumentTypeError(f"Paramètre invalide '{item}' (clés: {', '.join(sorted(CONFIG_KEYS))})")
+        config[key] = int(number)
+    return config
+
+
+def _benchmark_data(rows: int, dim: int, n_qubits: int, seed: int) -> Dict[str, np.ndarray]:
+    """Corpus synthétique : embeddings normalisés et vecteurs d'état de 2**n_qubits amplitudes"""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((rows, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    states = rng.standard_normal((rows, 2 ** n_qubits)) + 1j * rng.standard_normal((rows, 2 ** n_qubits))
+    states /= np.linalg.norm(states, axis=1, keepdims=True)
+    return {"embeddings": embeddings, "states": states.astype(np.complex64)}
+
+
+def _benchmark_request(data: Dict[str, np.ndarray], rng: np.random.Generator, n_candidates: int,
+                       aer_circuits: Optional[Tuple[Any, Any]]) -> None:
+    """Une récupération : pré-filtre cosinus, fidélités des candidats, simulation Aer optionnelle"""
+    query = rng.standard_normal(data["embeddings"].shape[1]).astype(np.float32)
+    state = rng.standard_normal(data["states"].shape[1]) + 1j * rng.standard_normal(data["states"].shape[1])
+    state = (state / np.linalg.norm(state)).astype(np.complex64)
+    with compute_slot():
+        cosines = data["embeddings"] @ query
+        top = np.argpartition(-cosines, n_candidates)[:n_candidates]
+        np.abs(data["states"][top] @ state.conj()) ** 2
+    if aer_circuits is not None:
+        from quantum_search import quantum_overlap_similarity
+        with compute_slot():
+            quantum_overlap_similarity(*aer_circuits)
+
+
+def _benchmark_worker(config: Dict[str, int], worker_index: int, settings: Dict[str, Any], results) -> None:
+    """Processus worker : applique le budget de la configuration puis sert des requêtes pendant duration"""
+    budget = ThreadBudget(
+        cores=settings["cores"],
+        workers=config.get("workers", 1),
+        blas_threads=config.get("blas", 1),
+        aer_threads=config.get("aer", 1),
+        compute_slots=config.get("slots", 0),
+        pin_cores=bool(config.get("pin", 0)),
+    )
+    apply_thread_budget(budget, worker_index=worker_index)
+    data = _benchmark_data(settings["rows"], settings["dim"], settings["n_qubits"], settings["seed"])
+    aer_circuits = None
+    if settings["aer"]:
+        from quantum_search import amplitude_encoding
+        rng = np.random.default_rng(settings["seed"])
+        aer_circuits = tuple(amplitude_encoding(rng.random(settings["n_qubits"]) + 0.1, settings["n_qubits"])
+                             for _ in range(2))
+        from quantum_search import quantum_overlap_similarity
+        quantum_overlap_similarity(*aer_circuits)
+
+    latencies: List[float] = []
+    latencies_lock = threading.Lock()
+    start_barrier = threading.Barrier(config.get("concurrency", 1))
+    deadline = [0.0]
+
+    def client(thread_index: int):
+        rng = np.random.default_rng(settings["seed"] + 1000 * worker_index + thread_index)
+        start_barrier.wait()
+        if thread_index == 0:
+            deadline[0] = time.perf_counter() + settings["duration"]
+        while not deadline[0]:
+            time.sleep(0.001)
+        local = []
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            _benchmark_request(data, rng, settings["n_candidates"], aer_circuits)
+            local.append(time.perf_counter() - started)
+        with latencies_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(config.get("concurrency", 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((worker_index, latencies, get_stats()))
+
+
+def run_benchmark(configs: List[Dict[str, int]], duration: float = 10.0, rows: int = 50000, dim: int = 768,
+                  n_qubits: int = 8, n_candidates: int = 100, aer: bool = False, seed: int = 0) -> Dict[str, Any]:
+    """
+    Mesurer débit et latences pour chaque configuration ; chaque worker est un processus neuf
+    (spawn) dont l'environnement BLAS est fixé avant le chargement de numpy
+    """
+    settings = {"duration": duration, "rows": rows, "dim": dim, "n_qubits": n_qubits,
+                "n_candidates": n_candidates, "aer": aer, "seed": seed, "cores": 0}
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for config in configs:
+        workers = config.get("workers", 1)
+        saved_env = {name: os.environ.get(name) for name in BLAS_ENV_VARS}
+        for name in BLAS_ENV_VARS:
+            if config.get("blas", 1) > 0:
+                os.environ[name] = str(config.get("blas", 1))
+            else:
+                os.environ.pop(name, None)
+        results = context.Queue()
+        processes = [context.Process(target=_benchmark_worker, args=(config, i, settings, results))
+                     for i in range(workers)]
+        try:
+            for process in processes:
+                process.start()
+            outputs = [results.get() for _ in processes]
+        finally:
+            for process in processes:
+                process.join()
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        latencies = np.array([latency for _, worker_latencies, _ in outputs for latency in worker_latencies])
+        run = {
+            "config": config,
+            "requests": int(len(latencies)),
+            "throughput_rps": len(latencies) / duration,
+            "workers": [{"worker_index": index, "requests": len(worker_latencies), **stats}
+                        for index, worker_latencies, stats in sorted(outputs, key=lambda o: o[0])],
+        }
+        if len(latencies):
+            run.update({f"p{q}_ms": float(np.percentile(latencies, q) * 1000) for q in (50, 95, 99)})
+        runs.append(run)
+        print(f"   📊 {config}: {run['throughput_rps']:.1f} req/s"
+              + (f", p50 {run['p50_ms']:.1f}ms, p95 {run['p95_ms']:.1f}ms" if len(latencies) else ""))
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "cores": len(MACHINE_CORES),
+        "settings": settings,
+        "runs": runs,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print("\n" + "=" * 80)
+    print(f"🧵 DÉBIT SELON LE BUDGET DE THREADS ({report['cores']} cœurs)")
+    print("=" * 80)
+    best = max((run["throughput_rps"] for run in report["runs"]), default=0.0)
+    for run in report["runs"]:
+        config = ",".join(f"{key}={value}" for key, value in run["config"].items()) or "défaut"
+        marker = "🏆" if best and run["throughput_rps"] == best else "  "
+        print(f"{marker} {config:<45} {run['throughput_rps']:8.1f} req/s  "
+              f"p50 {run.get('p50_ms', 0):7.1f}ms  p95 {run.get('p95_ms', 0):7.1f}ms")
+
+
+DEFAULT_BENCHMARK_CONFIGS = [
+    {"blas": 0, "aer": 0, "slots": 1024, "concurrency": 8},
+    {"blas": 1, "aer": 1, "concurrency": 8},
+]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Budget de threads : état courant et benchmark de débit")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("info", help="Budget issu des variables THREAD_BUDGET_* et bibliothèques chargées")
+    benchmark = subparsers.add_parser("benchmark", help="Débit de la charge de récupération par configuration")
+    benchmark.add_argument("--config", type=parse_config, action="append", default=[],
+                           help="ex: 'blas=1,aer=1,slots=4,concurrency=8,workers=2,pin=1' "
+                                "(répétable ; blas/aer=0 : tous les cœurs)")
+    benchmark.add_argument("--duration", type=float, default=10.0, help="Durée de mesure par configuration (s)")
+    benchmark.add_argument("--rows", type=int, default=50000, help="Taille du corpus synthétique")
+    benchmark.add_argument("--dim", type=int, default=768, help="Dimension des embeddings")
+    benchmark.add_argument("--n-qubits", type=int, default=8)
+    benchmark.add_argument("--candidates", type=int, default=100, help="Candidats du pré-filtre cosinus")
+    benchmark.add_argument("--aer", action="store_true", help="Inclure une simulation Qiskit Aer par requête")
+    benchmark.add_argument("--seed", type=int, default=0)
+    benchmark.add_argument("--report", help="Rapport JSON de sortie")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        budget = apply_thread_budget()
+        print(json.dumps({**get_stats(), "aer_options": budget.aer_options()}, indent=2, ensure_ascii=False))
+        return 0
+
+    report = run_benchmark(args.config or DEFAULT_BENCHMARK_CONFIGS, args.duration, args.rows, args.dim,
+                           args.n_qubits, args.candidates, args.aer, args.seed)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Rapport sauvegardé dans: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Traces par requête : spans parent/enfant propagés par contextvars
+Chaque requête reçoit un identifiant de trace ; les spans ouverts dans les tâches asyncio
+et les threads lancés avec une copie du contexte (asyncio.to_thread) lui sont rattachés.
+Les traces récentes sont conservées en mémoire et exportables au format Chrome trace-event.
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Span:
+    """Étape chronométrée d'une requête"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "duration", "thread_id", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.thread_id = threading.get_ident()
+        self.attributes = dict(attributes) if attributes else {}
+        self.error: Optional[str] = None
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": (self.start - origin) * 1000,
+            "duration_ms": (self.duration or 0.0) * 1000,
+            "thread_id": self.thread_id,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """Ensemble des spans d'une requête (ajouts protégés par un verrou, nombre borné)"""
+
+    def __init__(self, trace_id: str, max_spans: int):
+        self.trace_id = trace_id
+        self.start = time.time()
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Cascade (waterfall) : spans triés par début, décalages relatifs au début de la requête"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "trace_id": self.trace_id,
+            "start": self.start,
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict(self.start) for span in spans],
+        }
+
+    def durations_by_name(self) -> Dict[str, float]:
+        """Durée cumulée (secondes) de chaque nom de span, dans l'ordre de première apparition"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        durations: Dict[str, float] = {}
+        for span in spans:
+            durations[span.name] = durations.get(span.name, 0.0) + (span.duration or 0.0)
+        return durations
+
+    def attribute_totals(self, key: str) -> Dict[str, float]:
+        """Somme d'un compteur de span (add_span_counter), par nom de span"""
+        with self._lock:
+            spans = list(self.spans)
+        totals: Dict[str, float] = {}
+        for span in spans:
+            if key in span.attributes:
+                totals[span.name] = totals.get(span.name, 0) + span.attributes[key]
+        return totals
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Événements "complete" (ph=X) lisibles par chrome://tracing et Perfetto"""
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        events = []
+        for span in spans:
+            args = {"span_id": span.span_id, "parent_id": span.parent_id, **span.attributes}
+            if span.error:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": "fact_check",
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": (span.duration or 0.0) * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": self.trace_id}}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+
+# Traces terminées les plus récentes (les plus anciennes sont évincées)
+_recent_traces: "OrderedDict[str, Trace]" = OrderedDict()
+_recent_traces_lock = threading.Lock()
+
+
+def _store_trace(trace: Trace):
+    with _recent_traces_lock:
+        _recent_traces[trace.trace_id] = trace
+        _recent_traces.move_to_end(trace.trace_id)
+        while len(_recent_traces) > TRACE_BUFFER_SIZE:
+            _recent_traces.popitem(last=False)
+
+
+@contextmanager
+def trace_request(trace_id: Optional[str] = None, name: str = "request",
+                  attributes: Optional[Dict[str, Any]] = None):
+    """
+    Ouvrir la trace d'une requête et son span racine
+
+    Dans une trace déjà ouverte (sous-affirmations), un simple span enfant est créé.
+    """
+    if not TRACING_ENABLED or _current_trace.get() is not None:
+        with span(name, attributes):
+            yield _current_trace.get()
+        return
+    trace = Trace(trace_id or uuid.uuid4().hex[:16], TRACE_MAX_SPANS)
+    trace_token = _current_trace.set(trace)
+    try:
+        with span(name, attributes):
+            yield trace
+    finally:
+        _current_trace.reset(trace_token)
+        _store_trace(trace)
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Optional[Tuple[Span, Any]]:
+    """Ouvrir un span enfant du span courant (None hors d'une trace)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    new_span = Span(name, parent.span_id if parent else None, attributes)
+    return new_span, _current_span.set(new_span)
+
+
+def end_span(handle: Optional[Tuple[Span, Any]], error: Optional[BaseException] = None):
+    """Fermer un span ouvert par start_span (à appeler dans le même contexte)"""
+    if handle is None:
+        return
+    finished, token = handle
+    finished.duration = time.time() - finished.start
+    if error is not None:
+        finished.error = str(error)
+    _current_span.reset(token)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(finished)
+
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Chronométrer un bloc comme span enfant du span courant (sans effet hors d'une trace)"""
+    handle = start_span(name, attributes)
+    try:
+        yield handle[0] if handle else None
+    except BaseException as e:
+        end_span(handle, e)
+        raise
+    end_span(handle)
+
+
+def set_span_attribute(key: str, value: Any):
+    """Ajouter un attribut au span courant"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def add_span_counter(key: str, value: float = 1):
+    """Incrémenter un compteur du span courant (octets lus, succès de cache...)"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = current.attributes.get(key, 0) + value
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def get_trace(trace_id: str) -> Optional[Trace]:
+    with _recent_traces_lock:
+        return _recent_traces.get(trace_id)
+
+
+def list_traces() -> List[Dict[str, Any]]:
+    """Résumé des traces conservées (la plus récente en premier)"""
+    with _recent_traces_lock:
+        traces = list(_recent_traces.values())
+    summaries = []
+    for trace in reversed(traces):
+        root = next((s for s in trace.spans if s.parent_id is None), None)
+        summaries.append({
+            "trace_id": trace.trace_id,
+            "start": trace.start,
+            "duration_ms": (root.duration or 0.0) * 1000 if root else None,
+            "spans": len(trace.spans),
+        })
+    return summaries
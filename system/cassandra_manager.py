@@ -1,61 +1,88 @@
 """
 Gestionnaire Cassandra Vector Store pour le fact-checker avec MMR
+
+LlamaIndex et cassio sont importés à l'usage : en mode lean (API), seuls la session
+Cassandra et le modèle d'embedding (créé au premier appel) sont initialisés.
 """
 
 import os
+import threading
 from typing import List, Dict, Any
-from llama_index.core import VectorStoreIndex, StorageContext
-from llama_index.vector_stores.cassandra import CassandraVectorStore
-from llama_index.embeddings.ollama import OllamaEmbedding
-from llama_index.llms.ollama import Ollama
-from llama_index.core.settings import Settings
-from ollama_utils import SimpleTextSplitter
-from pdf_loader import PDFDocumentLoader
-import cassio
 from cassandra.cluster import Cluster
 
 class CassandraVectorStoreManager:
     """Gestionnaire pour Cassandra Vector Store avec MMR intégré"""
     
-    def __init__(self, table_name="fact_checker_docs", embedding_model="llama2:7b", keyspace="fact_checker_keyspace"):
+    def __init__(self, table_name="fact_checker_docs", embedding_model="llama2:7b", keyspace="fact_checker_keyspace",
+                 lean=False):
         """
         Initialiser Cassandra Vector Store
         
         Args:
             table_name: Nom de la table Cassandra
             embedding_model: Modèle Ollama pour les embeddings
+            lean: Accès aux données seulement (pas d'index LlamaIndex, de LLM ni de cassio) ;
+                  l'indexation et la recherche LlamaIndex sont alors indisponibles
         """
         self.table_name = table_name
         self.keyspace = keyspace
         self.embedding_model = embedding_model
+        self.lean = lean
+        self._embed_model = None
+        self._embed_model_lock = threading.Lock()
         
         # Initialiser la session Cassandra
         self._init_cassandra_session()
         
-        # Initialiser les embeddings Ollama
-        self.embed_model = OllamaEmbedding(model_name=embedding_model)
-        
-        # Initialiser le LLM Ollama
-        self.llm = Ollama(model=embedding_model, request_timeout=120.0)
-        
         # Pas besoin de settings pour l'instant
         self.settings = None
-        
-        # Initialiser Cassandra Vector Store
-        self.vector_store = CassandraVectorStore(
-            table=table_name,
-            embedding_dimension=4096  # Dimension des embeddings Ollama llama2:7b
-        )
-        
-        # Créer le storage context
-        self.storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
-        
-        # Initialiser l'index (sera None si pas de documents)
+        self.llm = None
+        self.vector_store = None
+        self.storage_context = None
         self.index = None
-        self._load_index()
+        
+        if not lean:
+            from llama_index.core import StorageContext
+            from llama_index.vector_stores.cassandra import CassandraVectorStore
+            from llama_index.llms.ollama import Ollama
+            
+            # Initialiser les embeddings Ollama
+            self._embed_model = self._create_embed_model()
+            
+            # Initialiser le LLM Ollama
+            self.llm = Ollama(model=embedding_model, request_timeout=120.0)
+            
+            # Initialiser Cassandra Vector Store
+            self.vector_store = CassandraVectorStore(
+                table=table_name,
+                embedding_dimension=4096  # Dimension des embeddings Ollama llama2:7b
+            )
+            
+            # Créer le storage context
+            self.storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
+            
+            # Initialiser l'index (sera None si pas de documents)
+            self._load_index()
         
         print(f"🔧 Modèle d'embedding: {embedding_model}")
-        print(f"📊 Table Cassandra: {table_name}")
+        print(f"📊 Table Cassandra: {table_name}" + (" (mode lean)" if lean else ""))
+    
+    def _create_embed_model(self):
+        from llama_index.embeddings.ollama import OllamaEmbedding
+        return OllamaEmbedding(model_name=self.embedding_model)
+    
+    @property
+    def embed_model(self):
+        """Modèle d'embedding Ollama (créé au premier usage en mode lean)"""
+        if self._embed_model is None:
+            with self._embed_model_lock:
+                if self._embed_model is None:
+                    self._embed_model = self._create_embed_model()
+        return self._embed_model
+    
+    def _require_full(self, operation: str):
+        if self.lean:
+            raise RuntimeError(f"{operation} indisponible en mode lean (create_cassandra_manager(lean=False))")
     
     def _init_cassandra_session(self):
         """Initialiser la session Cassandra"""
@@ -64,11 +91,13 @@ class CassandraVectorStoreManager:
             cluster = Cluster(['localhost'], port=9042)
             self.session = cluster.connect()
             
-            # Configurer cassio avec la session
-            cassio.init(
-                session=self.session,
-                keyspace=self.keyspace
-            )
+            # Configurer cassio avec la session (utilisé par CassandraVectorStore seulement)
+            if not self.lean:
+                import cassio
+                cassio.init(
+                    session=self.session,
+                    keyspace=self.keyspace
+                )
             
             # Créer le keyspace s'il n'existe pas
             self.session.execute("""
@@ -85,6 +114,7 @@ class CassandraVectorStoreManager:
     def _load_index(self):
         """Charger l'index existant si des documents existent"""
         try:
+            from llama_index.core import VectorStoreIndex
             # Essayer de charger l'index existant avec le bon modèle d'embedding
             self.index = VectorStoreIndex.from_vector_store(
                 self.vector_store,
@@ -98,6 +128,7 @@ class CassandraVectorStoreManager:
     def _reload_index(self):
         """Recharger l'index après modification"""
         try:
+            from llama_index.core import VectorStoreIndex
             self.index = VectorStoreIndex.from_vector_store(
                 self.vector_store,
                 embed_model=self.embed_model
@@ -138,6 +169,10 @@ class CassandraVectorStoreManager:
             True si succès, False sinon
         """
         try:
+            self._require_full("L'indexation")
+            from ollama_utils import SimpleTextSplitter
+            from pdf_loader import PDFDocumentLoader
+            
             # Charger les documents PDF
             documents = PDFDocumentLoader.load_directory(data_dir)
             if not documents:
@@ -212,6 +247,10 @@ class CassandraVectorStoreManager:
             True si succès, False sinon
         """
         try:
+            self._require_full("L'indexation")
+            from ollama_utils import SimpleTextSplitter
+            from pdf_loader import PDFDocumentLoader
+
             # Charger seulement les documents PDF spécifiés
             documents = []
             for pdf_name in pdf_list:
@@ -409,6 +448,10 @@ class CassandraVectorStoreManager:
     def clear_collection(self):
         """Vider la table (recharger l'index)"""
         try:
+            self._require_full("La réinitialisation")
+            from llama_index.core import StorageContext
+            from llama_index.vector_stores.cassandra import CassandraVectorStore
+            
             # Supprimer la table complètement pour forcer la recréation
             self.session.execute(f"DROP TABLE IF EXISTS fact_checker_keyspace.{self.table_name}")
             print("🗑️ Table Cassandra supprimée")
@@ -440,6 +483,7 @@ class CassandraVectorStoreManager:
             })
         return results
 
-def create_cassandra_manager(table_name="fact_checker_docs", keyspace="fact_checker_keyspace") -> CassandraVectorStoreManager:
-    """Fonction utilitaire pour créer un gestionnaire Cassandra"""
-    return CassandraVectorStoreManager(table_name=table_name, keyspace=keyspace)
\ No newline at end of file
+def create_cassandra_manager(table_name="fact_checker_docs", keyspace="fact_checker_keyspace",
+                             lean=False) -> CassandraVectorStoreManager:
+    """Fonction utilitaire pour créer un gestionnaire Cassandra (lean : accès aux données seulement)"""
+    return CassandraVectorStoreManager(table_name=table_name, keyspace=keyspace, lean=lean)
\ No newline at end of file
@@ -94,6 +94,46 @@ def test_multiple_fact_checks():
     
     return results
 
+def test_screen_mode_job(timeout_s=120):
+    """Test d'un job asynchrone en mode screen (résultats au format réduit)"""
+    print("\n🔍 Test d'un job en mode screen...")
+    
+    try:
+        response = requests.post(
+            f"{API_BASE_URL}/jobs",
+            json={"requests": [{"message": "La fonte des glaces arctiques s'accélère", "mode": "screen"}]},
+            headers={"Content-Type": "application/json"}
+        )
+        if response.status_code != 202:
+            print(f"❌ Soumission échouée: {response.status_code}")
+            return False
+        job_id = response.json()['job_id']
+        
+        deadline = time.time() + timeout_s
+        while time.time() < deadline:
+            status = requests.get(f"{API_BASE_URL}/jobs/{job_id}").json()
+            if status['status'] in ("completed", "completed_with_errors"):
+                break
+            time.sleep(1)
+        else:
+            print(f"❌ Job {job_id} non terminé après {timeout_s}s")
+            return False
+        
+        response = requests.get(f"{API_BASE_URL}/jobs/{job_id}/results")
+        if response.status_code != 200:
+            print(f"❌ Lecture des résultats échouée: {response.status_code}")
+            print(f"   Réponse: {response.text}")
+            return False
+        item = response.json()['items'][0]
+        if item['status'] != "completed" or 'explanation' in (item['result'] or {}):
+            print(f"❌ Résultat inattendu: {item}")
+            return False
+        print(f"✅ Job screen réussi: verdict {item['result']['verdict']}, score {item['result']['certainty_score']:.3f}")
+        return True
+    except Exception as e:
+        print(f"❌ Erreur lors du job screen: {e}")
+        return False
+
 def main():
     """Fonction principale de test"""
     print("🚀 Test de l'API Quantum Fact Checker (Version Complète)")
@@ -112,6 +152,10 @@ def main():
     # Test 3: Multiple fact-checks
     results = test_multiple_fact_checks()
     
+    # Test 4: Job asynchrone en mode screen
+    if not test_screen_mode_job():
+        print("❌ Le job en mode screen a échoué.")
+    
     # Résumé
     print("\n📊 Résumé des tests:")
     print("-" * 40)